@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Benchmark the wall-clock time of downloading a set in manifest order versus largest first.
+
+A local server streams synthetic files at a fixed rate per connection, like a host that throttles
+each download, and a pool of workers downloads them the same way evremixes does: tracks are
+submitted in order and each worker takes the next one when it's free. Sizes are drawn from the
+range of a typical album of FLAC remixes, scaled down so each run takes a few seconds.
+
+Usage: python benchmarks/download_schedule.py [--tracks 19] [--workers 4] [--trials 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add the src directory to the path so we can import evremixes modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from evremixes.job_scheduler import order_longest_first
+from evremixes.remote_files import create_session
+
+MIB = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Typical FLAC remix sizes, and how much to scale them down by
+MIN_SIZE = 25 * MIB
+MAX_SIZE = 95 * MIB
+SCALE = 1 / 25
+
+# Throughput of each connection, after scaling
+CONNECTION_RATE = 4 * MIB
+
+
+class ThrottledHandler(BaseHTTPRequestHandler):
+    """Serve `/<size>` as that many bytes, streamed at `CONNECTION_RATE`."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        """Stream the requested number of bytes."""
+        size = int(self.path.strip("/"))
+        self.send_response(200)
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+
+        chunk = bytes(CHUNK_SIZE)
+        start = time.perf_counter()
+        sent = 0
+        while sent < size:
+            length = min(CHUNK_SIZE, size - sent)
+            self.wfile.write(chunk[:length])
+            sent += length
+            delay = sent / CONNECTION_RATE - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        """Keep the server quiet."""
+
+
+def download_all(base_url: str, sizes: list[int], workers: int) -> float:
+    """Download files of the given sizes in order with a pool of workers. Returns the seconds."""
+    session = create_session()
+
+    def download(size: int) -> None:
+        with session.get(f"{base_url}/{size}", stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for _ in response.iter_content(chunk_size=CHUNK_SIZE):
+                pass
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(download, size) for size in sizes]:
+            future.result()
+    return time.perf_counter() - start
+
+
+def run(tracks: int, workers: int, trials: int) -> None:
+    """Run the benchmark for several randomly drawn albums."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottledHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{tracks} tracks, {workers} workers, {CONNECTION_RATE / MIB:.0f} MiB/s per connection\n")
+    print(f"{'trial':>5}  {'manifest':>9}  {'largest':>9}  {'ideal':>9}  {'saved':>7}")
+
+    totals = [0.0, 0.0]
+    try:
+        for trial in range(1, trials + 1):
+            rng = random.Random(trial)
+            sizes = [int(rng.uniform(MIN_SIZE, MAX_SIZE) * SCALE) for _ in range(tracks)]
+            ordered = order_longest_first(sizes, list(sizes))
+
+            # No schedule can beat an even split of the work, or the largest file on its own
+            ideal = max(sum(sizes) / workers, *sizes) / CONNECTION_RATE
+
+            manifest_time = download_all(base_url, sizes, workers)
+            ordered_time = download_all(base_url, ordered, workers)
+            totals[0] += manifest_time
+            totals[1] += ordered_time
+
+            saved = 1 - ordered_time / manifest_time
+            print(
+                f"{trial:>5}  {manifest_time:>8.2f}s  {ordered_time:>8.2f}s  {ideal:>8.2f}s  "
+                f"{saved:>6.1%}"
+            )
+    finally:
+        server.shutdown()
+
+    print(f"\nLargest first took {1 - totals[1] / totals[0]:.1%} less time overall.")
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=19, help="tracks per album")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent downloads")
+    parser.add_argument("--trials", type=int, default=3, help="albums to try")
+    args = parser.parse_args()
+    run(args.tracks, args.workers, args.trials)
+
+
+if __name__ == "__main__":
+    main()
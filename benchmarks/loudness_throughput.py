@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Benchmark loudness measurement in seconds of audio measured per CPU-second.
+
+By default this measures synthetic stereo noise fed to the meter in the same blocks the decoder
+produces, which times the NumPy filtering and gating on their own. Given FLAC files, it also
+measures them the way downloads are measured, with `ffmpeg` decoding, and counts the decoder's CPU
+time too. Each track runs in a single process, so with one track per worker the throughput of a
+whole set scales with the number of CPUs.
+
+Usage: python benchmarks/loudness_throughput.py [--seconds 300] [--rate 44100] [files ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+from mutagen.flac import FLAC
+
+# Add the src directory to the path so we can import evremixes modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from evremixes.loudness import LoudnessMeter
+from evremixes.loudness_analyzer import measure_track
+
+
+def cpu_time() -> float:
+    """Get the CPU time used by this process and any finished child processes."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def measure_synthetic(seconds: float, sample_rate: int) -> None:
+    """Measure synthetic stereo noise and print the throughput."""
+    rng = np.random.default_rng(0)
+    samples = (rng.standard_normal((round(seconds * sample_rate), 2)) * 0.1).astype("<f4")
+
+    start = cpu_time()
+    meter = LoudnessMeter(sample_rate, 2)
+    for offset in range(0, len(samples), meter.block_frames):
+        meter.add(samples[offset : offset + meter.block_frames])
+    loudness = meter.result().loudness
+    elapsed = cpu_time() - start
+
+    print(f"Synthetic noise, {seconds:.0f}s at {sample_rate} Hz: {loudness:.2f} LUFS")
+    print(f"  {elapsed:.3f} CPU-seconds, {seconds / elapsed:,.0f}s of audio per CPU-second\n")
+
+
+def measure_files(paths: list[Path]) -> None:
+    """Measure FLAC files with ffmpeg and print the throughput of each and overall."""
+    decoder = shutil.which("ffmpeg")
+    if decoder is None:
+        print("ffmpeg not found, so files can't be measured.")
+        return
+
+    total_audio = total_cpu = 0.0
+    for path in paths:
+        duration = FLAC(path).info.length
+        start = cpu_time()
+        loudness = measure_track(decoder, path).loudness
+        elapsed = cpu_time() - start
+        total_audio += duration
+        total_cpu += elapsed
+
+        level = f"{loudness:.2f} LUFS" if loudness is not None else "silent"
+        print(f"{path.name}: {level}, {duration / elapsed:,.0f}s of audio per CPU-second")
+
+    if total_cpu:
+        print(
+            f"\nOverall: {total_audio / total_cpu:,.0f}s of audio per CPU-second, decoding included"
+        )
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", type=Path, help="FLAC files to measure with ffmpeg")
+    parser.add_argument("--seconds", type=float, default=300, help="length of synthetic audio")
+    parser.add_argument("--rate", type=int, default=44100, help="sample rate of synthetic audio")
+    args = parser.parse_args()
+
+    measure_synthetic(args.seconds, args.rate)
+    if args.files:
+        measure_files(args.files)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Benchmark retagging ALAC files, to show the cost depends on the tags and not the file size.
+
+Synthetic M4A files of increasing size are created with `moov` at the end and no padding, the way
+encoders write them. Each is tagged once and then retagged several times with cover art of
+alternating sizes, both the way evremixes does it (`moov` first, with padding) and with mutagen's
+defaults on a file with `moov` first (as from `ffmpeg -movflags +faststart`).
+
+Bytes written are taken from `/proc/self/io` where available (Linux), so the results don't depend
+on the page cache. Elsewhere only the time is reported.
+
+Usage: python benchmarks/mp4_retag.py [--sizes 8 32 128] [--retags 6]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from mutagen.mp4 import MP4, MP4Cover
+
+# Add the src directory to the path so we can import evremixes modules
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from evremixes.mp4_layout import get_tag_padding, move_moov_first
+
+MIB = 1024 * 1024
+CHUNKS = 64
+COVER_SIZES = (100 * 1024, 240 * 1024)
+
+
+def atom(atom_type: bytes, *children: bytes) -> bytes:
+    """Build an atom from its type and contents."""
+    body = b"".join(children)
+    return struct.pack(">I4s", 8 + len(body), atom_type) + body
+
+
+def create_m4a(path: Path, audio_size: int, moov_first: bool) -> None:
+    """Write a minimal M4A file with an audio track pointing into `audio_size` bytes of data."""
+    ftyp = atom(b"ftyp", b"M4A \x00\x00\x00\x00M4A mp42isom")
+    chunk_size = audio_size // CHUNKS
+
+    def build_moov(mdat_offset: int) -> bytes:
+        offsets = [mdat_offset + 8 + i * chunk_size for i in range(CHUNKS)]
+        stco = atom(b"stco", struct.pack(f">II{CHUNKS}I", 0, CHUNKS, *offsets))
+        mdhd = atom(b"mdhd", struct.pack(">IIIIIHH", 0, 0, 0, 44100, 44100 * 300, 0, 0))
+        hdlr = atom(b"hdlr", struct.pack(">II4s12x", 0, 0, b"soun"), b"\x00")
+        mvhd = atom(b"mvhd", struct.pack(">IIIII", 0, 0, 0, 1000, 300_000), bytes(80))
+        stbl = atom(b"stbl", stco)
+        return atom(b"moov", mvhd, atom(b"trak", atom(b"mdia", mdhd, hdlr, atom(b"minf", stbl))))
+
+    with path.open("wb") as f:
+        f.write(ftyp)
+        if moov_first:
+            moov_size = len(build_moov(0))
+            f.write(build_moov(len(ftyp) + moov_size))
+        mdat_offset = f.tell()
+        f.write(struct.pack(">I4s", 8 + chunk_size * CHUNKS, b"mdat"))
+        for _ in range(CHUNKS):
+            f.write(os.urandom(chunk_size))
+        if not moov_first:
+            f.write(build_moov(mdat_offset))
+
+
+def bytes_written() -> int | None:
+    """Get the bytes this process has written so far, if the OS reports it."""
+    try:
+        with Path("/proc/self/io").open() as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def tag(path: Path, cover: bytes, tuned: bool) -> tuple[float, int | None]:
+    """Tag a file and return the time taken and bytes written."""
+    start_bytes = bytes_written()
+    start = time.perf_counter()
+
+    audio = MP4(path)
+    audio["\xa9nam"] = "Benchmark"
+    audio["covr"] = [MP4Cover(cover, imageformat=MP4Cover.FORMAT_JPEG)]
+    if tuned:
+        audio.save(padding=get_tag_padding)
+        move_moov_first(path)
+    else:
+        audio.save()
+
+    elapsed = time.perf_counter() - start
+    end_bytes = bytes_written()
+    written = end_bytes - start_bytes if start_bytes is not None and end_bytes is not None else None
+    return elapsed, written
+
+
+def format_result(elapsed: float, written: int | None) -> str:
+    """Format a timing and byte count for the results table."""
+    written_text = f"{written / MIB:9.2f} MiB" if written is not None else "        n/a"
+    return f"{elapsed * 1000:8.1f} ms {written_text}"
+
+
+def run(sizes: list[int], retags: int) -> None:
+    """Run the benchmark for each file size."""
+    covers = [os.urandom(size) for size in COVER_SIZES]
+    print(
+        f"{'file':>8}  {'layout':<9} {'first tag':>24}  {'retag (mean)':>24}  {'retag (max)':>24}"
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            for tuned in (True, False):
+                path = Path(temp_dir) / f"bench-{size}.m4a"
+                create_m4a(path, size * MIB, moov_first=not tuned)
+
+                first = tag(path, covers[0], tuned)
+                results = [tag(path, covers[(i + 1) % 2], tuned) for i in range(retags)]
+
+                mean_time = sum(elapsed for elapsed, _ in results) / len(results)
+                written = [w for _, w in results if w is not None]
+                mean_written = sum(written) // len(written) if written else None
+                max_result = max(results, key=lambda result: (result[1] or 0, result[0]))
+
+                print(
+                    f"{size:>5} MiB  {'tuned' if tuned else 'default':<9} "
+                    f"{format_result(*first)}  {format_result(mean_time, mean_written)}  "
+                    f"{format_result(*max_result)}"
+                )
+                path.unlink()
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 32, 128], help="in MiB")
+    parser.add_argument("--retags", type=int, default=6, help="retags per file")
+    args = parser.parse_args()
+    run(args.sizes, args.retags)
+
+
+if __name__ == "__main__":
+    main()
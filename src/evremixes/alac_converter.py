@@ -0,0 +1,135 @@
+"""Derive ALAC files locally from downloaded FLAC files."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from polykit.log import PolyLog
+from polykit.text import color
+
+from evremixes.audio_payload import hash_audio
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from logging import Logger
+
+    from evremixes.metadata_helper import MetadataHelper
+    from evremixes.types import AlbumInfo, TrackMetadata
+
+
+class AlacConverter:
+    """Helper class for converting FLAC files to ALAC with a local encoder.
+
+    Both formats are lossless encodings of the same audio, so converting locally gives identical
+    results to downloading the ALAC files, for roughly half the network transfer. Conversions run in
+    a process pool sized to the number of CPUs, using `ffmpeg` or macOS's `afconvert`.
+    """
+
+    def __init__(self, metadata: MetadataHelper) -> None:
+        self.metadata = metadata
+        self.logger: Logger = PolyLog.get_logger()
+        self.encoder = self.find_encoder()
+
+    @staticmethod
+    def find_encoder() -> str | None:
+        """Get the path to the first available ALAC encoder, or None if there isn't one."""
+        return shutil.which("ffmpeg") or shutil.which("afconvert")
+
+    @property
+    def available(self) -> bool:
+        """Whether a local ALAC encoder was found."""
+        return self.encoder is not None
+
+    def derive_set(
+        self,
+        album_info: AlbumInfo,
+        jobs: list[tuple[TrackMetadata, Path, Path]],
+        is_instrumental: bool,
+        cover_data: bytes,
+        on_converted: Callable[[Path], None] | None = None,
+    ) -> bool:
+        """Convert a downloaded FLAC set to ALAC and tag the results. Returns True if all succeeded.
+
+        Args:
+            album_info: The metadata for the album.
+            jobs: The track, FLAC input path, and ALAC output path for each track to convert.
+            is_instrumental: Whether the tracks are instrumentals.
+            cover_data: The cover art, resized and encoded as JPEG.
+            on_converted: Called with the output path of each track once it's converted and tagged.
+        """
+        if self.encoder is None:
+            return False
+
+        all_successful = True
+
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = {
+                executor.submit(_convert_track, self.encoder, input_path, output_path): (
+                    track,
+                    input_path,
+                    output_path,
+                )
+                for track, input_path, output_path in jobs
+            }
+            for future in as_completed(futures):
+                track, input_path, output_path = futures[future]
+
+                if error := future.result():
+                    self.logger.error("Failed to convert %s: %s", track.track_name, error)
+                    print(color(f"✖ Failed to convert {track.track_name}.", "red"))
+                    all_successful = False
+                    continue
+
+                try:
+                    audio_sha256 = hash_audio(output_path)
+                except (OSError, ValueError) as e:
+                    self.logger.error("Failed to read %s: %s", track.track_name, str(e))
+                    print(color(f"✖ Failed to convert {track.track_name}.", "red"))
+                    all_successful = False
+                    continue
+
+                # The audio came from the FLAC download, so record that as the source
+                if not self.metadata.apply_metadata(
+                    track,
+                    album_info,
+                    output_path,
+                    cover_data,
+                    is_instrumental,
+                    source=self.metadata.read_source(input_path),
+                    audio_sha256=audio_sha256,
+                ):
+                    print(color(f"✖ Failed to add metadata to {track.track_name}.", "red"))
+                    all_successful = False
+                    continue
+
+                if on_converted is not None:
+                    on_converted(output_path)
+                print(color(f"✔ Converted {track.track_name}", "green"))
+
+        return all_successful
+
+
+def _convert_track(encoder: str, input_path: Path, output_path: Path) -> str | None:
+    """Convert a single file in a worker process. Returns an error message if it failed."""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if Path(encoder).stem.lower() == "ffmpeg":
+        # Only keep the audio stream and drop the FLAC tags, since the files get tagged afterward
+        command = [encoder, "-nostdin", "-v", "error", "-y", "-i", str(input_path)]
+        command += ["-map", "0:a", "-map_metadata", "-1", "-c:a", "alac", str(output_path)]
+    else:
+        command = [encoder, "-f", "m4af", "-d", "alac", str(input_path), str(output_path)]
+
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=False)
+    except OSError as e:
+        return str(e)
+
+    if result.returncode != 0:
+        return result.stderr.strip() or f"Encoder exited with status {result.returncode}"
+    return None
@@ -0,0 +1,187 @@
+"""Pre-aggregated download analytics, kept up to date as each session is saved."""
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+# Counters kept for each combination of platform, format, and version
+SESSIONS, DOWNLOADS, SUCCESSFUL = range(3)
+
+
+@dataclass(slots=True)
+class RollupTotals:
+    """Totals for the sessions matching a query, with a breakdown of sessions by each dimension."""
+
+    sessions: int = 0
+    downloads: int = 0
+    successful: int = 0
+    platforms: Counter[str] = field(default_factory=Counter)
+    formats: Counter[str] = field(default_factory=Counter)
+    versions: Counter[str] = field(default_factory=Counter)
+
+    def add(self, dimensions: str, counts: list[int]) -> None:
+        """Add the counts for one combination of platform, format, and version."""
+        platform, audio_format, version = dimensions.split("|")
+        self.sessions += counts[SESSIONS]
+        self.downloads += counts[DOWNLOADS]
+        self.successful += counts[SUCCESSFUL]
+        self.platforms[platform] += counts[SESSIONS]
+        self.formats[audio_format] += counts[SESSIONS]
+        self.versions[version] += counts[SESSIONS]
+
+
+class AnalyticsRollups:
+    """Daily and weekly totals of download sessions, so queries never read the sessions themselves.
+
+    Each bucket holds counters for every combination of platform, format, and version seen that
+    day or week. Days are stored in a file per month and ISO weeks in a file per year, and saving a
+    session updates one of each. A query covers whole weeks from the weekly files and only reads
+    daily files for the days at either end, so it reads a handful of small files no matter how many
+    sessions have been recorded.
+    """
+
+    def __init__(self, rollup_dir: Path) -> None:
+        self.rollup_dir = rollup_dir
+
+    @property
+    def exists(self) -> bool:
+        """Whether any rollups have been saved."""
+        return self.rollup_dir.is_dir() and any(self.rollup_dir.glob("*.json"))
+
+    def add_session(self, session_data: dict[str, Any]) -> None:
+        """Add a session to the rollups for its day and week."""
+        day = self._get_session_date(session_data)
+        dimensions = self._get_dimensions(
+            session_data.get("platform"), session_data.get("format"), session_data.get("version")
+        )
+        counts = [
+            1,
+            int(session_data.get("total_downloads", 0)),
+            int(session_data.get("successful_downloads", 0)),
+        ]
+
+        self.rollup_dir.mkdir(parents=True, exist_ok=True)
+        for path, bucket in (
+            (self._daily_path(day), day.isoformat()),
+            (self._weekly_path(day), self._week_key(day)),
+        ):
+            data = self._load(path)
+            totals = data.setdefault(bucket, {}).setdefault(dimensions, [0, 0, 0])
+            for index, count in enumerate(counts):
+                totals[index] += count
+            self._save(path, data)
+
+    def rebuild(self, sessions: list[dict[str, Any]]) -> None:
+        """Replace the rollups with ones built from the given sessions."""
+        for path in self.rollup_dir.glob("*.json"):
+            path.unlink()
+        for session_data in sessions:
+            self.add_session(session_data)
+
+    def query(
+        self,
+        since: date | None = None,
+        until: date | None = None,
+        platform: str | None = None,
+        audio_format: str | None = None,
+        version: str | None = None,
+    ) -> RollupTotals:
+        """Get the totals for sessions in a date range that match the given filters.
+
+        Args:
+            since: The first day to include, or None for the start of the rollups.
+            until: The last day to include, or None for today.
+            platform: Only include sessions on this platform (case-insensitive).
+            audio_format: Only include sessions in this format (case-insensitive).
+            version: Only include sessions that downloaded this version (case-insensitive).
+        """
+        totals = RollupTotals()
+        since = since or self._get_first_date()
+        until = until or datetime.now().astimezone().date()
+        if since is None:
+            return totals
+
+        filters = [
+            value.casefold() if value else None for value in (platform, audio_format, version)
+        ]
+        cache: dict[Path, dict[str, Any]] = {}
+
+        day = since
+        while day <= until:
+            # Use the weekly total for any whole week in the range
+            if day.isoweekday() == 1 and day + timedelta(days=6) <= until:
+                path, bucket, step = self._weekly_path(day), self._week_key(day), 7
+            else:
+                path, bucket, step = self._daily_path(day), day.isoformat(), 1
+
+            if path not in cache:
+                cache[path] = self._load(path)
+            for dimensions, counts in cache[path].get(bucket, {}).items():
+                if all(
+                    wanted is None or wanted == value.casefold()
+                    for wanted, value in zip(filters, dimensions.split("|"), strict=True)
+                ):
+                    totals.add(dimensions, counts)
+
+            day += timedelta(days=step)
+
+        return totals
+
+    def _get_first_date(self) -> date | None:
+        """Get the first day covered by the rollup files, going by their names."""
+        starts = []
+        for path in self.rollup_dir.glob("*.json"):
+            kind, _, period = path.stem.partition("-")
+            if kind == "daily":
+                starts.append(date.fromisoformat(f"{period}-01"))
+            elif kind == "weekly":
+                starts.append(date.fromisocalendar(int(period), 1, 1))
+        return min(starts, default=None)
+
+    def _daily_path(self, day: date) -> Path:
+        return self.rollup_dir / f"daily-{day:%Y-%m}.json"
+
+    def _weekly_path(self, day: date) -> Path:
+        return self.rollup_dir / f"weekly-{day.isocalendar().year}.json"
+
+    @staticmethod
+    def _week_key(day: date) -> str:
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+
+    @staticmethod
+    def _get_session_date(session_data: dict[str, Any]) -> date:
+        """Get the local date a session was saved on, or today if it isn't recorded."""
+        try:
+            return datetime.fromisoformat(session_data["timestamp"]).date()
+        except (KeyError, TypeError, ValueError):
+            return datetime.now().astimezone().date()
+
+    @staticmethod
+    def _get_dimensions(platform: str | None, audio_format: str | None, version: str | None) -> str:
+        return "|".join(
+            (value or "Unknown").replace("|", "/") for value in (platform, audio_format, version)
+        )
+
+    @staticmethod
+    def _load(path: Path) -> dict[str, Any]:
+        try:
+            with path.open() as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save(path: Path, data: dict[str, Any]) -> None:
+        """Write a rollup file atomically, so a query never sees it half written."""
+        temp_path = path.with_suffix(".tmp")
+        with temp_path.open("w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        temp_path.replace(path)
@@ -4,11 +4,19 @@ from __future__ import annotations
 
 import json
 import operator
+from datetime import date
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
+from polykit.cli import PolyArgs
 from polykit.text import print_color
 
+from evremixes.analytics_rollups import AnalyticsRollups
+
+if TYPE_CHECKING:
+    import argparse
+    from collections import Counter
+
 
 class AnalyticsViewer:
     """Viewer for analytics data."""
@@ -21,6 +29,7 @@ class AnalyticsViewer:
         """
         self.analytics_file = analytics_file or Path.home() / ".evremixes" / "analytics.json"
         self.analytics_file.parent.mkdir(exist_ok=True)
+        self.rollups = AnalyticsRollups(self.analytics_file.parent / "rollups")
 
     def save_session_data(self, session_data: dict[str, Any]) -> None:
         """Save session data to analytics file.
@@ -46,93 +55,116 @@ class AnalyticsViewer:
             with self.analytics_file.open("w") as f:
                 json.dump(existing_data, f, indent=2)
 
+            # Update the totals for the day and week, building them first if they're new
+            if self.rollups.exists:
+                self.rollups.add_session(session_data)
+            else:
+                self.rollups.rebuild(existing_data)
+
         except Exception:
             # Don't let analytics failures affect the main functionality
             pass
 
-    def display_stats(self) -> None:
-        """Display analytics statistics."""
-        try:
-            if not self.analytics_file.exists():
-                print_color("No analytics data found.", "yellow")
-                return
+    def display_stats(
+        self,
+        since: date | None = None,
+        until: date | None = None,
+        platform: str | None = None,
+        audio_format: str | None = None,
+        version: str | None = None,
+    ) -> None:
+        """Display analytics statistics, optionally for a date range or matching filters.
+
+        The totals come from the rollups, so this takes the same time however much history there
+        is. Recent activity is only shown without filters, since it comes from the session list.
 
-            with self.analytics_file.open() as f:
-                sessions = json.load(f)
+        Args:
+            since: The first day to include.
+            until: The last day to include.
+            platform: Only include sessions on this platform.
+            audio_format: Only include sessions in this format.
+            version: Only include sessions that downloaded this version.
+        """
+        try:
+            # Build the rollups from the session list the first time after upgrading
+            if not self.rollups.exists and self.analytics_file.exists():
+                with self.analytics_file.open() as f:
+                    self.rollups.rebuild(json.load(f))
 
-            if not sessions:
+            totals = self.rollups.query(since, until, platform, audio_format, version)
+            if not totals.sessions:
                 print_color("No analytics data found.", "yellow")
                 return
 
-            total_sessions = len(sessions)
-            total_downloads = sum(session.get("total_downloads", 0) for session in sessions)
-            successful_downloads = sum(
-                session.get("successful_downloads", 0) for session in sessions
-            )
-
-            # Platform breakdown
-            platforms = {}
-            formats = {}
-            versions = {}
-
-            for session in sessions:
-                platform = session.get("platform", "Unknown")
-                platforms[platform] = platforms.get(platform, 0) + 1
-
-                format_used = session.get("format", "Unknown")
-                formats[format_used] = formats.get(format_used, 0) + 1
-
-                version_used = session.get("version", "Unknown")
-                versions[version_used] = versions.get(version_used, 0) + 1
-
             print_color("\n🎵 EvRemixes Download Analytics", "cyan")
             print_color("=" * 35, "cyan")
 
             print_color("\n📊 Overall Statistics:", "green")
-            print_color(f"  • Total Sessions: {total_sessions}", "white")
-            print_color(f"  • Total Downloads: {total_downloads}", "white")
-            print_color(f"  • Successful Downloads: {successful_downloads}", "white")
-            if total_downloads > 0:
-                success_rate = (successful_downloads / total_downloads) * 100
+            print_color(f"  • Total Sessions: {totals.sessions}", "white")
+            print_color(f"  • Total Downloads: {totals.downloads}", "white")
+            print_color(f"  • Successful Downloads: {totals.successful}", "white")
+            if totals.downloads > 0:
+                success_rate = (totals.successful / totals.downloads) * 100
                 print_color(f"  • Success Rate: {success_rate:.1f}%", "white")
 
-            print_color("\n💻 Platform Breakdown:", "green")
-            for platform, count in sorted(
-                platforms.items(), key=operator.itemgetter(1), reverse=True
-            ):
-                print_color(f"  • {platform}: {count} sessions", "white")
-
-            print_color("\n🎧 Format Preferences:", "green")
-            for format_name, count in sorted(
-                formats.items(), key=operator.itemgetter(1), reverse=True
-            ):
-                print_color(f"  • {format_name}: {count} sessions", "white")
-
-            print_color("\n🎼 Version Preferences:", "green")
-            for version, count in sorted(
-                versions.items(), key=operator.itemgetter(1), reverse=True
-            ):
-                print_color(f"  • {version}: {count} sessions", "white")
-
-            # Recent activity
-            recent_sessions = sessions[-5:]
-            print_color("\n🕒 Recent Activity (Last 5 Sessions):", "green")
-            for i, session in enumerate(reversed(recent_sessions), 1):
-                downloads = session.get("successful_downloads", 0)
-                platform = session.get("platform", "Unknown")
-                format_used = session.get("format", "Unknown")
-                print_color(f"  {i}. {downloads} downloads on {platform} ({format_used})", "white")
+            self._print_breakdown("💻 Platform Breakdown", totals.platforms)
+            self._print_breakdown("🎧 Format Preferences", totals.formats)
+            self._print_breakdown("🎼 Version Preferences", totals.versions)
+
+            if not any((since, until, platform, audio_format, version)):
+                self._print_recent_activity()
 
             print_color("\n" + "=" * 35, "cyan")
 
         except Exception as e:
             print_color(f"Error reading analytics data: {e}", "red")
 
+    def _print_breakdown(self, title: str, counts: Counter[str]) -> None:
+        print_color(f"\n{title}:", "green")
+        for name, count in sorted(counts.items(), key=operator.itemgetter(1), reverse=True):
+            print_color(f"  • {name}: {count} sessions", "white")
+
+    def _print_recent_activity(self) -> None:
+        """Show the last five sessions from the session list."""
+        if not self.analytics_file.exists():
+            return
+        with self.analytics_file.open() as f:
+            sessions = json.load(f)
+
+        print_color("\n🕒 Recent Activity (Last 5 Sessions):", "green")
+        for i, session in enumerate(reversed(sessions[-5:]), 1):
+            downloads = session.get("successful_downloads", 0)
+            platform = session.get("platform", "Unknown")
+            format_used = session.get("format", "Unknown")
+            print_color(f"  {i}. {downloads} downloads on {platform} ({format_used})", "white")
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = PolyArgs(description=__doc__, lines=1)
+    parser.add_argument(
+        "--since",
+        metavar="DATE",
+        type=date.fromisoformat,
+        help="only include sessions on or after this date (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--until",
+        metavar="DATE",
+        type=date.fromisoformat,
+        help="only include sessions on or before this date (YYYY-MM-DD)",
+    )
+    parser.add_argument("--platform", help="only include sessions on this platform, like Darwin")
+    parser.add_argument("--format", help="only include sessions in this format, like flac")
+    parser.add_argument("--version", help="only include sessions that downloaded this version")
+    return parser.parse_args()
+
 
 def main() -> None:
     """Display analytics statistics."""
+    args = parse_arguments()
     viewer = AnalyticsViewer()
-    viewer.display_stats()
+    viewer.display_stats(args.since, args.until, args.platform, args.format, args.version)
 
 
 if __name__ == "__main__":
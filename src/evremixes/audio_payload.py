@@ -0,0 +1,126 @@
+"""Locate and fingerprint the audio in a track file, separately from its tags."""
+
+from __future__ import annotations
+
+import hashlib
+import struct
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+HASH_CHUNK_SIZE = 256 * 1024
+
+
+def get_audio_ranges(path: Path) -> list[tuple[int, int]]:
+    """Get the offset and length of each run of audio data in a FLAC or MP4 file.
+
+    Only the headers are read. Retagging a file moves its audio around but never changes it, so
+    the size and hash of these ranges identify the audio regardless of the tags.
+
+    Raises:
+        ValueError: If the file isn't a FLAC or MP4 file or its structure is invalid.
+        OSError: If the file can't be read.
+    """
+    if path.suffix.lower() == ".flac":
+        return _get_flac_ranges(path)
+    if path.suffix.lower() == ".m4a":
+        return _get_mp4_ranges(path)
+    msg = f"Unsupported file type: {path.suffix}"
+    raise ValueError(msg)
+
+
+def get_audio_size(path: Path) -> int:
+    """Get the total size of the audio data in a file, reading only the headers."""
+    return sum(length for _, length in get_audio_ranges(path))
+
+
+def hash_audio(path: Path) -> str:
+    """Get the SHA-256 hash of the audio data in a file, ignoring the tags."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for offset, length in get_audio_ranges(path):
+            f.seek(offset)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+                if not chunk:
+                    msg = "File is shorter than its headers say"
+                    raise ValueError(msg)
+                digest.update(chunk)
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """Get the SHA-256 hash of a whole file, tags and all."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _get_flac_ranges(path: Path) -> list[tuple[int, int]]:
+    """Skip the metadata blocks at the start of a FLAC file; everything after them is audio."""
+    file_size = path.stat().st_size
+    with path.open("rb") as f:
+        offset = 0
+        header = f.read(10)
+
+        # Skip an ID3v2 tag if there is one (its size is stored as a syncsafe integer)
+        if header[:3] == b"ID3" and len(header) == 10:
+            size = 0
+            for byte in header[6:10]:
+                size = (size << 7) | (byte & 0x7F)
+            offset = 10 + size + (10 if header[5] & 0x10 else 0)
+
+        f.seek(offset)
+        if f.read(4) != b"fLaC":
+            msg = "Not a FLAC file"
+            raise ValueError(msg)
+        offset += 4
+
+        is_last = False
+        while not is_last:
+            block_header = f.read(4)
+            if len(block_header) < 4:
+                msg = "FLAC metadata is truncated"
+                raise ValueError(msg)
+            is_last = bool(block_header[0] & 0x80)
+            offset += 4 + int.from_bytes(block_header[1:4], "big")
+            f.seek(offset)
+
+    if offset >= file_size:
+        msg = "FLAC file has no audio"
+        raise ValueError(msg)
+    return [(offset, file_size - offset)]
+
+
+def _get_mp4_ranges(path: Path) -> list[tuple[int, int]]:
+    """Find the `mdat` atoms at the top level of an MP4 file, which hold the audio."""
+    file_size = path.stat().st_size
+    ranges: list[tuple[int, int]] = []
+    with path.open("rb") as f:
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            size, atom_type = struct.unpack(">I4s", f.read(8))
+            header_size = 8
+            if size == 1:  # 64-bit size follows the type
+                (size,) = struct.unpack(">Q", f.read(8))
+                header_size = 16
+            elif size == 0:  # Atom extends to the end of the file
+                size = file_size - offset
+
+            if size < header_size or offset + size > file_size:
+                msg = "MP4 atoms are truncated or invalid"
+                raise ValueError(msg)
+            if atom_type == b"mdat":
+                ranges.append((offset + header_size, size - header_size))
+            offset += size
+
+    if not ranges:
+        msg = "MP4 file has no audio"
+        raise ValueError(msg)
+    return ranges
@@ -0,0 +1,186 @@
+"""Adjust how many downloads run at once from the throughput they're getting."""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, ClassVar
+
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+@dataclass(slots=True)
+class LimitChange:
+    """A change to the number of downloads allowed at once, and why it was made."""
+
+    time: float
+    limit: int
+    reason: str
+    throughput: float | None = None
+
+
+class ConcurrencyController:
+    """An AIMD limit on the number of downloads in flight, driven by their combined throughput.
+
+    Downloads take a slot before they start transferring and give it back when they're done, and
+    slots are handed out in the order they were asked for, so tracks still start largest first.
+    While every slot is busy, throughput is sampled every couple of seconds. After it holds steady
+    for a few samples, the limit goes up by one to try another connection, and it keeps going up
+    while each increase raises throughput; an increase that didn't help is given back. A noticeable
+    fall in throughput cuts the limit by a quarter, and timeouts and 429 or 503 responses halve it
+    right away, but only once per sample, so a burst of failures from the same congestion counts
+    once.
+
+    A controller with the same minimum and maximum keeps the limit fixed.
+    """
+
+    SAMPLE_SECONDS: ClassVar[float] = 2.0
+    MIN_GAIN: ClassVar[float] = 0.05  # Rise in throughput that's worth another connection
+    MAX_DROP: ClassVar[float] = 0.15  # Fall in throughput that's taken as congestion
+    DROP_FACTOR: ClassVar[float] = 0.75
+    BACKOFF_FACTOR: ClassVar[float] = 0.5
+    PROBE_SAMPLES: ClassVar[int] = 3  # Steady samples before trying another connection
+    DEFAULT_MAXIMUM: ClassVar[int] = 16
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = DEFAULT_MAXIMUM) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.active = 0
+        self.changes: list[LimitChange] = []
+
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._draining = False
+
+        self._sample_start = time.monotonic()
+        self._sample_bytes = 0
+        self._saturated = True
+        self._previous: float | None = None
+        self._last_backoff = float("-inf")
+        self._increased = False
+        self._steady_samples = self.PROBE_SAMPLES  # Probe as soon as there's a baseline
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold a download slot for the enclosed transfer, waiting for one to be free."""
+        self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    def record(self, num_bytes: int) -> None:
+        """Count bytes received, adjusting the limit once enough time has passed to judge."""
+        with self._condition:
+            self._sample_bytes += num_bytes
+            now = time.monotonic()
+            if now - self._sample_start >= self.SAMPLE_SECONDS:
+                self._evaluate(self._sample_bytes / (now - self._sample_start))
+                self._start_sample(now)
+
+    def back_off(self, reason: str) -> None:
+        """Halve the limit after a timeout or a response asking for fewer requests."""
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_backoff < self.SAMPLE_SECONDS:
+                return
+            self._last_backoff = now
+            self._set_limit(int(self.limit * self.BACKOFF_FACTOR), reason)
+            self._previous = None
+            self._start_sample(now)
+
+    def drain(self) -> None:
+        """Let everything waiting for a slot through at once, as when the run is cancelled."""
+        with self._condition:
+            self._draining = True
+            self._condition.notify_all()
+
+    def take_changes(self) -> list[LimitChange]:
+        """Get the changes made since the last call."""
+        with self._condition:
+            changes, self.changes = self.changes, []
+            return changes
+
+    def _acquire(self) -> None:
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._condition.wait_for(
+                lambda: self._draining or (ticket == self._serving and self.active < self.limit)
+            )
+            self._serving = max(self._serving, ticket + 1)
+            self.active += 1
+            self._condition.notify_all()
+
+    def _release(self) -> None:
+        with self._condition:
+            self.active -= 1
+            if self._serving == self._next_ticket:  # A slot is free with nothing waiting for it
+                self._saturated = False
+            self._condition.notify_all()
+
+    def _evaluate(self, throughput: float) -> None:
+        """Adjust the limit based on how the latest throughput compares with the one before."""
+        previous, self._previous = self._previous, throughput
+        if not self._saturated:  # The limit wasn't what held throughput back
+            self._previous = None
+            return
+        if not previous:
+            return
+
+        change = throughput / previous - 1
+        if change <= -self.MAX_DROP:
+            self._set_limit(int(self.limit * self.DROP_FACTOR), "throughput falling", throughput)
+            self._previous = None
+        elif self._increased:
+            # Keep adding connections while each one helps, and give back one that didn't
+            if change >= self.MIN_GAIN:
+                self._set_limit(self.limit + 1, "throughput rising", throughput)
+            else:
+                self._set_limit(self.limit - 1, "no gain from last increase", throughput)
+        elif self._steady_samples >= self.PROBE_SAMPLES:
+            self._set_limit(self.limit + 1, "probing", throughput)
+        else:
+            self._steady_samples += 1
+
+    def _set_limit(self, limit: int, reason: str, throughput: float | None = None) -> None:
+        limit = min(max(limit, self.minimum), self.maximum)
+        if limit == self.limit:
+            self._increased = False
+            return
+        self._increased = limit > self.limit
+        self._steady_samples = 0
+        self.limit = limit
+        self.changes.append(LimitChange(time.time(), limit, reason, throughput))
+        self._condition.notify_all()
+
+    def _start_sample(self, now: float) -> None:
+        self._sample_start = now
+        self._sample_bytes = 0
+        # Downloads still waiting take any free slots at once, as when the limit has just gone up
+        self._saturated = self.active >= self.limit or self._serving < self._next_ticket
+
+
+def get_congestion_reason(error: requests.RequestException) -> str | None:
+    """Get why a failed request points to congestion, or None if it doesn't."""
+    if isinstance(error, requests.Timeout):
+        return "timeout"
+
+    # Timeouts partway through a response body come through as connection errors
+    if isinstance(error, requests.ConnectionError) and any(
+        isinstance(arg, ReadTimeoutError) for arg in error.args
+    ):
+        return "timeout"
+
+    status = error.response.status_code if error.response is not None else None
+    if isinstance(error, requests.HTTPError) and status in {429, 503}:
+        return f"HTTP {status}"
+    return None
@@ -5,12 +5,20 @@ from typing import TYPE_CHECKING, ClassVar
 
 from polykit.paths import PolyPath
 
+from evremixes.memory_budget import MemoryBudget
 from evremixes.menu_helper import MenuHelper
+from evremixes.profiler import StageProfiler
+from evremixes.remote_files import create_session
+from evremixes.types import AudioFormat
 
 if TYPE_CHECKING:
     from pathlib import Path
 
-    from evremixes.types import AudioFormat, TrackVersions
+    import requests
+
+    from evremixes.download_cache import DownloadCache
+    from evremixes.track_filter import TrackFilter
+    from evremixes.types import AlbumInfo, RemoteFile, TrackVersions
 
 
 @dataclass
@@ -19,37 +27,96 @@ class DownloadConfig:
 
     REPO_BASE: ClassVar[str] = "https://github.com/dannystewart/evremixes/raw/refs/heads/main"
     TRACKLIST_URL: ClassVar[str] = f"{REPO_BASE}/evtracks.json"
-    ONEDRIVE_SUBFOLDER: ClassVar[str] = "Music/Danny Stewart/Evanescence Remixes"
+    CATALOG_URL: ClassVar[str] = f"{REPO_BASE}/evcatalog.json"
+    ONEDRIVE_SUBFOLDER: ClassVar[str] = "Music/Danny Stewart"
     ANALYTICS_ENDPOINT: ClassVar[str] = "https://prismbot.app/evremixes/analytics"
 
     # Path helper
     paths: PolyPath = field(init=False)
 
+    # HTTP session shared by all requests, so connections are reused
+    session: requests.Session = field(init=False)
+
+    # Size and ETag of files whose details are listed in a tracklist, by URL
+    known_files: dict[str, RemoteFile] = field(init=False)
+
+    # Profiling hooks for each stage of a run (only active if enabled)
+    profiler: StageProfiler = field(init=False)
+
+    # Limit on data buffered in memory at once, shared by all downloads and tagging
+    memory: MemoryBudget = field(init=False)
+
     # Whether to download as admin (all tracks and formats direct to OneDrive)
     is_admin: bool
 
+    # Where to get the catalog and the default tracklist, which can be a mirror (no catalog if None)
+    catalog_url: str | None = CATALOG_URL
+    tracklist_url: str = TRACKLIST_URL
+
+    # Album to download (if None, admin gets all albums and users are prompted if there are several)
+    album_name: str | None = None
+
     # User choices made at runtime
     versions: TrackVersions | None = None
     audio_format: AudioFormat | None = None
     location: Path | None = None
 
-    def __post_init__(self):
-        self.paths = PolyPath("evremixes")
+    # Additional locations that each get their own copy of everything downloaded
+    extra_locations: list[Path] = field(default_factory=list)
+
+    # Only sync the tracks that match this filter, leaving other existing files alone
+    track_filter: TrackFilter | None = None
+
+    # Download cache shared with other processes and users on this machine, if configured
+    cache: DownloadCache | None = None
+
+    # Whether admin downloads should get FLAC only and convert to ALAC locally
+    derive_alac: bool = False
 
-    @property
-    def onedrive_folder(self) -> Path:
-        """Get the OneDrive folder path for admin downloads."""
-        return self.paths.from_onedrive(self.ONEDRIVE_SUBFOLDER)
+    # Whether to measure the loudness of FLAC downloads and add ReplayGain tags
+    replaygain: bool = False
 
-    @classmethod
-    def create(cls, is_admin: bool = False) -> DownloadConfig:
-        """Create a new download configuration."""
-        config = cls(is_admin=is_admin)
+    # Number of tracks to download at the same time, to start with
+    max_workers: int = 4
 
-        if not is_admin:
-            menu = MenuHelper(config)
-            config.versions = menu.prompt_for_versions()
-            config.audio_format = menu.prompt_for_format()
-            config.location = menu.prompt_for_location()
+    # Most tracks to download at the same time as the number adapts to throughput
+    worker_ceiling: int = 16
 
-        return config
+    # Whether to open the destination folder in the OS file browser when finished
+    open_when_done: bool = True
+
+    def __post_init__(self):
+        self.paths = PolyPath("evremixes")
+        self.session = create_session()
+        self.known_files = {}
+        self.profiler = StageProfiler()
+        self.memory = MemoryBudget()
+
+    def update_known_files(self, album_info: AlbumInfo) -> None:
+        """Record the file details an album's tracklist lists, replacing those from an older one.
+
+        Details for the album's files that the tracklist no longer lists are dropped, so those
+        files are checked with HEAD requests rather than against what an earlier version said.
+        """
+        for track in album_info.tracks:
+            for file_format in AudioFormat:
+                for is_instrumental in (False, True):
+                    self.known_files.pop(track.get_file_url(file_format, is_instrumental), None)
+        self.known_files.update(album_info.get_remote_files())
+
+    def get_onedrive_folder(self, album_folder: str) -> Path:
+        """Get the OneDrive folder path for admin downloads of the given album."""
+        return self.paths.from_onedrive(self.ONEDRIVE_SUBFOLDER, album_folder)
+
+    def prompt_for_choices(self) -> None:
+        """Ask the user which versions and format to download, and where to put them.
+
+        Choices that have already been made (such as from command-line arguments) are skipped.
+        """
+        menu = MenuHelper(self)
+        if self.versions is None:
+            self.versions = menu.prompt_for_versions()
+        if self.audio_format is None:
+            self.audio_format = menu.prompt_for_format()
+        if self.location is None:
+            self.location = menu.prompt_for_location()
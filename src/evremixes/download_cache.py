@@ -0,0 +1,184 @@
+"""Cache downloads in a folder shared between users and processes on the same machine."""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import sys
+from contextlib import contextmanager
+from dataclasses import asdict
+from typing import TYPE_CHECKING, ClassVar
+
+from polykit.log import PolyLog
+
+from evremixes.file_links import link_or_copy
+from evremixes.remote_files import head_file
+from evremixes.types import RemoteFile
+
+if sys.platform != "win32":
+    import fcntl
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from logging import Logger
+    from pathlib import Path
+
+    import requests
+
+
+class DownloadCache:
+    """A read-through cache of downloaded files, stored by URL and validator.
+
+    Before downloading, the file's ETag (or Last-Modified date and size) is checked with a HEAD
+    request, and the cache is keyed on that along with the URL, so a file that changes on the
+    server is never served stale. Each entry has a lock file, so when several processes want the
+    same file at once, one downloads it while the rest wait and then copy it from the cache.
+
+    The cache is kept under its size limit by removing the least recently used entries. Entries
+    that another process is using are never removed. File locking isn't available on Windows, so
+    the cache is POSIX-only.
+
+    For the cache to be shared between users, its folder should be writable by all of them (for
+    example, group-writable with the setgid bit set).
+    """
+
+    DEFAULT_MAX_SIZE: ClassVar[int] = 10 * 1024 * 1024 * 1024
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_size: int = DEFAULT_MAX_SIZE,
+        session: requests.Session | None = None,
+    ) -> None:
+        self.logger: Logger = PolyLog.get_logger()
+        self.max_size = max_size
+        self.session = session
+        self.objects_dir = cache_dir / "objects"
+        self.locks_dir = cache_dir / "locks"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.locks_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def is_supported() -> bool:
+        """Whether the shared cache can be used on this platform."""
+        return sys.platform != "win32"
+
+    def fetch(
+        self, url: str, output_path: Path, download: Callable[[Path], RemoteFile | None]
+    ) -> tuple[RemoteFile | None, bool]:
+        """Put the file at a URL in the output path, from the cache if it's there.
+
+        Args:
+            url: The URL of the file.
+            output_path: Where to put the file.
+            download: Downloads the URL to the given path. Returns the details of the file from
+                the response, or None if the download was cancelled.
+
+        Returns:
+            The details of the file (or None if cancelled) and whether it came from the cache.
+
+        Raises:
+            requests.RequestException: If the download fails.
+            OSError: If the file can't be written.
+        """
+        remote = head_file(url, self.session)
+        key = self._get_key(url, remote) if remote is not None else None
+        if key is None:  # Nothing to tell versions apart by, so it can't be cached safely
+            return download(output_path), False
+
+        object_path = self.objects_dir / key
+        with self._locked(self.locks_dir / f"{key}.lock"):
+            if object_path.exists():
+                # Mark it as recently used, which only the user who cached it may be allowed to do
+                with contextlib.suppress(OSError):
+                    os.utime(object_path)
+                link_or_copy(object_path, output_path, allow_hardlink=False)
+                return self._load_details(key) or remote, True
+
+            partial_path = self.objects_dir / f"{key}.partial"
+            try:
+                source = download(partial_path)
+                if source is None or self._get_key(url, source) != key:
+                    # Cancelled, or the file changed since the HEAD request, so don't cache it
+                    if source is not None:
+                        partial_path.replace(output_path)
+                    return source, False
+
+                partial_path.replace(object_path)
+                self._save_details(key, source)
+            finally:
+                partial_path.unlink(missing_ok=True)
+
+            link_or_copy(object_path, output_path, allow_hardlink=False)
+
+        self.evict()
+        return source, False
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache is under its size limit."""
+        with self._locked(self.locks_dir / "evict.lock", blocking=False) as locked:
+            if not locked:  # Another process is already on it
+                return
+
+            entries = []
+            for path in self.objects_dir.iterdir():
+                if path.suffix:  # Skip details and partial downloads
+                    continue
+                with contextlib.suppress(OSError):
+                    stat = path.stat()
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                with self._locked(self.locks_dir / f"{path.name}.lock", blocking=False) as free:
+                    if not free:  # In use by another process
+                        continue
+                    path.unlink(missing_ok=True)
+                    path.with_suffix(".json").unlink(missing_ok=True)
+                    total_size -= size
+                    self.logger.debug("Evicted %s from the download cache.", path.name)
+
+    @staticmethod
+    def _get_key(url: str, remote: RemoteFile) -> str | None:
+        """Get the cache key for a version of a file, or None if it has no validators."""
+        if remote.etag:
+            validator = f"etag:{remote.etag}"
+        elif remote.last_modified and remote.size is not None:
+            validator = f"modified:{remote.last_modified}:{remote.size}"
+        else:
+            return None
+        return hashlib.sha256(f"{url}\n{validator}".encode()).hexdigest()
+
+    def _load_details(self, key: str) -> RemoteFile | None:
+        try:
+            with (self.objects_dir / f"{key}.json").open() as f:
+                return RemoteFile(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _save_details(self, key: str, source: RemoteFile) -> None:
+        with (self.objects_dir / f"{key}.json").open("w") as f:
+            json.dump(asdict(source), f)
+
+    @staticmethod
+    @contextmanager
+    def _locked(lock_path: Path, blocking: bool = True) -> Iterator[bool]:
+        """Hold an exclusive lock on a file, waiting for it unless `blocking` is False.
+
+        Yields whether the lock was acquired, which is only False when not blocking.
+        """
+        # Locking doesn't need write access, so other users can lock files created by this one
+        fd = os.open(lock_path, os.O_RDONLY | os.O_CREAT, 0o666)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+        finally:
+            os.close(fd)  # Closing the file releases the lock
@@ -0,0 +1,197 @@
+"""Persistent staging for track sets, so interrupted downloads can pick up where they left off."""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+from dataclasses import asdict, replace
+from enum import StrEnum
+from typing import TYPE_CHECKING, Any
+
+from polykit.log import PolyLog
+
+if TYPE_CHECKING:
+    from logging import Logger
+    from pathlib import Path
+
+    from evremixes.config import DownloadConfig
+    from evremixes.types import AlbumInfo, AudioFormat, TrackMetadata
+
+
+class TrackState(StrEnum):
+    """How far along a track is in the staging area. Each state implies the ones before it."""
+
+    TAGGED = "tagged"
+    VERIFIED = "verified"
+    STAGED = "staged"
+
+
+class SetState(StrEnum):
+    """How far along a set is in the staging area."""
+
+    IN_PROGRESS = "in_progress"
+    COMPLETE = "complete"
+
+
+class DownloadJournal:
+    """Staging folder and journal for a single set of tracks on its way to its final location.
+
+    Each set gets its own folder in the state directory, keyed by its destination, with a journal
+    recording the state of every track. A track only counts as done once it has been tagged, its
+    tags have been read back, and the file has been flushed to disk. The journal is rewritten
+    atomically after every change, so a run that's killed at any point leaves it consistent.
+
+    Tracks are identified by a fingerprint of everything that goes into the file (source URL and
+    metadata), so work staged from an older version of the tracklist is discarded rather than
+    reused. The set is only moved into place once every track is staged, and the staging folder is
+    removed once that's done.
+    """
+
+    JOURNAL_FILENAME = "journal.json"
+
+    def __init__(
+        self,
+        config: DownloadConfig,
+        final_folder: Path,
+        file_format: AudioFormat,
+        is_instrumental: bool,
+    ) -> None:
+        self.logger: Logger = PolyLog.get_logger()
+        self.final_folder = final_folder
+
+        key = f"{final_folder.expanduser().absolute()}|{file_format.value}|{is_instrumental}"
+        set_id = hashlib.sha256(key.encode()).hexdigest()[:16]
+        self.staging_dir = config.paths.from_state("staging", set_id, no_create=True)
+        self.folder = self.staging_dir / final_folder.name
+        self.journal_path = self.staging_dir / self.JOURNAL_FILENAME
+
+        self._lock = threading.Lock()
+        self._data: dict[str, Any] = self._load()
+        self._data.update(final_folder=str(final_folder), format=file_format.value)
+
+    @property
+    def tracks(self) -> dict[str, dict[str, Any]]:
+        """The journal entry for each track, by filename."""
+        return self._data.setdefault("tracks", {})
+
+    @property
+    def state(self) -> SetState:
+        """The state of the set as a whole."""
+        return SetState(self._data.get("state", SetState.IN_PROGRESS))
+
+    @staticmethod
+    def fingerprint(album_info: AlbumInfo, track: TrackMetadata, source_url: str) -> str:
+        """Get a fingerprint of everything that determines the contents of a track's file."""
+        album = asdict(replace(album_info, tracks=[]))
+        content = json.dumps([source_url, album, asdict(track)], sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def prepare(self, expected: dict[str, str]) -> int:
+        """Get the staging folder ready for a set, discarding anything that can't be reused.
+
+        The set stays complete if it was and every track is still staged, in which case it only
+        needs to be put in place.
+
+        Args:
+            expected: The fingerprint of each track in the set, by filename.
+
+        Returns:
+            The number of tracks already staged from a previous run.
+        """
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            complete = self.state is SetState.COMPLETE and all(
+                self._is_reusable(filename, fingerprint)
+                for filename, fingerprint in expected.items()
+            )
+
+            for filename in list(self.tracks):
+                if not self._is_reusable(filename, expected.get(filename)):
+                    del self.tracks[filename]
+
+            # Anything not in the journal is a partial download or from an older tracklist
+            for path in self.folder.iterdir():
+                if path.name not in self.tracks:
+                    if path.is_dir():
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        path.unlink(missing_ok=True)
+
+            self._data["state"] = SetState.COMPLETE if complete else SetState.IN_PROGRESS
+            self._save()
+            return len(self.tracks)
+
+    def is_staged(self, filename: str, fingerprint: str) -> bool:
+        """Check whether a track is already staged and still matches the tracklist."""
+        with self._lock:
+            return self._is_reusable(filename, fingerprint)
+
+    def record(self, filename: str, fingerprint: str, state: TrackState) -> None:
+        """Record that a track has reached the given state.
+
+        Staged files are flushed to disk before being recorded, so a staged entry in the journal
+        always refers to a complete file.
+        """
+        path = self.folder / filename
+        if state is TrackState.STAGED:
+            self._fsync(path)
+
+        with self._lock:
+            self.tracks[filename] = {
+                "fingerprint": fingerprint,
+                "state": state.value,
+                "size": path.stat().st_size if path.exists() else None,
+            }
+            self._save()
+
+    def mark_complete(self) -> None:
+        """Record that every track in the set is staged and it's ready to be moved into place."""
+        with self._lock:
+            self._data["state"] = SetState.COMPLETE
+            self._save()
+
+    def discard(self) -> None:
+        """Remove the staging folder and journal once the set has been moved into place."""
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def _is_reusable(self, filename: str, fingerprint: str | None) -> bool:
+        """Check a track's entry against the tracklist and the file on disk. Needs the lock."""
+        entry = self.tracks.get(filename)
+        if entry is None or fingerprint is None:
+            return False
+        if entry.get("state") != TrackState.STAGED or entry.get("fingerprint") != fingerprint:
+            return False
+
+        path = self.folder / filename
+        return path.is_file() and path.stat().st_size == entry.get("size")
+
+    def _load(self) -> dict[str, Any]:
+        try:
+            with self.journal_path.open() as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning("Ignoring unreadable download journal: %s", str(e))
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _save(self) -> None:
+        """Atomically replace the journal on disk. Must be called with the lock held."""
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.journal_path.with_suffix(".tmp")
+        with temp_path.open("w") as f:
+            json.dump(self._data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path.replace(self.journal_path)
+
+    @staticmethod
+    def _fsync(path: Path) -> None:
+        with contextlib.suppress(OSError), path.open("rb") as f:
+            os.fsync(f.fileno())
@@ -0,0 +1,66 @@
+"""Put files in place as cheaply as the filesystem allows."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+from enum import StrEnum
+from typing import TYPE_CHECKING
+
+if sys.platform == "linux":
+    import fcntl
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+# ioctl request to clone a file's extents (Btrfs, XFS, and other copy-on-write filesystems)
+FICLONE = 0x40049409
+
+
+class LinkMethod(StrEnum):
+    """How a file was put in place."""
+
+    REFLINK = "reflink"
+    HARDLINK = "hardlink"
+    COPY = "copy"
+
+
+def link_or_copy(source: Path, dest: Path, allow_hardlink: bool = True) -> LinkMethod:
+    """Create `dest` with the contents of `source`, using the cheapest method available.
+
+    A reflink is tried first, since it shares storage with the source but is still an independent
+    file. Failing that, a hardlink is made if both are on the same filesystem, and otherwise the
+    file is copied by streaming it. Hardlinks can be ruled out if `dest` is going to be modified.
+
+    Raises:
+        OSError: If the file couldn't be created by any method.
+    """
+    if _reflink(source, dest):
+        return LinkMethod.REFLINK
+
+    if allow_hardlink:
+        try:
+            os.link(source, dest)
+            return LinkMethod.HARDLINK
+        except OSError:
+            pass
+
+    shutil.copy2(source, dest)
+    return LinkMethod.COPY
+
+
+def _reflink(source: Path, dest: Path) -> bool:
+    """Try to clone a file on a copy-on-write filesystem. Returns True if it worked."""
+    if sys.platform != "linux":
+        return False
+
+    try:
+        with source.open("rb") as src, dest.open("wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        dest.unlink(missing_ok=True)
+        return False
+
+    shutil.copystat(source, dest)
+    return True
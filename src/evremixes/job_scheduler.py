@@ -0,0 +1,36 @@
+"""Order downloads so the longest start first and the shorter ones fill in around them."""
+
+from __future__ import annotations
+
+# Rough rates for weighing the work of each file; only their proportions affect the order
+TRANSFER_RATE = 10 * 1024 * 1024
+HASH_RATE = 200 * 1024 * 1024
+TAGGING_SECONDS = 0.5
+
+
+def estimate_cost(size: int) -> float:
+    """Estimate the seconds a worker spends on a file of the given size.
+
+    That's the transfer, plus tagging, which has a fixed cost for the cover art and tags and reads
+    the whole file once to hash the audio.
+    """
+    return size / TRANSFER_RATE + TAGGING_SECONDS + size / HASH_RATE
+
+
+def order_longest_first[T](jobs: list[T], sizes: list[int | None]) -> list[T]:
+    """Order jobs by estimated cost, longest first (LPT scheduling).
+
+    Workers that take jobs in this order finish close together instead of leaving the largest file
+    to run alone at the end, since each of the smaller jobs at the back of the queue goes to
+    whichever worker frees up first. Jobs of unknown size are costed at the average of the known
+    sizes, and jobs of equal cost keep their original order.
+
+    Args:
+        jobs: The jobs, in their original order.
+        sizes: The size in bytes of each job's file, or None if it isn't known.
+    """
+    known = [size for size in sizes if size is not None]
+    fallback = sum(known) // len(known) if known else 0
+    costs = [estimate_cost(fallback if size is None else size) for size in sizes]
+    order = sorted(range(len(jobs)), key=lambda index: costs[index], reverse=True)
+    return [jobs[index] for index in order]
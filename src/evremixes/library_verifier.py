@@ -0,0 +1,171 @@
+"""Check that the files in a library are complete and correctly tagged."""
+
+from __future__ import annotations
+
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from enum import StrEnum
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from polykit.text import color, print_color
+
+from evremixes.audio_payload import get_audio_size, hash_audio
+from evremixes.sync_planner import SyncPlanner
+
+if TYPE_CHECKING:
+    from evremixes.config import DownloadConfig
+    from evremixes.track_downloader import TrackDownloader
+    from evremixes.types import AlbumInfo, TrackMetadata, TrackSet
+
+
+class FileStatus(StrEnum):
+    """The outcome of verifying a single file."""
+
+    OK = "ok"
+    MISSING = "missing"
+    STALE = "stale"
+    CORRUPT = "corrupt"
+
+
+@dataclass(slots=True)
+class FileCheck:
+    """The result of verifying a single file against the tracklist."""
+
+    path: Path
+    album: str
+    status: FileStatus = FileStatus.OK
+    problems: list[str] = field(default_factory=list)
+
+
+class LibraryVerifier:
+    """Check every file the tracklist says should exist, reading only headers and tags.
+
+    A file is missing if it isn't there, corrupt if it can't be read or its audio isn't the size
+    recorded when it was downloaded, and stale if its tags, cover art, or source don't match the
+    tracklist. A deep check also hashes the audio to compare with the hash recorded at download,
+    which is the only time the audio itself is read. Files are checked in a thread pool.
+    """
+
+    MAX_WORKERS: ClassVar[int] = 16
+
+    def __init__(self, config: DownloadConfig, downloader: TrackDownloader) -> None:
+        self.config = config
+        self.downloader = downloader
+        self.metadata = downloader.metadata
+        self.planner = SyncPlanner(config, downloader)
+
+    def verify(self, albums: list[AlbumInfo], deep: bool = False) -> list[FileCheck]:
+        """Verify the files for the given albums. Returns the result for each expected file."""
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            futures = [
+                executor.submit(self.check_file, album_info, track_set, track, deep)
+                for album_info in albums
+                for track_set in self.downloader.get_track_sets(album_info, self.config)
+                for track in album_info.tracks
+            ]
+            return [future.result() for future in futures]
+
+    def check_file(
+        self, album_info: AlbumInfo, track_set: TrackSet, track: TrackMetadata, deep: bool = False
+    ) -> FileCheck:
+        """Verify a single file against the tracklist."""
+        path = track_set.folder / self.downloader.get_track_filename(
+            track, track_set.file_format, track_set.is_instrumental
+        )
+        check = FileCheck(path, album_info.album_name)
+
+        if not path.is_file():
+            return self._fail(check, FileStatus.MISSING, "file not found")
+
+        tags = self.metadata.read_tags(path)
+        if tags is None:
+            return self._fail(check, FileStatus.CORRUPT, "tags can't be read")
+
+        # Check the audio is intact before looking at whether the tags are current
+        try:
+            recorded_size = tags.get("audio_size")
+            if recorded_size and get_audio_size(path) != int(recorded_size):
+                return self._fail(check, FileStatus.CORRUPT, "audio size doesn't match")
+            recorded_hash = tags.get("audio_sha256")
+            if deep and recorded_hash and hash_audio(path) != recorded_hash:
+                return self._fail(check, FileStatus.CORRUPT, "audio hash doesn't match")
+        except (OSError, ValueError) as e:
+            return self._fail(check, FileStatus.CORRUPT, f"audio can't be read: {e}")
+
+        expected = self.metadata.get_expected_tags(track, album_info, track_set.is_instrumental)
+        check.problems.extend(
+            f"{key} is {tags.get(key, '')!r}, expected {value!r}"
+            for key, value in expected.items()
+            if tags.get(key, "") != value
+        )
+        if tags.get("cover_count") != "1":
+            check.problems.append(f"has {tags.get('cover_count') or 0} cover images, expected 1")
+
+        source_url = self.planner.get_source_url(track, track_set)
+        if tags.get("source_url") and tags["source_url"] != source_url:
+            check.problems.append("audio is from an older version of the track")
+
+        if check.problems:
+            check.status = FileStatus.STALE
+        return check
+
+    @staticmethod
+    def build_report(checks: list[FileCheck], deep: bool) -> dict[str, Any]:
+        """Build a machine-readable report listing every file that isn't OK."""
+        return {
+            "verified_at": datetime.now().astimezone().isoformat(),
+            "deep": deep,
+            "summary": {
+                status.value: sum(check.status is status for check in checks)
+                for status in FileStatus
+            },
+            "files": [
+                {**asdict(check), "path": str(check.path)}
+                for check in checks
+                if check.status is not FileStatus.OK
+            ],
+        }
+
+    def save_report(self, report: dict[str, Any], output: str | None) -> None:
+        """Write the report to the given file, or stdout if it's `-`.
+
+        Saves to the state directory if no output is given.
+        """
+        if output == "-":
+            json.dump(report, sys.stdout, indent=2)
+            sys.stdout.write("\n")
+            return
+
+        path = (
+            self.config.paths.from_state("verify-report.json")
+            if output is None
+            else Path(output).expanduser()
+        )
+        with path.open("w") as f:
+            json.dump(report, f, indent=2)
+        print_color(f"Saved report to {path}", "cyan")
+
+    def print_summary(self, checks: list[FileCheck]) -> None:
+        """Print the problems found and a count of each status."""
+        for check in checks:
+            if check.status is not FileStatus.OK:
+                display_path = self.downloader.format_path_for_display(check.path)
+                print(color(f"✖ {check.status.value}: {display_path}", "red"))
+                for problem in check.problems:
+                    print(f"    {problem}")
+
+        counts = ", ".join(
+            f"{sum(check.status is status for check in checks)} {status.value}"
+            for status in FileStatus
+        )
+        print_color(f"\nChecked {len(checks)} files: {counts}", "white")
+
+    @staticmethod
+    def _fail(check: FileCheck, status: FileStatus, problem: str) -> FileCheck:
+        check.status = status
+        check.problems.append(problem)
+        return check
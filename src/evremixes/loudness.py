@@ -0,0 +1,185 @@
+"""Measure integrated loudness and peak level with NumPy, following ITU-R BS.1770-4.
+
+This needs NumPy, which is optional, so it's only imported once NumPy is known to be available.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from functools import cache
+from typing import TYPE_CHECKING, ClassVar
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from numpy.typing import NDArray
+
+# Gating thresholds, in LUFS and LU
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+# Gating blocks are 400 ms long and start every 100 ms
+SEGMENT_SECONDS = 0.1
+SEGMENTS_PER_BLOCK = 4
+
+# Level at which the K-weighting filter's impulse response is cut off (its peak is about 1.5)
+RESPONSE_TOLERANCE = 1e-10
+
+
+@dataclass(slots=True)
+class TrackLoudness:
+    """Loudness measurements for a single track."""
+
+    # Highest absolute sample value, where 1.0 is full scale
+    peak: float
+
+    # Channel-weighted mean square of each gating block, kept for measuring the album as a whole
+    energies: NDArray[np.float64]
+
+    @property
+    def loudness(self) -> float | None:
+        """The integrated loudness in LUFS, or None if the track is silent."""
+        return gated_loudness(self.energies)
+
+
+class LoudnessMeter:
+    """Measure the loudness and peak of audio from blocks of samples as they're decoded.
+
+    The K-weighting filter is applied as its impulse response, which decays to nothing within a
+    fraction of a second, by FFT convolution (overlap-save) across every channel at once. Nothing is
+    filtered sample by sample in Python, and only the mean square of each 100 ms segment is kept,
+    so memory use doesn't grow with the length of the track beyond a few numbers per second.
+    """
+
+    FFT_SIZE: ClassVar[int] = 1 << 16
+
+    def __init__(self, sample_rate: int, channels: int) -> None:
+        self.channels = channels
+        self.weights = channel_weights(channels)
+        self.segment_length = round(sample_rate * SEGMENT_SECONDS)
+
+        response = k_weighting_response(sample_rate)
+        self.fft_size = max(self.FFT_SIZE, 1 << (4 * len(response)).bit_length())
+        self.filter_spectrum = np.fft.rfft(response, self.fft_size)[:, np.newaxis]
+
+        # Each block is filtered along with the input before it that the response reaches back to
+        self.history = np.zeros((len(response) - 1, channels))
+        self.remainder = np.zeros((0, channels))
+        self.segments: list[NDArray[np.float64]] = []
+        self.peak = 0.0
+
+    @property
+    def block_frames(self) -> int:
+        """The number of frames to pass to `add` at a time, to fill each FFT exactly."""
+        return self.fft_size - len(self.history)
+
+    def add(self, samples: NDArray[np.floating]) -> None:
+        """Measure the next block of samples, shaped (frames, channels) and scaled to ±1.0."""
+        for start in range(0, len(samples), self.block_frames):
+            self._add_block(samples[start : start + self.block_frames])
+
+    def result(self) -> TrackLoudness:
+        """Get the measurements so far, ignoring any incomplete gating block at the end."""
+        if not self.segments:
+            return TrackLoudness(self.peak, np.zeros(0))
+
+        segments = np.concatenate(self.segments) @ self.weights
+        if len(segments) < SEGMENTS_PER_BLOCK:
+            return TrackLoudness(self.peak, np.zeros(0))
+
+        blocks = np.lib.stride_tricks.sliding_window_view(segments, SEGMENTS_PER_BLOCK)
+        return TrackLoudness(self.peak, blocks.mean(axis=1))
+
+    def _add_block(self, samples: NDArray[np.floating]) -> None:
+        if not len(samples):
+            return
+        self.peak = max(self.peak, float(samples.max()), -float(samples.min()))
+
+        signal = np.concatenate((self.history, samples))
+        spectrum = np.fft.rfft(signal, self.fft_size, axis=0)
+        filtered = np.fft.irfft(spectrum * self.filter_spectrum, self.fft_size, axis=0)
+        filtered = filtered[len(self.history) : len(signal)]
+        self.history = signal[len(samples) :]
+
+        # Split into whole segments, keeping the rest for the next block
+        squared = np.concatenate((self.remainder, np.square(filtered, out=filtered)))
+        count = len(squared) // self.segment_length
+        whole = squared[: count * self.segment_length]
+        self.segments.append(whole.reshape(count, self.segment_length, self.channels).mean(axis=1))
+        self.remainder = squared[count * self.segment_length :]
+
+
+def gated_loudness(energies: NDArray[np.float64]) -> float | None:
+    """Get the integrated loudness in LUFS of a set of gating blocks, or None if they're silent.
+
+    Blocks quieter than the absolute gate are left out, and then so are those more than 10 LU
+    below the loudness of the rest. Passing the blocks of several tracks together measures them
+    as one, as for album gain.
+    """
+    loud = energies[energies > _to_energy(ABSOLUTE_GATE)]
+    if not len(loud):
+        return None
+
+    relative_gate = _to_loudness(float(loud.mean())) + RELATIVE_GATE
+    return _to_loudness(float(loud[loud > _to_energy(relative_gate)].mean()))
+
+
+def channel_weights(channels: int) -> NDArray[np.float64]:
+    """Get the weight of each channel, boosting the surrounds of 5.1 and leaving out the LFE."""
+    if channels == 6:
+        return np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41])
+    return np.ones(channels)
+
+
+@cache
+def k_weighting_response(sample_rate: int) -> NDArray[np.float64]:
+    """Get the impulse response of the K-weighting filter, up to where it has decayed to nothing.
+
+    The filter is a high shelf modeling the head followed by a high-pass, with the BS.1770
+    coefficients worked out for any sample rate in the same way as libebur128.
+    """
+    # High shelf
+    k = math.tan(math.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh**0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf_b = [
+        (vh + vb * k / q + k * k) / a0,
+        2 * (k * k - vh) / a0,
+        (vh - vb * k / q + k * k) / a0,
+    ]
+    shelf_a = [1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    # High-pass
+    k = math.tan(math.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_pass_b = [1, -2, 1]
+    high_pass_a = [1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    b = np.convolve(shelf_b, high_pass_b)
+    a = np.convolve(shelf_a, high_pass_a)
+
+    # Run the combined filter on an impulse until its output has died away, for at most a second
+    response: list[float] = []
+    inputs = [0.0] * len(b)
+    outputs = [0.0] * (len(a) - 1)
+    for n in range(sample_rate):
+        inputs = [1.0 if n == 0 else 0.0, *inputs[:-1]]
+        value = sum(bi * xi for bi, xi in zip(b, inputs, strict=True))
+        value -= sum(ai * yi for ai, yi in zip(a[1:], outputs, strict=True))
+        outputs = [value, *outputs[:-1]]
+        response.append(value)
+        if n >= len(b) and max(abs(y) for y in outputs) < RESPONSE_TOLERANCE:
+            break
+    return np.array(response)
+
+
+def _to_energy(loudness: float) -> float:
+    return 10 ** ((loudness + 0.691) / 10)
+
+
+def _to_loudness(energy: float) -> float:
+    return -0.691 + 10 * math.log10(energy)
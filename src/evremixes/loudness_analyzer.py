@@ -0,0 +1,181 @@
+"""Measure the loudness of downloaded FLAC files and tag them with ReplayGain."""
+
+from __future__ import annotations
+
+import importlib.util
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING, ClassVar
+
+from mutagen import MutagenError
+from mutagen.flac import FLAC
+from polykit.log import PolyLog
+from polykit.text import color
+
+if TYPE_CHECKING:
+    from logging import Logger
+    from pathlib import Path
+
+    from evremixes.loudness import TrackLoudness
+    from evremixes.metadata_helper import MetadataHelper
+    from evremixes.types import AlbumInfo, TrackMetadata
+
+
+class LoudnessAnalyzer:
+    """Helper class for measuring the loudness of a FLAC set and adding ReplayGain tags.
+
+    Each file is decoded in blocks by `ffmpeg` and measured with NumPy (see `loudness`), in a
+    process pool sized to the number of CPUs with one track per worker. Gains are relative to the
+    ReplayGain 2.0 reference of -18 LUFS. The album gain measures every track together, so it's
+    only added when the whole album is being downloaded.
+    """
+
+    REFERENCE_LOUDNESS: ClassVar[float] = -18.0
+
+    def __init__(self, metadata: MetadataHelper) -> None:
+        self.metadata = metadata
+        self.logger: Logger = PolyLog.get_logger()
+        self.decoder = self.find_decoder()
+
+    @staticmethod
+    def find_decoder() -> str | None:
+        """Get the path to `ffmpeg`, or None if it or NumPy isn't available."""
+        if importlib.util.find_spec("numpy") is None:
+            return None
+        return shutil.which("ffmpeg")
+
+    @property
+    def available(self) -> bool:
+        """Whether both a decoder and NumPy were found."""
+        return self.decoder is not None
+
+    def analyze_set(
+        self,
+        album_info: AlbumInfo,
+        jobs: list[tuple[TrackMetadata, Path]],
+        is_instrumental: bool,
+        cover_data: bytes,
+        include_album: bool,
+    ) -> bool:
+        """Measure a FLAC set and add ReplayGain tags to each file. Returns True if all succeeded.
+
+        Args:
+            album_info: The metadata for the album.
+            jobs: The track and FLAC file for each track in the set.
+            is_instrumental: Whether the tracks are instrumentals.
+            cover_data: The cover art, resized and encoded as JPEG, for retagging.
+            include_album: Whether the set is the whole album, so album gain can be added too.
+        """
+        if self.decoder is None:
+            return False
+
+        measured: dict[Path, TrackLoudness] = {}
+        all_successful = True
+
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = {
+                executor.submit(measure_track, self.decoder, path): (track, path)
+                for track, path in jobs
+            }
+            for future in as_completed(futures):
+                track, path = futures[future]
+                try:
+                    measured[path] = future.result()
+                except (OSError, ValueError) as e:
+                    self.logger.error("Failed to measure %s: %s", track.track_name, str(e))
+                    print(color(f"✖ Failed to measure {track.track_name}.", "red"))
+                    all_successful = False
+
+        # Album gain is only right if every track in the album was measured
+        album_tags = {}
+        if include_album and len(measured) == len(jobs):
+            album_tags = self._get_album_tags(list(measured.values()))
+
+        for track, path in jobs:
+            if path not in measured:
+                continue
+
+            tags = {**self.get_track_tags(measured[path]), **album_tags}
+            if not self.metadata.apply_metadata(
+                track,
+                album_info,
+                path,
+                cover_data,
+                is_instrumental,
+                source=self.metadata.read_source(path),
+                replaygain=tags,
+            ):
+                print(color(f"✖ Failed to add ReplayGain to {track.track_name}.", "red"))
+                all_successful = False
+                continue
+
+            gain = tags.get("REPLAYGAIN_TRACK_GAIN", "silent")
+            print(color(f"✔ Measured {track.track_name} ({gain})", "green"))
+
+        return all_successful
+
+    def get_track_tags(self, loudness: TrackLoudness) -> dict[str, str]:
+        """Get the ReplayGain tags for a single track."""
+        return self._format_tags("TRACK", loudness.loudness, loudness.peak)
+
+    def _get_album_tags(self, tracks: list[TrackLoudness]) -> dict[str, str]:
+        import numpy as np
+
+        from evremixes.loudness import gated_loudness
+
+        loudness = gated_loudness(np.concatenate([track.energies for track in tracks]))
+        return self._format_tags("ALBUM", loudness, max(track.peak for track in tracks))
+
+    def _format_tags(self, scope: str, loudness: float | None, peak: float) -> dict[str, str]:
+        """Format the gain and peak tags for a track or album, leaving out the gain if silent."""
+        tags = {f"REPLAYGAIN_{scope}_PEAK": f"{peak:.6f}"}
+        if loudness is not None:
+            tags[f"REPLAYGAIN_{scope}_GAIN"] = f"{self.REFERENCE_LOUDNESS - loudness:+.2f} dB"
+        return tags
+
+
+def measure_track(decoder: str, path: Path) -> TrackLoudness:
+    """Decode a FLAC file in blocks and measure it in a worker process.
+
+    Raises:
+        OSError: If the file can't be read or the decoder can't be run.
+        ValueError: If the file can't be decoded.
+    """
+    import numpy as np
+
+    from evremixes.loudness import LoudnessMeter
+
+    try:
+        info = FLAC(path).info
+    except MutagenError as e:
+        raise ValueError(e) from e
+    meter = LoudnessMeter(info.sample_rate, info.channels)
+    frame_size = 4 * info.channels
+
+    # Decode to 32-bit float samples on stdout, in whatever layout and rate the file has. Errors go
+    # to a file rather than a pipe, which could fill up and stall the decoder before it finishes.
+    command = [decoder, "-nostdin", "-v", "error", "-i", str(path), "-map", "0:a:0"]
+    command += ["-f", "f32le", "-c:a", "pcm_f32le", "-"]
+    with (
+        tempfile.TemporaryFile() as stderr,
+        subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr) as process,
+    ):
+        assert process.stdout is not None
+        pending = b""
+        while data := process.stdout.read(meter.block_frames * frame_size):
+            # Reads can end partway through a frame, so keep the rest for the next one
+            data = pending + data
+            whole = len(data) - len(data) % frame_size
+            pending = data[whole:]
+            samples = np.frombuffer(data[:whole], dtype="<f4")
+            meter.add(samples.reshape(-1, info.channels))
+        process.wait()
+        stderr.seek(0)
+        errors = stderr.read().decode(errors="replace").strip()
+
+    if process.returncode != 0:
+        raise ValueError(errors or f"Decoder exited with status {process.returncode}")
+    return meter.result()
@@ -9,37 +9,438 @@ Website: https://music.dannystewart.com/evanescence/
 
 from __future__ import annotations
 
+from datetime import date
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from polykit.cli import PolyArgs
 from polykit.env import PolyEnv
+from polykit.text import print_color
 
+from evremixes.concurrency_controller import ConcurrencyController
 from evremixes.config import DownloadConfig
+from evremixes.download_cache import DownloadCache
+from evremixes.library_verifier import FileStatus, LibraryVerifier
+from evremixes.memory_budget import MemoryBudget
+from evremixes.menu_helper import MenuHelper
 from evremixes.metadata_helper import MetadataHelper
+from evremixes.mirror_exporter import MirrorExporter
+from evremixes.run_report import RunReport
+from evremixes.sync_planner import SyncPlanner
+from evremixes.tag_refresher import TagRefresher
 from evremixes.track_downloader import TrackDownloader
+from evremixes.track_filter import TrackFilter
+from evremixes.types import AudioFormat, TrackVersions
+from evremixes.watcher import ManifestWatcher
+
+if TYPE_CHECKING:
+    import argparse
+
+    from evremixes.types import AlbumInfo, CatalogEntry, TrackMetadata
 
 
 class EvRemixes:
     """Evanescence Remix Downloader."""
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        album_name: str | None = None,
+        extra_locations: list[Path] | None = None,
+        track_filter: TrackFilter | None = None,
+        versions: TrackVersions | None = None,
+        audio_format: AudioFormat | None = None,
+        location: Path | None = None,
+    ) -> None:
         self.env = PolyEnv()
         self.env.add_bool("EVREMIXES_ADMIN", attr_name="admin", required=False)
+        self.env.add_bool("EVREMIXES_DERIVE_ALAC", attr_name="derive_alac", required=False)
+        self.env.add_bool("EVREMIXES_PROFILE", attr_name="profile", required=False)
+        self.env.add_bool("EVREMIXES_REPLAYGAIN", attr_name="replaygain", required=False)
+        self.env.add_var(
+            "EVREMIXES_MEMORY_BUDGET",
+            attr_name="memory_budget",
+            required=False,
+            default=MemoryBudget.DEFAULT_LIMIT,
+            var_type=int,
+        )
+        self.env.add_var(
+            "EVREMIXES_WORKERS", attr_name="workers", required=False, default=4, var_type=int
+        )
+        self.env.add_var(
+            "EVREMIXES_MAX_WORKERS",
+            attr_name="max_workers",
+            required=False,
+            default=ConcurrencyController.DEFAULT_MAXIMUM,
+            var_type=int,
+        )
+        self.env.add_var("EVREMIXES_CACHE_DIR", attr_name="cache_dir", required=False)
+        self.env.add_var(
+            "EVREMIXES_CACHE_SIZE",
+            attr_name="cache_size",
+            required=False,
+            default=DownloadCache.DEFAULT_MAX_SIZE,
+            var_type=int,
+        )
+        self.env.add_var("EVREMIXES_CATALOG_URL", attr_name="catalog_url", required=False)
+        self.env.add_var("EVREMIXES_TRACKLIST_URL", attr_name="tracklist_url", required=False)
 
         # Initialize configuration and helpers
-        self.config = DownloadConfig.create(is_admin=self.env.admin)
+        self.config = DownloadConfig(is_admin=self.env.admin)
+        self.config.max_workers = max(1, self.env.workers)
+        self.config.worker_ceiling = max(self.config.max_workers, self.env.max_workers)
+        self.config.derive_alac = self.env.derive_alac
+        self.config.replaygain = self.env.replaygain
+        self.config.memory = MemoryBudget(max(TrackDownloader.CHUNK_SIZE, self.env.memory_budget))
+        self.config.album_name = album_name
+        self.config.extra_locations = extra_locations or []
+        if track_filter is not None and not track_filter.is_empty:
+            self.config.track_filter = track_filter
+
+        # Point at a mirror if configured, where a tracklist on its own means there's no catalog
+        if self.env.tracklist_url:
+            self.config.tracklist_url = self.env.tracklist_url
+            self.config.catalog_url = self.env.catalog_url or None
+        elif self.env.catalog_url:
+            self.config.catalog_url = self.env.catalog_url
+
+        if self.env.cache_dir:
+            self.config.cache = self.create_cache(Path(self.env.cache_dir).expanduser())
+        if self.env.profile:
+            self.config.profiler.enable()
         self.metadata_helper = MetadataHelper(self.config)
-        self.download_helper = TrackDownloader(self.config)
+        self.download_helper = TrackDownloader(self.config, self.metadata_helper)
+
+        # Anything given on the command line isn't asked for
+        self.config.versions = versions
+        self.config.audio_format = audio_format
+        self.config.location = location
+
+        # Fetch everything we'll need in the background while the user answers the menus
+        self.metadata_helper.prefetch()
+        try:
+            if not self.config.is_admin:
+                self.config.prompt_for_choices()
+
+            # Get the catalog and choose albums (their tracks are only loaded when downloading)
+            self.albums = self.select_albums(self.metadata_helper.get_catalog())
+            for album in self.albums:
+                self.metadata_helper.prefetch_album(album.manifest_url)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """Stop any background work and save any profiling output once the command is done.
+
+        This runs however the command ends, so commands without a run report and runs that fail
+        early still get their profile saved, next to the last run report if there is one.
+        """
+        self.metadata_helper.close()
+        if self.config.profiler.enabled:
+            report = self.download_helper.report or RunReport(self.config)
+            self.config.profiler.save(report.run_dir)
 
-        # Get track metadata
-        self.album_info = self.metadata_helper.get_metadata()
+    def create_cache(self, cache_dir: Path) -> DownloadCache | None:
+        """Set up the shared download cache, or return None if it can't be used."""
+        if not DownloadCache.is_supported():
+            print_color("The shared download cache isn't supported on Windows.", "yellow")
+            return None
+        try:
+            return DownloadCache(cache_dir, self.env.cache_size, self.config.session)
+        except OSError as e:
+            print_color(f"Can't use download cache at {cache_dir}: {e.strerror}", "yellow")
+            return None
+
+    def select_albums(self, catalog: list[CatalogEntry]) -> list[CatalogEntry]:
+        """Choose which albums from the catalog to download.
+
+        Raises:
+            SystemExit: If the requested album isn't in the catalog.
+        """
+        albums = self.metadata_helper.get_preselected_albums(catalog)
+        if self.config.album_name and not albums:
+            msg = f"Album not found: {self.config.album_name}"
+            raise SystemExit(msg)
+        if albums or self.config.is_admin:
+            return albums
+
+        return [MenuHelper(self.config).prompt_for_album(catalog)]
 
     def download_tracks(self) -> None:
         """Download the tracks."""
-        if self.config.is_admin:
-            self.download_helper.download_tracks_for_admin(self.album_info)
+        for album in self.albums:
+            album_info = self.metadata_helper.get_metadata(album.manifest_url)
+            if self.sync_tracks(album_info):
+                self.metadata_helper.save_manifest(album.manifest_url, album_info)
+
+    def verify(self, deep: bool = False, report_output: str | None = None) -> bool:
+        """Check the existing files against the tracklist and report any problems.
+
+        Args:
+            deep: Also hash the audio of each file to compare with the hash recorded at download.
+            report_output: Where to write the JSON report, or `-` for stdout. Saved to the state
+                directory if not specified.
+
+        Returns:
+            True if every file is present and correct.
+        """
+        verifier = LibraryVerifier(self.config, self.download_helper)
+        albums = [self.metadata_helper.get_metadata(album.manifest_url) for album in self.albums]
+        checks = verifier.verify(albums, deep)
+
+        # Keep stdout clean for the report if that's where it's going
+        if report_output != "-":
+            verifier.print_summary(checks)
+        verifier.save_report(verifier.build_report(checks, deep), report_output)
+        return all(check.status is FileStatus.OK for check in checks)
+
+    def refresh(self) -> None:
+        """Retag and rename existing files to match the tracklist without downloading them."""
+        refresher = TagRefresher(self.config, self.download_helper)
+        for album in self.albums:
+            album_info = self.metadata_helper.get_metadata(album.manifest_url)
+            previous = self.metadata_helper.load_saved_manifest(album.manifest_url)
+            print_color(f"Refreshing tags for {album_info.album_name}...\n", "cyan")
+            if refresher.refresh(album_info, previous):
+                self.metadata_helper.save_manifest(album.manifest_url, album_info)
+
+    def export_mirror(self, output_dir: Path) -> bool:
+        """Export the albums and all their files as a mirror for other machines to sync from.
+
+        Returns:
+            True if every file was exported.
+        """
+        exporter = MirrorExporter(self.config, self.download_helper)
+        albums = [
+            (album, self.metadata_helper.get_metadata(album.manifest_url)) for album in self.albums
+        ]
+        return exporter.export(albums, output_dir)
+
+    def plan(self) -> None:
+        """Show what a download would do, and how long it would take, without downloading."""
+        planner = SyncPlanner(self.config, self.download_helper)
+        for album in self.albums:
+            album_info = self.metadata_helper.get_metadata(album.manifest_url)
+            tracks = self.filter_tracks(album_info)
+            if tracks is None or tracks:
+                planner.print_plan(planner.plan(album_info, tracks))
+
+    def filter_tracks(
+        self, album_info: AlbumInfo, tracks: list[TrackMetadata] | None = None
+    ) -> list[TrackMetadata] | None:
+        """Narrow the given tracks (or all of them if not specified) to those that match the filter.
+
+        Returns the tracks unchanged if there's no filter.
+        """
+        track_filter = self.config.track_filter
+        if track_filter is None:
+            return tracks
+
+        matched = track_filter.apply(album_info.tracks if tracks is None else tracks)
+        if matched:
+            print_color(
+                f"Syncing {len(matched)} of {len(album_info.tracks)} tracks from "
+                f"{album_info.album_name} that match the filter.\n",
+                "cyan",
+            )
         else:
-            self.download_helper.download_tracks(self.album_info, self.config)
+            print_color(f"No tracks in {album_info.album_name} match the filter.", "yellow")
+        return matched
+
+    def sync_tracks(self, album_info: AlbumInfo, tracks: list[TrackMetadata] | None = None) -> bool:
+        """Download the given tracks, or all of them if not specified. Returns success status.
+
+        Only tracks that match the filter are downloaded, if there is one.
+        """
+        tracks = self.filter_tracks(album_info, tracks)
+
+        # Without a filter, an empty list still syncs, so tracks removed from the album are pruned
+        if self.config.track_filter is not None and not tracks:
+            return True
+
+        if self.config.is_admin:
+            return self.download_helper.download_tracks_for_admin(album_info, tracks)
+        return self.download_helper.download_tracks(album_info, self.config, tracks)
+
+    def watch(self, args: argparse.Namespace) -> None:
+        """Keep polling the tracklist and sync new or changed tracks as they're released."""
+        self.config.open_when_done = False
+        watchers = [
+            ManifestWatcher(
+                self.config,
+                self.sync_tracks,
+                album.manifest_url,
+                on_update_command=args.on_update_command,
+                on_update_webhook=args.on_update_webhook,
+            )
+            for album in self.albums
+        ]
+        ManifestWatcher.run(watchers, args.interval)
+
+
+# Command-line values for the choices that are otherwise made in menus
+VERSION_CHOICES: dict[str | None, TrackVersions] = {
+    "original": TrackVersions.ORIGINAL,
+    "instrumental": TrackVersions.INSTRUMENTAL,
+    "both": TrackVersions.BOTH,
+}
+FORMAT_CHOICES: dict[str | None, AudioFormat] = {
+    "flac": AudioFormat.FLAC,
+    "alac": AudioFormat.ALAC,
+}
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = PolyArgs(description=__doc__, lines=1)
+    parser.add_argument(
+        "--album",
+        metavar="NAME",
+        help="album to download from the catalog (default: prompt if there's more than one)",
+    )
+    parser.add_argument(
+        "--also-to",
+        metavar="PATH",
+        action="append",
+        type=Path,
+        default=[],
+        help="also put the downloaded files in this folder (can be given more than once)",
+    )
+    parser.add_argument(
+        "--versions",
+        choices=["original", "instrumental", "both"],
+        help="which versions to download (default: prompt)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["flac", "alac"],
+        help="audio format to download (default: prompt)",
+    )
+    parser.add_argument(
+        "--to",
+        metavar="PATH",
+        type=Path,
+        help="folder to download to (default: prompt)",
+    )
+    parser.add_argument(
+        "--since",
+        metavar="DATE",
+        type=date.fromisoformat,
+        help="only sync tracks released on or after this date (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--until",
+        metavar="DATE",
+        type=date.fromisoformat,
+        help="only sync tracks released on or before this date (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--track",
+        metavar="NUMBERS",
+        action="append",
+        type=TrackFilter.parse_track_numbers,
+        default=[],
+        help="only sync these track numbers, like 1-3,7 (can be given more than once)",
+    )
+    parser.add_argument(
+        "--title",
+        metavar="PATTERN",
+        action="append",
+        default=[],
+        help="only sync tracks whose title matches, with * and ? as wildcards (can be given more "
+        "than once)",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="show what would be downloaded, deleted, or retagged and how long it would take",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="update the tags and names of existing files to match the tracklist, without "
+        "downloading them again",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check existing files against the tracklist and save a JSON report of any problems",
+    )
+    parser.add_argument(
+        "--deep",
+        action="store_true",
+        help="with --verify, also hash the audio of each file (reads every file in full)",
+    )
+    parser.add_argument(
+        "--report",
+        metavar="PATH",
+        help="with --verify, where to save the report, or - for stdout (default: state folder)",
+    )
+    parser.add_argument(
+        "--export-mirror",
+        metavar="PATH",
+        type=Path,
+        help="export the tracklist and every audio and cover file to this folder for a static file "
+        "server, so other machines can sync from it with EVREMIXES_CATALOG_URL",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running and sync new or changed tracks whenever the tracklist is updated",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=900,
+        help="seconds between tracklist checks in watch mode (default: 900)",
+    )
+    parser.add_argument(
+        "--on-update-command",
+        metavar="CMD",
+        help="command to run after an update is synced in watch mode",
+    )
+    parser.add_argument(
+        "--on-update-webhook",
+        metavar="URL",
+        help="URL to POST a JSON summary to after an update is synced in watch mode",
+    )
+    args = parser.parse_args()
+    if args.interval < 1:
+        parser.error("--interval must be at least 1 second")
+    return args
 
 
 def main() -> None:
     """Run the Evanescence Remix Downloader."""
-    evremixes = EvRemixes()
-    evremixes.download_tracks()
+    args = parse_arguments()
+    evremixes = EvRemixes(
+        album_name=args.album,
+        extra_locations=args.also_to,
+        track_filter=TrackFilter(
+            since=args.since,
+            until=args.until,
+            track_numbers=set().union(*args.track),
+            title_patterns=args.title,
+        ),
+        versions=VERSION_CHOICES.get(args.versions),
+        audio_format=FORMAT_CHOICES.get(args.format),
+        location=args.to.expanduser() if args.to else None,
+    )
+
+    try:
+        if args.plan:
+            evremixes.plan()
+        elif args.refresh:
+            evremixes.refresh()
+        elif args.verify:
+            if not evremixes.verify(args.deep, args.report):
+                raise SystemExit(1)
+        elif args.export_mirror:
+            if not evremixes.export_mirror(args.export_mirror.expanduser()):
+                raise SystemExit(1)
+        elif args.watch:
+            evremixes.watch(args)
+        else:
+            evremixes.download_tracks()
+    finally:
+        evremixes.close()
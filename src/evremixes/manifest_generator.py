@@ -0,0 +1,175 @@
+"""Add the size, hash, and ETag of every track file to a tracklist before it's published."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, ClassVar
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from polykit.cli import PolyArgs
+from polykit.text import color, print_color
+
+from evremixes.metadata_helper import MetadataHelper
+from evremixes.progress import format_bytes
+from evremixes.remote_files import create_session
+from evremixes.types import AudioFormat, SourceFile
+
+if TYPE_CHECKING:
+    import argparse
+    from concurrent.futures import Future
+
+    from evremixes.types import AlbumInfo
+
+
+class ManifestGenerator:
+    """Stream every file a tracklist references and list its size, SHA-256 hash, and ETag in it.
+
+    This is for maintainers to run before publishing a tracklist. Clients take each file's size and
+    ETag from the tracklist instead of sending HEAD requests, and check each download against its
+    size and hash. Files are streamed concurrently and hashed as they arrive without being saved,
+    and the tracklist is written with its tracks and files in a stable order, so regenerating it
+    only changes the entries for files that changed.
+    """
+
+    CHUNK_SIZE: ClassVar[int] = 1024 * 1024
+    MAX_WORKERS: ClassVar[int] = 8
+
+    def __init__(
+        self, session: requests.Session | None = None, max_workers: int = MAX_WORKERS
+    ) -> None:
+        self.session = session or create_session()
+        self.max_workers = max_workers
+
+    def generate(self, album_info: AlbumInfo, base_url: str | None = None) -> bool:
+        """List the details of every file in both formats and versions for each track.
+
+        Args:
+            album_info: The album, whose tracks are updated in place.
+            base_url: The URL any relative URLs in the tracklist are relative to.
+
+        Returns:
+            True if every file was read, in which case every track lists all of its files.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures: dict[tuple[int, str], Future[SourceFile]] = {
+                (index, SourceFile.key(file_format, is_instrumental)): executor.submit(
+                    self._describe,
+                    urljoin(base_url or "", track.get_file_url(file_format, is_instrumental)),
+                )
+                for index, track in enumerate(album_info.tracks)
+                for is_instrumental in (False, True)
+                for file_format in AudioFormat
+            }
+
+        success = True
+        sources: list[dict[str, SourceFile]] = [{} for _ in album_info.tracks]
+        for (index, key), future in futures.items():
+            track = album_info.tracks[index]
+            try:
+                sources[index][key] = future.result()
+            except requests.RequestException as e:
+                print(color(f"✖ Failed to read {key} for {track.track_name}: {e}", "red"))
+                success = False
+
+        for track, track_sources in zip(album_info.tracks, sources, strict=True):
+            track.sources = dict(sorted(track_sources.items()))
+        return success
+
+    def _describe(self, url: str) -> SourceFile:
+        """Stream a file and get its size, hash, and ETag.
+
+        Raises:
+            requests.RequestException: If the download fails.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with self.session.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+            return SourceFile(
+                size=size, sha256=digest.hexdigest(), etag=response.headers.get("ETag")
+            )
+
+
+def load_tracklist(source: str, session: requests.Session) -> tuple[AlbumInfo, str | None]:
+    """Load a tracklist from a file or URL. Returns it, with the URL it came from if any.
+
+    Raises:
+        requests.RequestException: If the tracklist can't be downloaded.
+        OSError: If the tracklist file can't be read.
+        ValueError: If the tracklist isn't valid JSON.
+    """
+    if urlsplit(source).scheme in {"http", "https"}:
+        response = session.get(source, timeout=10)
+        response.raise_for_status()
+        return MetadataHelper.parse_metadata(json.loads(response.content)), source
+
+    with Path(source).open() as f:
+        return MetadataHelper.parse_metadata(json.load(f)), None
+
+
+def save_tracklist(path: Path, tracklist: dict[str, Any]) -> None:
+    """Write a tracklist atomically, so a server never serves it half written."""
+    temp_path = path.with_name(f".{path.name}.tmp")
+    with temp_path.open("w") as f:
+        json.dump(tracklist, f, indent=4)
+        f.write("\n")
+    temp_path.replace(path)
+
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = PolyArgs(description=__doc__, lines=1)
+    parser.add_argument("tracklist", help="path or URL of the tracklist (evtracks.json)")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="where to write the tracklist (default: in place, if it's a file)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=ManifestGenerator.MAX_WORKERS,
+        help="files to stream at the same time (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    if args.output is None:
+        if urlsplit(args.tracklist).scheme in {"http", "https"}:
+            parser.error("--output is required when the tracklist is a URL")
+        args.output = Path(args.tracklist)
+    return args
+
+
+def main() -> None:
+    """Generate a tracklist listing the details of every file."""
+    args = parse_arguments()
+    generator = ManifestGenerator(max_workers=args.workers)
+
+    try:
+        album_info, base_url = load_tracklist(args.tracklist, generator.session)
+    except (requests.RequestException, OSError, ValueError, KeyError, TypeError) as e:
+        print_color(f"Failed to load tracklist: {e}", "red")
+        sys.exit(1)
+
+    print_color(f"Reading every file for {album_info.album_name}...", "cyan")
+    if not generator.generate(album_info, base_url):
+        print_color("Tracklist not written, since some files couldn't be read.", "red")
+        sys.exit(1)
+
+    # Tracks are already in order from parsing, and each track's files are sorted by name
+    save_tracklist(args.output, MetadataHelper.serialize_metadata(album_info))
+    sources = [source for track in album_info.tracks for source in track.sources.values()]
+    total = format_bytes(sum(source.size for source in sources))
+    print_color(f"Listed {len(sources)} files ({total}) in {args.output}", "green")
+
+
+if __name__ == "__main__":
+    main()
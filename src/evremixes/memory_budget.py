@@ -0,0 +1,52 @@
+"""Shared limit on how much data is buffered in memory at once."""
+
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, ClassVar
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class MemoryBudget:
+    """A budget in bytes that work must reserve from before buffering data in memory.
+
+    Every download chunk, cover image, and tagging pass reserves what it's about to hold and
+    releases it when done. Once the budget is used up, further reservations block until enough is
+    released, so the amount of data held at once stays under the limit no matter how many downloads
+    run at the same time. A reservation larger than the whole budget waits until nothing else is
+    reserved and then runs on its own, so oversized work is serialized rather than refused.
+    """
+
+    DEFAULT_LIMIT: ClassVar[int] = 64 * 1024 * 1024
+
+    def __init__(self, limit: int = DEFAULT_LIMIT) -> None:
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, num_bytes: int) -> Iterator[None]:
+        """Reserve the given number of bytes for the enclosed code, waiting until they're free."""
+        num_bytes = max(0, min(num_bytes, self.limit))
+        self._acquire(num_bytes)
+        try:
+            yield
+        finally:
+            self._release(num_bytes)
+
+    def _acquire(self, num_bytes: int) -> None:
+        """Reserve bytes from the budget, blocking until enough is available."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_use + num_bytes <= self.limit)
+            self.in_use += num_bytes
+            self.peak = max(self.peak, self.in_use)
+
+    def _release(self, num_bytes: int) -> None:
+        """Return bytes to the budget and wake anything waiting for them."""
+        with self._condition:
+            self.in_use -= num_bytes
+            self._condition.notify_all()
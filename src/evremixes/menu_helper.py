@@ -12,6 +12,7 @@ from evremixes.types import AudioFormat, DownloadLocation, TrackVersions
 
 if TYPE_CHECKING:
     from evremixes.config import DownloadConfig
+    from evremixes.types import CatalogEntry
 
 
 class MenuHelper:
@@ -22,6 +23,12 @@ class MenuHelper:
         self.paths = config.paths
         self.admin_mode = config.is_admin
 
+    def prompt_for_album(self, albums: list[CatalogEntry]) -> CatalogEntry:
+        """Prompt the user to choose which album to download."""
+        album_map = {album.album_name: album for album in albums}
+        selected = self._get_selection("Choose an album", list(album_map.keys()))
+        return album_map[selected]
+
     def prompt_for_versions(self) -> TrackVersions:
         """Prompt the user to choose which versions to download."""
         choices = list(TrackVersions)
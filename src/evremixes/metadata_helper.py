@@ -1,18 +1,28 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict
 from io import BytesIO
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, ClassVar
+from urllib.parse import urljoin, urlsplit
 
 import requests
 from mutagen.flac import FLAC, Picture
 from mutagen.mp4 import MP4, MP4Cover
 from PIL import Image
+from polykit.log import PolyLog
 
-from evremixes.types import AlbumInfo, TrackMetadata
+from evremixes.audio_payload import get_audio_size
+from evremixes.mp4_layout import get_tag_padding, move_moov_first
+from evremixes.types import AlbumInfo, CatalogEntry, RemoteFile, SourceFile, TrackMetadata
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+    from logging import Logger
     from pathlib import Path
 
     from evremixes.config import DownloadConfig
@@ -21,61 +31,304 @@ if TYPE_CHECKING:
 class MetadataHelper:
     """Helper class for applying metadata to downloaded tracks."""
 
+    # Custom tags recording where the audio and cover art came from
+    SOURCE_TAGS: ClassVar[tuple[str, ...]] = (
+        "source_url",
+        "source_size",
+        "source_etag",
+        "cover_url",
+        "audio_size",
+        "audio_sha256",
+    )
+    FLAC_TAG_PREFIX: ClassVar[str] = "evremixes_"
+    MP4_TAG_PREFIX: ClassVar[str] = "----:com.dannystewart.evremixes:"
+
+    # Width and height of embedded cover art
+    COVER_SIZE: ClassVar[int] = 800
+
+    # Memory reserved for tagging on top of the cover art (for reading and rewriting headers)
+    TAGGING_BUFFER: ClassVar[int] = 1024 * 1024
+
+    # Number of requests made at the same time while prefetching
+    PREFETCH_WORKERS: ClassVar[int] = 4
+
     def __init__(self, config: DownloadConfig) -> None:
         self.config = config
+        self.logger: Logger = PolyLog.get_logger()
+
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._catalog: Future[list[CatalogEntry]] | None = None
+        self._manifests: dict[str, Future[AlbumInfo]] = {}
+        self._covers: dict[str, Future[bytes]] = {}
+
+    def prefetch(self) -> None:
+        """Start fetching the catalog in the background, along with any album already chosen.
 
-    def get_metadata(self) -> AlbumInfo:
+        This is meant to run while the user is answering the menus, so everything needed to start
+        downloading is ready by the time they're done. Only albums that will be chosen without
+        asking (see `get_preselected_albums`) are fetched along with the catalog, and others only
+        once they're chosen with `prefetch_album`. Results are picked up by the usual methods, and
+        errors are only raised when they are.
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.PREFETCH_WORKERS, thread_name_prefix="prefetch"
+        )
+        self._catalog = self._executor.submit(self._prefetch_catalog)
+
+    def prefetch_album(self, manifest_url: str) -> None:
+        """Start fetching an album's tracklist and cover art in the background, if prefetching.
+
+        Connections to the servers hosting its tracks are also opened ahead of time, so the first
+        downloads don't wait on DNS and TLS.
+        """
+        with self._lock:
+            if self._executor is not None and manifest_url not in self._manifests:
+                self._manifests[manifest_url] = self._executor.submit(
+                    self._prefetch_album, manifest_url
+                )
+
+    def close(self) -> None:
+        """Stop prefetching, dropping anything that hasn't started."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_preselected_albums(self, catalog: list[CatalogEntry]) -> list[CatalogEntry]:
+        """Get the albums in the catalog that are chosen without asking, if any.
+
+        That's the album named on the command line, or every album for admin downloads or if
+        there's only one.
+        """
+        if self.config.album_name:
+            wanted = self.config.album_name.casefold()
+            return [album for album in catalog if album.album_name.casefold() == wanted]
+        if self.config.is_admin or len(catalog) == 1:
+            return catalog
+        return []
+
+    def get_catalog(self) -> list[CatalogEntry]:
+        """Download the catalog index listing each album and the URL of its tracklist.
+
+        Only the index is fetched here; each album's tracks are loaded with `get_metadata` once it
+        has been selected. Falls back to the single default album if the catalog isn't available.
+        """
+        if self._catalog is not None:
+            return self._catalog.result()
+        return self._fetch_catalog()
+
+    def get_metadata(self, manifest_url: str | None = None) -> AlbumInfo:
         """Download the JSON file with all track and album details.
 
+        Args:
+            manifest_url: The URL of the album's tracklist. Defaults to the main tracklist.
+
         Raises:
             SystemExit: If the download fails.
         """
+        manifest_url = manifest_url or self.config.tracklist_url
+
+        # A prefetched tracklist is only used once, so later calls always get the latest
+        with self._lock:
+            prefetched = self._manifests.pop(manifest_url, None)
+        if prefetched is not None:
+            return prefetched.result()
+        return self._fetch_metadata(manifest_url)
+
+    @staticmethod
+    def serialize_metadata(album_info: AlbumInfo) -> dict[str, Any]:
+        """Convert an AlbumInfo back to the structure of the JSON tracklist."""
+        metadata = asdict(album_info)
+        tracks = metadata.pop("tracks")
+        return {"metadata": metadata, "tracks": tracks}
+
+    def save_manifest(self, manifest_url: str, album_info: AlbumInfo) -> None:
+        """Save the tracklist an album was last synced with, to compare against later."""
         try:
-            response = requests.get(self.config.TRACKLIST_URL, timeout=10)
-        except requests.RequestException as e:
-            raise SystemExit(e) from e
+            with self._manifest_file(manifest_url).open("w") as f:
+                json.dump(self.serialize_metadata(album_info), f, indent=2)
+        except OSError as e:
+            self.logger.debug("Failed to save tracklist: %s", str(e))
 
-        track_data = json.loads(response.content)
-        track_data["tracks"] = sorted(
-            track_data["tracks"], key=lambda track: track.get("track_number", 0)
-        )
-        return AlbumInfo(
-            album_name=track_data["metadata"]["album_name"],
-            album_artist=track_data["metadata"]["album_artist"],
-            artist_name=track_data["metadata"]["artist_name"],
-            genre=track_data["metadata"]["genre"],
-            year=track_data["metadata"]["year"],
-            cover_art_url=track_data["metadata"]["cover_art_url"],
-            inst_art_url=track_data["metadata"]["inst_art_url"],
-            tracks=[TrackMetadata(**track) for track in track_data["tracks"]],
-        )
+    def load_saved_manifest(self, manifest_url: str) -> AlbumInfo | None:
+        """Load the tracklist an album was last synced with, or None if there isn't one."""
+        try:
+            with self._manifest_file(manifest_url).open() as f:
+                return self.parse_metadata(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _manifest_file(self, manifest_url: str) -> Path:
+        url_hash = hashlib.sha256(manifest_url.encode()).hexdigest()[:12]
+        return self.config.paths.from_state(f"manifest-{url_hash}.json")
 
     def get_cover_art(self, cover_url: str) -> bytes:
         """Download and process the album cover art.
 
+        The result is kept, so each cover is only downloaded and processed once per run.
+
         Raises:
             ValueError: If the download or processing fails.
         """
-        try:  # Download the cover art from the URL in the metadata
-            cover_response = requests.get(cover_url, timeout=10)
-            cover_response.raise_for_status()
+        with self._lock:
+            future = self._covers.get(cover_url)
+            if future is None:
+                future = self._covers[cover_url] = self._submit(self._fetch_cover_art, cover_url)
 
-            # Resize and convert the cover art to JPEG
-            image = Image.open(BytesIO(cover_response.content))
-            image = image.convert("RGB")
-            image = image.resize((800, 800))
+        try:
+            return future.result()
+        except ValueError:
+            with self._lock:  # Try again next time rather than keeping the failure
+                self._covers.pop(cover_url, None)
+            raise
+
+    def _prefetch_catalog(self) -> list[CatalogEntry]:
+        """Fetch the catalog, then start prefetching any albums that are chosen without asking."""
+        catalog = self._fetch_catalog()
+        for album in self.get_preselected_albums(catalog):
+            self.prefetch_album(album.manifest_url)
+        return catalog
+
+    def _prefetch_album(self, manifest_url: str) -> AlbumInfo:
+        """Fetch a tracklist, then start on its cover art and connections to its track hosts."""
+        album_info = self._fetch_metadata(manifest_url)
 
-            # Save the resized image as a JPEG and return the bytes
-            buffered = BytesIO()
-            image.save(buffered, format="JPEG", quality=95, optimize=True)
-            return buffered.getvalue()
+        with self._lock:
+            for cover_url in (album_info.cover_art_url, album_info.inst_art_url):
+                if cover_url not in self._covers:
+                    self._covers[cover_url] = self._submit(self._fetch_cover_art, cover_url)
 
+        hosts = {
+            f"{parts.scheme}://{parts.netloc}/"
+            for track in album_info.tracks
+            for url in (track.file_url, track.inst_url)
+            if (parts := urlsplit(url)).netloc
+        }
+        for host in hosts:
+            self._submit(self._warm_up, host)
+
+        return album_info
+
+    def _warm_up(self, host_url: str) -> None:
+        """Open a pooled connection to a host so later requests can skip DNS and TLS."""
+        try:
+            self.config.session.head(host_url, timeout=10)
         except requests.RequestException as e:
-            msg = f"Failed to download cover art: {e}"
-            raise ValueError(msg) from e
-        except OSError as e:
-            msg = f"Failed to process cover art: {e}"
-            raise ValueError(msg) from e
+            self.logger.debug("Failed to warm up connection to %s: %s", host_url, str(e))
+
+    def _submit[T](self, fn: Callable[[str], T], url: str) -> Future[T]:
+        """Run a fetch in the background if prefetching, otherwise right away."""
+        if self._executor is not None:
+            return self._executor.submit(fn, url)
+
+        future: Future[T] = Future()
+        try:
+            future.set_result(fn(url))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _fetch_catalog(self) -> list[CatalogEntry]:
+        default = [CatalogEntry(album_name="", manifest_url=self.config.tracklist_url)]
+        if self.config.catalog_url is None:
+            return default
+
+        with self.config.profiler.stage("metadata"):
+            try:
+                response = self.config.session.get(self.config.catalog_url, timeout=10)
+                response.raise_for_status()
+                albums = json.loads(response.content)["albums"]
+            except (requests.RequestException, ValueError, KeyError):
+                return default
+
+            # Tracklist URLs can be relative to the catalog, as they are in an exported mirror
+            return [
+                CatalogEntry(
+                    album_name=album["album_name"],
+                    manifest_url=urljoin(self.config.catalog_url, album["manifest_url"]),
+                )
+                for album in albums
+            ]
+
+    def _fetch_metadata(self, manifest_url: str) -> AlbumInfo:
+        with self.config.profiler.stage("metadata"):
+            try:
+                response = self.config.session.get(manifest_url, timeout=10)
+            except requests.RequestException as e:
+                raise SystemExit(e) from e
+
+            album_info = self.parse_metadata(json.loads(response.content), base_url=manifest_url)
+
+        # Keep any file details the tracklist lists, so they don't need HEAD requests
+        self.config.update_known_files(album_info)
+        return album_info
+
+    @staticmethod
+    def parse_metadata(track_data: dict[str, Any], base_url: str | None = None) -> AlbumInfo:
+        """Build an AlbumInfo from the decoded contents of the JSON tracklist.
+
+        Args:
+            track_data: The decoded tracklist.
+            base_url: The URL the tracklist came from, which any relative URLs in it (as in an
+                exported mirror) are resolved against.
+        """
+        track_data["tracks"] = sorted(
+            track_data["tracks"], key=lambda track: track.get("track_number", 0)
+        )
+        metadata = track_data["metadata"]
+
+        def resolve(url: str) -> str:
+            return urljoin(base_url, url) if base_url else url
+
+        return AlbumInfo(
+            album_name=metadata["album_name"],
+            album_artist=metadata["album_artist"],
+            artist_name=metadata["artist_name"],
+            genre=metadata["genre"],
+            year=metadata["year"],
+            cover_art_url=resolve(metadata["cover_art_url"]),
+            inst_art_url=resolve(metadata["inst_art_url"]),
+            tracks=[
+                TrackMetadata(
+                    **{
+                        **track,
+                        "file_url": resolve(track["file_url"]),
+                        "inst_url": resolve(track["inst_url"]),
+                        "sources": {
+                            key: SourceFile(**source)
+                            for key, source in track.get("sources", {}).items()
+                        },
+                    }
+                )
+                for track in track_data["tracks"]
+            ],
+        )
+
+    def _fetch_cover_art(self, cover_url: str) -> bytes:
+        with self.config.profiler.stage("cover"):
+            try:  # Download the cover art from the URL in the metadata
+                cover_response = self.config.session.get(cover_url, timeout=10)
+                cover_response.raise_for_status()
+
+                # Resize and convert the cover art to JPEG, reserving room for the decoded image
+                image = Image.open(BytesIO(cover_response.content))
+                width, height = image.size
+                with self.config.memory.reserve(width * height * 4 + self.COVER_SIZE**2 * 3):
+                    image = image.convert("RGB")
+                    image = image.resize((self.COVER_SIZE, self.COVER_SIZE))
+
+                    # Save the resized image as a JPEG and return the bytes
+                    buffered = BytesIO()
+                    image.save(buffered, format="JPEG", quality=95, optimize=True)
+                    return buffered.getvalue()
+
+            except requests.RequestException as e:
+                msg = f"Failed to download cover art: {e}"
+                raise ValueError(msg) from e
+            except OSError as e:
+                msg = f"Failed to process cover art: {e}"
+                raise ValueError(msg) from e
 
     def apply_metadata(
         self,
@@ -84,6 +337,9 @@ class MetadataHelper:
         output_path: Path,
         cover_data: bytes,
         is_instrumental: bool,
+        source: RemoteFile | None = None,
+        replaygain: dict[str, str] | None = None,
+        audio_sha256: str | None = None,
     ) -> bool:
         """Add metadata and cover art to the downloaded track file. Returns success status.
 
@@ -93,6 +349,11 @@ class MetadataHelper:
             output_path: The path of the downloaded track file.
             cover_data: The cover art, resized and encoded as JPEG.
             is_instrumental: Whether the track is an instrumental.
+            source: The file the audio was downloaded from, recorded so later syncs can tell
+                whether the audio is still current.
+            replaygain: ReplayGain tags to add, for FLAC files. Existing ones are kept if not given.
+            audio_sha256: The hash of the audio from `hash_audio`, for a file with new audio. The
+                recorded hash is kept if not given, since retagging never changes the audio.
         """
         try:
             audio_format = output_path.suffix[1:].lower()
@@ -103,25 +364,46 @@ class MetadataHelper:
             if is_instrumental and not display_title.endswith(" (Instrumental)"):
                 display_title += " (Instrumental)"
 
-            # Apply metadata based on the audio format
-            if audio_format == "m4a":
-                self._apply_alac_metadata(
-                    album_info,
-                    output_path,
-                    cover_data,
-                    track.track_number,
-                    disc_number,
-                    display_title,
-                )
-            elif audio_format == "flac":
-                self._apply_flac_metadata(
-                    album_info,
-                    output_path,
-                    cover_data,
-                    track.track_number,
-                    disc_number,
-                    display_title,
-                )
+            source_tags = {
+                "cover_url": album_info.inst_art_url
+                if is_instrumental
+                else album_info.cover_art_url
+            }
+            if source is not None:
+                source_tags["source_url"] = source.url
+                if source.size is not None:
+                    source_tags["source_size"] = str(source.size)
+                if source.etag:
+                    source_tags["source_etag"] = source.etag
+
+            # Record the size and hash of the audio itself, which retagging never changes
+            source_tags["audio_size"] = str(get_audio_size(output_path))
+            if audio_sha256 is not None:
+                source_tags["audio_sha256"] = audio_sha256
+
+            # Apply metadata based on the audio format, reserving room for the encoded cover art
+            with self.config.memory.reserve(len(cover_data) * 2 + self.TAGGING_BUFFER):
+                if audio_format == "m4a":
+                    self._apply_alac_metadata(
+                        album_info,
+                        output_path,
+                        cover_data,
+                        track.track_number,
+                        disc_number,
+                        display_title,
+                        source_tags,
+                    )
+                elif audio_format == "flac":
+                    self._apply_flac_metadata(
+                        album_info,
+                        output_path,
+                        cover_data,
+                        track.track_number,
+                        disc_number,
+                        display_title,
+                        source_tags,
+                        replaygain or {},
+                    )
             return True
         except Exception:
             return False
@@ -134,6 +416,7 @@ class MetadataHelper:
         track_number: int,
         disc_number: int,
         display_title: str,
+        source_tags: dict[str, str],
     ) -> None:
         """Apply metadata for ALAC files."""
         audio = MP4(output_path)
@@ -154,7 +437,13 @@ class MetadataHelper:
         # Add the cover art to the track
         audio["covr"] = [MP4Cover(cover_data, imageformat=MP4Cover.FORMAT_JPEG)]
 
-        audio.save()
+        # Record where the audio and cover art came from
+        for key, value in source_tags.items():
+            audio[f"{self.MP4_TAG_PREFIX}{key}"] = [value.encode()]
+
+        # Keep room after the tags and put them ahead of the audio, so retagging is done in place
+        audio.save(padding=get_tag_padding)
+        move_moov_first(output_path)
 
     def _apply_flac_metadata(
         self,
@@ -164,6 +453,8 @@ class MetadataHelper:
         track_number: int,
         disc_number: int,
         display_title: str,
+        source_tags: dict[str, str],
+        replaygain: dict[str, str],
     ) -> None:
         """Apply metadata for FLAC files."""
         audio = FLAC(output_path)
@@ -181,7 +472,8 @@ class MetadataHelper:
         if album_info.album_artist:
             audio["albumartist"] = album_info.album_artist
 
-        # Add the cover art to the track
+        # Add the cover art to the track, replacing any that's already there
+        audio.clear_pictures()
         pic = Picture()
         pic.data = cover_data
         pic.type = 3
@@ -190,4 +482,106 @@ class MetadataHelper:
         pic.height = 800
         audio.add_picture(pic)
 
+        # Record where the audio and cover art came from
+        for key, value in source_tags.items():
+            audio[f"{self.FLAC_TAG_PREFIX}{key}"] = value
+
+        # Add loudness normalization, if the track has been measured
+        for key, value in replaygain.items():
+            audio[key] = value
+
         audio.save()
+
+    def get_expected_tags(
+        self, track: TrackMetadata, album_info: AlbumInfo, is_instrumental: bool
+    ) -> dict[str, str]:
+        """Get the tags a track should have, in the same form returned by `read_tags`."""
+        display_title = track.track_name
+        if is_instrumental and not display_title.endswith(" (Instrumental)"):
+            display_title += " (Instrumental)"
+
+        return {
+            "title": display_title,
+            "artist": album_info.artist_name,
+            "album": album_info.album_name,
+            "album_artist": album_info.album_artist,
+            "year": str(album_info.year),
+            "genre": album_info.genre,
+            "track": str(track.track_number),
+            "disc": str(2 if is_instrumental else 1),
+            "cover_url": album_info.inst_art_url if is_instrumental else album_info.cover_art_url,
+        }
+
+    def read_tags(self, path: Path) -> dict[str, str] | None:
+        """Read the tags from a track file without reading the audio. Returns None if unreadable.
+
+        Includes `has_cover` and `cover_count` entries and any of the source tags that were
+        recorded.
+        """
+        try:
+            if path.suffix.lower() == ".m4a":
+                return self._read_alac_tags(MP4(path))
+            if path.suffix.lower() == ".flac":
+                return self._read_flac_tags(FLAC(path))
+        except Exception:
+            return None
+        return None
+
+    def read_source(self, path: Path) -> RemoteFile | None:
+        """Read the recorded source of a track file's audio, or None if it wasn't recorded."""
+        tags = self.read_tags(path)
+        if not tags or not tags.get("source_url"):
+            return None
+
+        size = tags.get("source_size")
+        return RemoteFile(
+            url=tags["source_url"],
+            size=int(size) if size and size.isdigit() else None,
+            etag=tags.get("source_etag"),
+        )
+
+    def _read_alac_tags(self, audio: MP4) -> dict[str, str]:
+        tags = audio.tags or {}
+
+        def first(key: str) -> str:
+            values = tags.get(key)
+            return str(values[0]) if values else ""
+
+        result = {
+            "title": first("\xa9nam"),
+            "artist": first("\xa9ART"),
+            "album": first("\xa9alb"),
+            "album_artist": first("aART"),
+            "year": first("\xa9day"),
+            "genre": first("\xa9gen"),
+            "track": str(tags["trkn"][0][0]) if tags.get("trkn") else "",
+            "disc": str(tags["disk"][0][0]) if tags.get("disk") else "",
+            "has_cover": "1" if tags.get("covr") else "",
+            "cover_count": str(len(tags.get("covr", []))),
+        }
+        for key in self.SOURCE_TAGS:
+            if values := tags.get(f"{self.MP4_TAG_PREFIX}{key}"):
+                result[key] = bytes(values[0]).decode()
+        return result
+
+    def _read_flac_tags(self, audio: FLAC) -> dict[str, str]:
+        def first(key: str) -> str:
+            values = audio.get(key)
+            return values[0] if values else ""
+
+        result = {
+            "title": first("title"),
+            "artist": first("artist"),
+            "album": first("album"),
+            "album_artist": first("albumartist"),
+            "year": first("date"),
+            "genre": first("genre"),
+            "track": first("tracknumber"),
+            "disc": first("discnumber"),
+            "has_cover": "1" if audio.pictures else "",
+            "cover_count": str(len(audio.pictures)),
+        }
+        for key in self.SOURCE_TAGS:
+            if value := first(f"{self.FLAC_TAG_PREFIX}{key}"):
+                result[key] = value
+        return result
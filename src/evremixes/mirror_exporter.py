@@ -0,0 +1,251 @@
+"""Export the tracklists and every file they reference as a mirror for a static file server."""
+
+from __future__ import annotations
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import PurePosixPath
+from typing import TYPE_CHECKING, Any, ClassVar
+from urllib.parse import quote, unquote, urlsplit
+
+import requests
+from polykit.text import color, print_color
+
+from evremixes.file_links import LinkMethod, link_or_copy
+from evremixes.remote_files import head_files
+from evremixes.sync_planner import SyncPlanner
+from evremixes.types import AudioFormat, RemoteFile
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from evremixes.config import DownloadConfig
+    from evremixes.track_downloader import TrackDownloader
+    from evremixes.types import AlbumInfo, CatalogEntry
+
+
+class MirrorExporter:
+    """Write a copy of the catalog, tracklists, audio, and cover art that other machines can use.
+
+    Each album goes in its own folder, with its files in `files/` and a tracklist whose URLs are
+    relative to it, and the catalog at the top lists them all. Any static file server can serve the
+    result, and clients pointed at it with `EVREMIXES_CATALOG_URL` (or `EVREMIXES_TRACKLIST_URL`
+    for a single album) never touch the origin.
+
+    Exports are incremental. The origin's size and ETag for each exported file are kept in an index,
+    and files that haven't changed are left alone. New files are linked or copied from the local
+    library when it has the same audio, and only downloaded otherwise. Files no longer referenced
+    are removed.
+    """
+
+    CATALOG_NAME: ClassVar[str] = "evcatalog.json"
+    TRACKLIST_NAME: ClassVar[str] = "evtracks.json"
+    INDEX_NAME: ClassVar[str] = ".export.json"
+    FILES_FOLDER: ClassVar[str] = "files"
+    CHUNK_SIZE: ClassVar[int] = 1024 * 1024
+
+    def __init__(self, config: DownloadConfig, downloader: TrackDownloader) -> None:
+        self.config = config
+        self.downloader = downloader
+        self.metadata = downloader.metadata
+        self.planner = SyncPlanner(config, downloader)
+
+    def export(self, albums: list[tuple[CatalogEntry, AlbumInfo]], output_dir: Path) -> bool:
+        """Export the given albums to a folder. Returns True if every file was exported."""
+        output_dir.mkdir(parents=True, exist_ok=True)
+        success = True
+        catalog: list[dict[str, str]] = []
+
+        for entry, album_info in albums:
+            album_folder = self.downloader.get_album_folder_name(album_info)
+            print_color(f"Exporting {album_info.album_name}...\n", "cyan")
+            success &= self.export_album(album_info, output_dir / album_folder)
+            catalog.append(
+                {
+                    "album_name": entry.album_name or album_info.album_name,
+                    "manifest_url": f"{quote(album_folder)}/{self.TRACKLIST_NAME}",
+                }
+            )
+
+        self._write_json(output_dir / self.CATALOG_NAME, {"albums": catalog})
+        print_color(f"\nMirror exported to {output_dir}", "green" if success else "yellow")
+        return success
+
+    def export_album(self, album_info: AlbumInfo, album_dir: Path) -> bool:
+        """Export a single album to its folder. Returns True if every file was exported."""
+        files_dir = album_dir / self.FILES_FOLDER
+        files_dir.mkdir(parents=True, exist_ok=True)
+
+        assets = self._get_assets(album_info)
+        index = self._load_index(album_dir)
+        remote_files = head_files(list(assets), self.config.session)
+        library_files = self._find_library_files(album_info, remote_files)
+
+        with ThreadPoolExecutor(max_workers=self.config.max_workers) as executor:
+            futures = {
+                url: executor.submit(
+                    self._export_file,
+                    url,
+                    files_dir / name,
+                    index.get(name),
+                    remote_files.get(url),
+                    library_files.get(url),
+                )
+                for url, name in assets.items()
+            }
+            results = {url: future.result() for url, future in futures.items()}
+
+        # Keep what the origin reported for each file, to tell whether it's changed next time
+        new_index = {
+            name: results[url] or index[name]
+            for url, name in assets.items()
+            if results[url] is not None or name in index
+        }
+        self._write_json(album_dir / self.INDEX_NAME, new_index)
+        self._remove_unreferenced(files_dir, set(assets.values()))
+
+        tracklist = self._rewrite_urls(self.metadata.serialize_metadata(album_info), assets)
+        self._write_json(album_dir / self.TRACKLIST_NAME, tracklist)
+        return all(result is not None for result in results.values())
+
+    def _export_file(
+        self,
+        url: str,
+        dest: Path,
+        exported: dict[str, Any] | None,
+        remote: RemoteFile | None,
+        library_file: Path | None,
+    ) -> dict[str, Any] | None:
+        """Put a single file in the mirror if it isn't already current.
+
+        Returns what the origin reported for the file, or None if it couldn't be exported.
+        """
+        if dest.exists() and exported is not None and self._is_unchanged(exported, remote):
+            return exported
+
+        temp_path = dest.with_name(f".{dest.name}.export")
+        temp_path.unlink(missing_ok=True)
+        try:
+            if library_file is not None:
+                method = link_or_copy(library_file, temp_path)
+                action = "Copied" if method is LinkMethod.COPY else f"{method.title()}ed"
+            else:
+                remote = self._download(url, temp_path)
+                action = "Downloaded"
+            temp_path.replace(dest)
+        except (requests.RequestException, OSError) as e:
+            temp_path.unlink(missing_ok=True)
+            print(color(f"✖ Failed to export {dest.name}: {e}", "red"))
+            return None
+
+        print(color(f"✔ {action} {dest.name}", "green"))
+        return asdict(remote) if remote is not None else {"url": url}
+
+    def _download(self, url: str, dest: Path) -> RemoteFile:
+        """Download a file from the origin as is.
+
+        Raises:
+            requests.RequestException: If the download fails.
+            OSError: If the file can't be written.
+        """
+        with self.config.session.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            with dest.open("wb") as f:
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    f.write(chunk)
+            return RemoteFile.from_headers(url, response.headers)
+
+    @staticmethod
+    def _is_unchanged(exported: dict[str, Any], remote: RemoteFile | None) -> bool:
+        """Check whether the origin still has the version of a file that was exported."""
+        if remote is None:  # Can't tell, so keep what we have
+            return True
+        if exported.get("etag") and remote.etag:
+            return exported["etag"] == remote.etag
+        return exported.get("size") is not None and exported.get("size") == remote.size
+
+    def _get_assets(self, album_info: AlbumInfo) -> dict[str, str]:
+        """Get the URL of every file the tracklist references, with its name in the mirror.
+
+        Names are taken from the URLs, so the FLAC and ALAC versions of a track still only differ
+        by their extension, which is how clients tell them apart.
+        """
+        urls = [album_info.cover_art_url, album_info.inst_art_url]
+        urls.extend(
+            self.downloader.get_file_url(track, file_format, is_instrumental)
+            for track in album_info.tracks
+            for is_instrumental in (False, True)
+            for file_format in AudioFormat
+        )
+
+        assets: dict[str, str] = {}
+        used_names: set[str] = set()
+        for url in dict.fromkeys(urls):
+            name = unquote(PurePosixPath(urlsplit(url).path).name)
+            stem, dot, extension = name.rpartition(".")
+            counter = 1
+            while name in used_names:  # Same name in different folders on the origin
+                counter += 1
+                name = f"{stem}-{counter}{dot}{extension}"
+            used_names.add(name)
+            assets[url] = name
+        return assets
+
+    def _find_library_files(
+        self, album_info: AlbumInfo, remote_files: dict[str, RemoteFile | None]
+    ) -> dict[str, Path]:
+        """Find files in the local library with the current audio from each URL, by that URL."""
+        library_files: dict[str, Path] = {}
+        for track_set in self.downloader.get_track_sets(album_info, self.config):
+            for track in album_info.tracks:
+                path = track_set.folder / self.downloader.get_track_filename(
+                    track, track_set.file_format, track_set.is_instrumental
+                )
+                tags = self.metadata.read_tags(path) if path.is_file() else None
+                url = self.downloader.get_file_url(
+                    track, track_set.file_format, track_set.is_instrumental
+                )
+                if tags and self.planner.is_audio_current(tags, url, remote_files.get(url)):
+                    library_files[url] = path
+        return library_files
+
+    def _rewrite_urls(self, tracklist: dict[str, Any], assets: dict[str, str]) -> dict[str, Any]:
+        """Point every URL in a tracklist at the mirror's copy, relative to the tracklist.
+
+        Any file details listed for the origin are dropped, since files linked from the library
+        have been tagged and no longer match them.
+        """
+
+        def relative(url: str) -> str:
+            return f"{self.FILES_FOLDER}/{quote(assets[url])}"
+
+        metadata = tracklist["metadata"]
+        metadata["cover_art_url"] = relative(metadata["cover_art_url"])
+        metadata["inst_art_url"] = relative(metadata["inst_art_url"])
+        for track in tracklist["tracks"]:
+            track["file_url"] = relative(track["file_url"])
+            track["inst_url"] = relative(track["inst_url"])
+            track.pop("sources", None)
+        return tracklist
+
+    def _remove_unreferenced(self, files_dir: Path, names: set[str]) -> None:
+        for path in files_dir.iterdir():
+            if path.is_file() and path.name not in names:
+                path.unlink()
+                print(color(f"✔ Removed {path.name}", "green"))
+
+    def _load_index(self, album_dir: Path) -> dict[str, dict[str, Any]]:
+        try:
+            with (album_dir / self.INDEX_NAME).open() as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_json(path: Path, data: dict[str, Any]) -> None:
+        """Write a JSON file atomically, so the server never serves it half written."""
+        temp_path = path.with_name(f".{path.name}.tmp")
+        with temp_path.open("w") as f:
+            json.dump(data, f, indent=4)
+        temp_path.replace(path)
@@ -0,0 +1,158 @@
+"""Lay out MP4 files so their tags can be rewritten in place."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import struct
+from typing import TYPE_CHECKING, BinaryIO
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from mutagen import PaddingInfo
+
+# Room left after the tags for later changes, enough for the cover art to be replaced
+TAG_PADDING = 256 * 1024
+
+# Padding beyond this is reclaimed the next time the tags have to be moved anyway
+MAX_TAG_PADDING = 4 * TAG_PADDING
+
+# Atoms that hold the chunk offset tables, which have to be updated if the audio moves
+CONTAINER_ATOMS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def get_tag_padding(info: PaddingInfo) -> int:
+    """Choose how much padding to leave after the tags when saving an MP4 file with mutagen.
+
+    Existing padding is kept whenever the new tags fit, so the file is written in place. Only
+    when they don't (or the padding has grown far too large) is it reset to `TAG_PADDING`, which
+    is the only time the audio after the tags gets moved.
+    """
+    if 0 <= info.padding <= MAX_TAG_PADDING:
+        return info.padding
+    return TAG_PADDING
+
+
+def move_moov_first(path: Path) -> bool:
+    """Move the `moov` atom ahead of the audio if it comes after it. Returns True if moved.
+
+    With `moov` (and the tags inside it) at the end, any change to the tags is cheap, but players
+    have to seek to the end before they can start, and encoders don't leave room for tags. Moving
+    it in front means the audio has to be rewritten once, here, so that with the padding from
+    `get_tag_padding`, later tag changes never move it again. Fragmented files are left alone.
+
+    Raises:
+        ValueError: If the file's atoms are invalid or the audio can't be addressed once moved.
+        OSError: If the file can't be read or written.
+    """
+    atoms = _read_top_level_atoms(path)
+    types = [atom_type for atom_type, _, _ in atoms]
+    if b"moov" not in types or b"mdat" not in types or b"moof" in types:
+        return False
+
+    moov_index = types.index(b"moov")
+    mdat_index = types.index(b"mdat")
+    if moov_index < mdat_index:
+        return False
+
+    _, moov_offset, moov_size = atoms[moov_index]
+    with path.open("rb") as f:
+        f.seek(moov_offset)
+        moov = bytearray(f.read(moov_size))
+
+    # Everything from the first mdat up to where moov was moves along by the size of moov, and
+    # anything after it ends up where it was
+    moved = range(atoms[mdat_index][1], moov_offset)
+    _shift_chunk_offsets(moov, 0, len(moov), moov_size, moved)
+
+    temp_path = path.with_name(f".{path.name}.layout")
+    try:
+        with path.open("rb") as src, temp_path.open("wb") as dst:
+            for _, offset, size in atoms[:mdat_index]:
+                _copy_range(src, dst, offset, size)
+            dst.write(moov)
+            for atom_type, offset, size in atoms[mdat_index:]:
+                if atom_type != b"moov":
+                    _copy_range(src, dst, offset, size)
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copymode(path, temp_path)
+        temp_path.replace(path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+    return True
+
+
+def _read_top_level_atoms(path: Path) -> list[tuple[bytes, int, int]]:
+    """Get the type, offset, and size of each atom at the top level of an MP4 file."""
+    file_size = path.stat().st_size
+    atoms: list[tuple[bytes, int, int]] = []
+    with path.open("rb") as f:
+        offset = 0
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            size, atom_type = struct.unpack(">I4s", f.read(8))
+            header_size = 8
+            if size == 1:  # 64-bit size follows the type
+                (size,) = struct.unpack(">Q", f.read(8))
+                header_size = 16
+            elif size == 0:  # Atom extends to the end of the file
+                size = file_size - offset
+
+            if size < header_size or offset + size > file_size:
+                msg = "MP4 atoms are truncated or invalid"
+                raise ValueError(msg)
+            atoms.append((atom_type, offset, size))
+            offset += size
+    return atoms
+
+
+def _shift_chunk_offsets(data: bytearray, start: int, end: int, delta: int, moved: range) -> None:
+    """Add `delta` to every chunk offset within `moved` in the atoms between `start` and `end`."""
+    offset = start
+    while offset + 8 <= end:
+        size, atom_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", data, offset + 8)
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            msg = "MP4 atoms are truncated or invalid"
+            raise ValueError(msg)
+
+        body = offset + header_size
+        if atom_type in CONTAINER_ATOMS:
+            _shift_chunk_offsets(data, body, offset + size, delta, moved)
+        elif atom_type in {b"stco", b"co64"}:
+            entry_format = ">I" if atom_type == b"stco" else ">Q"
+            entry_size = struct.calcsize(entry_format)
+            (count,) = struct.unpack_from(">I", data, body + 4)  # After version and flags
+            for position in range(body + 8, body + 8 + count * entry_size, entry_size):
+                (chunk_offset,) = struct.unpack_from(entry_format, data, position)
+                if chunk_offset in moved:
+                    chunk_offset += delta
+                    if atom_type == b"stco" and chunk_offset > 0xFFFFFFFF:
+                        msg = "Audio would be beyond the reach of 32-bit chunk offsets"
+                        raise ValueError(msg)
+                    struct.pack_into(entry_format, data, position, chunk_offset)
+
+        offset += size
+
+
+def _copy_range(src: BinaryIO, dst: BinaryIO, offset: int, length: int) -> None:
+    """Copy a range of bytes from one file to another."""
+    src.seek(offset)
+    remaining = length
+    while remaining > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            msg = "File is shorter than its atoms say"
+            raise ValueError(msg)
+        dst.write(chunk)
+        remaining -= len(chunk)
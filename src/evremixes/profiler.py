@@ -0,0 +1,144 @@
+"""Optional profiling of where a run spends its time and memory."""
+
+from __future__ import annotations
+
+import cProfile
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, ClassVar
+
+from polykit.log import PolyLog
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from logging import Logger
+    from pathlib import Path
+
+
+class StageProfiler:
+    """Collect cProfile stats and tracemalloc reports for each stage of a run.
+
+    Stages are named sections of work like fetching metadata or downloading a track. Stages with
+    the same name that overlap (such as concurrent track downloads) share a single profiling
+    window, which starts when the first one begins and ends when the last one finishes. Stats for
+    every window of a stage are combined and saved as a `.pstats` file, alongside a report of the
+    top allocations in each window.
+
+    When profiling isn't enabled, stages do nothing, so they're safe to leave in place.
+    """
+
+    TOP_ALLOCATIONS: ClassVar[int] = 25
+
+    def __init__(self) -> None:
+        self.logger: Logger = PolyLog.get_logger()
+        self.enabled = False
+
+        self._lock = threading.Lock()
+        self._active: dict[str, int] = {}
+        self._profiles: dict[str, cProfile.Profile] = {}
+        self._snapshots: dict[str, tracemalloc.Snapshot] = {}
+        self._peaks: dict[str, int] = {}
+        self._stats: dict[str, pstats.Stats] = {}
+        self._memory_reports: dict[str, list[str]] = {}
+
+    def enable(self) -> None:
+        """Start profiling stages from now on."""
+        self.enabled = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Profile the enclosed code as part of the named stage."""
+        if not self.enabled:
+            yield
+            return
+
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit(name)
+
+    def save(self, output_dir: Path) -> None:
+        """Save everything collected so far to the given folder, then start afresh."""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            memory_reports, self._memory_reports = self._memory_reports, {}
+
+        if not stats and not memory_reports:
+            return
+
+        profile_dir = output_dir / "profile"
+        try:
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            for name, stage_stats in stats.items():
+                stage_stats.dump_stats(profile_dir / f"{name}.pstats")
+            for name, reports in memory_reports.items():
+                (profile_dir / f"{name}-memory.txt").write_text("\n\n".join(reports) + "\n")
+        except OSError as e:
+            self.logger.warning("Failed to save profiling output: %s", str(e))
+
+    def _enter(self, name: str) -> None:
+        with self._lock:
+            self._active[name] = self._active.get(name, 0) + 1
+            if self._active[name] > 1:
+                return
+
+            self._collect_peak()
+            self._peaks[name], _ = tracemalloc.get_traced_memory()
+            self._snapshots[name] = tracemalloc.take_snapshot()
+
+            # Only one profiler can run at a time, so a stage nested in another is counted there
+            if not self._profiles:
+                profile = cProfile.Profile()
+                profile.enable()
+                self._profiles[name] = profile
+
+    def _exit(self, name: str) -> None:
+        with self._lock:
+            self._active[name] -= 1
+            if self._active[name]:
+                return
+
+            if profile := self._profiles.pop(name, None):
+                profile.disable()
+                if name in self._stats:
+                    self._stats[name].add(profile)
+                else:
+                    self._stats[name] = pstats.Stats(profile)
+
+            self._collect_peak()
+            before = self._snapshots.pop(name)
+            peak = self._peaks.pop(name)
+            after = tracemalloc.take_snapshot()
+            self._memory_reports.setdefault(name, []).append(self._describe(before, after, peak))
+
+    def _collect_peak(self) -> None:
+        """Count the peak since the last call towards every open window. Needs the lock.
+
+        The traced peak is global, so it's only reset once each open window has taken it into
+        account, which keeps windows that overlap from wiping out each other's peaks.
+        """
+        _, peak = tracemalloc.get_traced_memory()
+        for name in self._snapshots:
+            self._peaks[name] = max(self._peaks[name], peak)
+        tracemalloc.reset_peak()
+
+    def _describe(
+        self, before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, peak: int
+    ) -> str:
+        """Describe the allocations made during a profiling window."""
+        filters = [
+            tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+            tracemalloc.Filter(inclusive=False, filename_pattern=cProfile.__file__),
+            tracemalloc.Filter(inclusive=False, filename_pattern=__file__),
+        ]
+        differences = after.filter_traces(filters).compare_to(
+            before.filter_traces(filters), "lineno"
+        )
+        lines = [f"Peak traced memory: {peak / 1024:.1f} KiB"]
+        lines.extend(str(stat) for stat in differences[: self.TOP_ALLOCATIONS])
+        return "\n".join(lines)
@@ -0,0 +1,230 @@
+"""Aggregate progress display for concurrent downloads."""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, ClassVar
+
+from polykit.text import color
+
+if TYPE_CHECKING:
+    from typing import TextIO
+
+
+@dataclass
+class Transfer:
+    """State of a single in-flight transfer."""
+
+    name: str
+    total_bytes: int | None = None
+    done_bytes: int = 0
+    status: str = "Downloading"
+
+
+class DownloadProgress:
+    """Summarize all active downloads in a single display that redraws at a capped frame rate.
+
+    On a terminal, completed tracks are printed as they finish and a live block below them shows
+    each in-flight transfer plus the aggregate speed and ETA. When output isn't a TTY (cron, CI
+    logs), only the completion lines and an occasional summary line are written.
+
+    Byte updates only touch counters under a lock, so they stay cheap regardless of how many
+    transfers are running; the cost of drawing is bounded by the frame rate rather than the number
+    of updates.
+    """
+
+    SPEED_WINDOW: ClassVar[float] = 5.0  # Seconds of history used for the transfer rate
+    LOG_INTERVAL: ClassVar[float] = 10.0  # Seconds between summary lines when not on a TTY
+
+    def __init__(
+        self,
+        total_tracks: int,
+        max_fps: float = 10.0,
+        stream: TextIO | None = None,
+    ) -> None:
+        """Initialize the DownloadProgress class.
+
+        Args:
+            total_tracks: The number of tracks in the set being downloaded.
+            max_fps: Maximum number of redraws per second on a terminal.
+            stream: Where to write the progress. Defaults to stdout.
+        """
+        self.total_tracks = total_tracks
+        self.stream = stream or sys.stdout
+        self.is_tty = self.stream.isatty()
+        self.min_interval = 1.0 / max_fps if self.is_tty else self.LOG_INTERVAL
+
+        self.transfers: dict[str, Transfer] = {}
+        self.completed = 0
+        self.completed_bytes = 0
+        self.completed_sizes: list[int] = []
+
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_draw = 0.0
+        self._drawn_lines = 0
+        self._samples: deque[tuple[float, int]] = deque()
+        self._transferred = 0
+
+    def start(self, key: str, name: str, total_bytes: int | None = None) -> None:
+        """Register a new transfer."""
+        with self._lock:
+            self.transfers[key] = Transfer(name=name, total_bytes=total_bytes)
+        self._maybe_draw()
+
+    def set_total(self, key: str, total_bytes: int | None) -> None:
+        """Set the expected size of a transfer once it's known."""
+        with self._lock:
+            if key in self.transfers:
+                self.transfers[key].total_bytes = total_bytes
+
+    def advance(self, key: str, num_bytes: int) -> None:
+        """Record that `num_bytes` more bytes have been received for a transfer."""
+        with self._lock:
+            self.transfers[key].done_bytes += num_bytes
+            self._transferred += num_bytes
+        self._maybe_draw()
+
+    def restart(self, key: str) -> None:
+        """Start a transfer over from nothing, as when it's being retried."""
+        with self._lock:
+            if key in self.transfers:
+                self.transfers[key].done_bytes = 0
+                self.transfers[key].status = "Downloading"
+        self._maybe_draw()
+
+    def set_status(self, key: str, status: str) -> None:
+        """Update the status text shown for a transfer (e.g. while applying metadata)."""
+        with self._lock:
+            if key in self.transfers:
+                self.transfers[key].status = status
+        self._maybe_draw()
+
+    def succeed(self, key: str, message: str) -> None:
+        """Mark a transfer as successfully completed."""
+        self._finish(key, color(f"✔ {message}", "green"))
+
+    def fail(self, key: str, message: str) -> None:
+        """Mark a transfer as failed."""
+        self._finish(key, color(f"✖ {message}", "red"))
+
+    def close(self) -> None:
+        """Clear the live display."""
+        with self._lock:
+            self._clear()
+            self.stream.flush()
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the progress display was created."""
+        return time.monotonic() - self._started
+
+    @property
+    def transferred_bytes(self) -> int:
+        """Total bytes received across all transfers so far."""
+        return self._transferred
+
+    def _finish(self, key: str, line: str) -> None:
+        with self._lock:
+            transfer = self.transfers.pop(key, None)
+            self.completed += 1
+            if transfer is not None:
+                self.completed_bytes += transfer.done_bytes
+                self.completed_sizes.append(transfer.done_bytes)
+
+            self._clear()
+            self.stream.write(f"{line}\n")
+            if self.is_tty:
+                self._draw()
+            self.stream.flush()
+
+    def _maybe_draw(self) -> None:
+        now = time.monotonic()
+        if now - self._last_draw < self.min_interval:
+            return
+        with self._lock:
+            if now - self._last_draw < self.min_interval:
+                return
+            self._last_draw = now
+            if self.is_tty:
+                self._clear()
+                self._draw()
+            else:
+                self.stream.write(f"{self._summary()}\n")
+            self.stream.flush()
+
+    def _draw(self) -> None:
+        """Draw the live block. Must be called with the lock held."""
+        lines = [self._describe(transfer) for transfer in self.transfers.values()]
+        lines.append(self._summary())
+        self.stream.write("".join(f"{line}\n" for line in lines))
+        self._drawn_lines = len(lines)
+
+    def _clear(self) -> None:
+        """Erase the live block. Must be called with the lock held."""
+        if self.is_tty and self._drawn_lines:
+            self.stream.write(f"\033[{self._drawn_lines}F\033[J")
+        self._drawn_lines = 0
+
+    def _describe(self, transfer: Transfer) -> str:
+        if transfer.total_bytes:
+            percent = min(100, transfer.done_bytes * 100 // transfer.total_bytes)
+            size = f"{format_bytes(transfer.done_bytes)}/{format_bytes(transfer.total_bytes)}"
+            return color(f"  {transfer.status} {transfer.name}... {percent}% ({size})", "cyan")
+        return color(
+            f"  {transfer.status} {transfer.name}... ({format_bytes(transfer.done_bytes)})", "cyan"
+        )
+
+    def _summary(self) -> str:
+        rate = self._rate()
+        summary = (
+            f"{self.completed}/{self.total_tracks} tracks, "
+            f"{format_bytes(self._transferred)} at {format_bytes(rate)}/s"
+        )
+        if (eta := self._eta(rate)) is not None:
+            summary += f", ETA {int(eta) // 60}:{int(eta) % 60:02d}"
+        return color(summary, "blue")
+
+    def _rate(self) -> float:
+        """Aggregate transfer rate over the recent window, in bytes per second."""
+        now = time.monotonic()
+        self._samples.append((now, self._transferred))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.SPEED_WINDOW:
+            self._samples.popleft()
+
+        start_time, start_bytes = self._samples[0]
+        if now - start_time <= 0:
+            return 0.0
+        return (self._transferred - start_bytes) / (now - start_time)
+
+    def _eta(self, rate: float) -> float | None:
+        """Estimate the seconds remaining, guessing sizes of unknown transfers from known ones."""
+        if rate <= 0:
+            return None
+
+        known_sizes = self.completed_sizes + [
+            t.total_bytes for t in self.transfers.values() if t.total_bytes
+        ]
+        if not known_sizes:
+            return None
+        average_size = sum(known_sizes) / len(known_sizes)
+
+        remaining = sum(
+            (t.total_bytes or average_size) - t.done_bytes for t in self.transfers.values()
+        )
+        unstarted = self.total_tracks - self.completed - len(self.transfers)
+        remaining += max(0, unstarted) * average_size
+        return max(0.0, remaining / rate)
+
+
+def format_bytes(num_bytes: float) -> str:
+    """Format a byte count for display."""
+    for unit in ("B", "KB", "MB"):
+        if num_bytes < 1000:
+            return f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1000
+    return f"{num_bytes:.2f} GB"
@@ -0,0 +1,68 @@
+"""Look up the size and validators of files on the server without downloading them."""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import requests
+from polykit.log import PolyLog
+from requests.adapters import HTTPAdapter
+
+from evremixes.types import RemoteFile
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+MAX_REQUESTS = 16
+MAX_CONNECTIONS = 32
+
+logger = PolyLog.get_logger()
+
+
+def create_session() -> requests.Session:
+    """Create an HTTP session for sharing connections between requests to the same hosts.
+
+    The connection pool is sized so concurrent downloads and HEAD requests can each keep their
+    connection open instead of reconnecting.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=MAX_CONNECTIONS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def head_files(
+    urls: list[str],
+    session: requests.Session | None = None,
+    known: Mapping[str, RemoteFile] | None = None,
+) -> dict[str, RemoteFile | None]:
+    """Send HEAD requests for the given URLs in parallel.
+
+    URLs in `known` (like files whose details are listed in the tracklist) are answered from it
+    without a request. Returns a RemoteFile for each URL, or None for any that couldn't be reached.
+    """
+    known = known or {}
+    results = {url: known.get(url) for url in dict.fromkeys(urls)}
+    pending = [url for url in results if url not in known]
+    if not pending:
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(MAX_REQUESTS, len(pending))) as executor:
+        found = executor.map(lambda url: head_file(url, session), pending)
+        results.update(zip(pending, found, strict=True))
+    return results
+
+
+def head_file(url: str, session: requests.Session | None = None) -> RemoteFile | None:
+    """Send a HEAD request for a single URL. Returns None if it couldn't be reached."""
+    head = session.head if session is not None else requests.head
+    try:
+        response = head(url, allow_redirects=True, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.debug("Failed to get details for %s: %s", url, str(e))
+        return None
+
+    return RemoteFile.from_headers(url, response.headers)
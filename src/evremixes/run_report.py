@@ -0,0 +1,146 @@
+"""Record metrics for each download run."""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from polykit.log import PolyLog
+
+if TYPE_CHECKING:
+    from logging import Logger
+    from pathlib import Path
+
+    from evremixes.concurrency_controller import LimitChange
+    from evremixes.config import DownloadConfig
+    from evremixes.types import AudioFormat
+
+
+class RunReport:
+    """Metrics for a single download run, saved to the state directory when the run finishes.
+
+    Each run gets its own folder under `runs` so other output for the run can be saved alongside
+    the report. Only the most recent runs are kept.
+    """
+
+    MAX_RUNS: ClassVar[int] = 50
+    THROUGHPUT_SAMPLES: ClassVar[int] = 10
+
+    def __init__(self, config: DownloadConfig) -> None:
+        self.config = config
+        self.logger: Logger = PolyLog.get_logger()
+        self.run_id = f"{datetime.now().astimezone().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.started = time.time()
+        self.sets: list[dict[str, Any]] = []
+
+    @property
+    def run_dir(self) -> Path:
+        """The folder for this run's report and any other output."""
+        run_dir = self.config.paths.from_state("runs", self.run_id)
+        run_dir.mkdir(parents=True, exist_ok=True)
+        return run_dir
+
+    def record_set(
+        self,
+        folder: str,
+        file_format: AudioFormat,
+        num_tracks: int,
+        num_bytes: int,
+        seconds: float,
+        success: bool,
+        worker_limit: int | None = None,
+        limit_changes: list[LimitChange] | None = None,
+    ) -> None:
+        """Record the outcome of downloading a set of tracks.
+
+        Args:
+            folder: The folder the set was downloaded to, as displayed.
+            file_format: The format of the set.
+            num_tracks: The number of tracks in the set.
+            num_bytes: The number of bytes transferred.
+            seconds: How long the set took to download.
+            success: Whether every track was downloaded.
+            worker_limit: The number of downloads allowed at once when the set finished.
+            limit_changes: Each change made to that number while downloading the set.
+        """
+        self.sets.append(
+            {
+                "folder": folder,
+                "format": file_format.value,
+                "tracks": num_tracks,
+                "bytes": num_bytes,
+                "seconds": round(seconds, 3),
+                "success": success,
+                "worker_limit": worker_limit,
+                "limit_changes": [
+                    {
+                        "seconds": round(change.time - self.started, 3),
+                        "limit": change.limit,
+                        "reason": change.reason,
+                        "throughput": round(change.throughput)
+                        if change.throughput is not None
+                        else None,
+                    }
+                    for change in limit_changes or []
+                ],
+            }
+        )
+
+    def finish(self, success: bool) -> None:
+        """Save the report for this run."""
+        report = {
+            "run_id": self.run_id,
+            "started": datetime.fromtimestamp(self.started).astimezone().isoformat(),
+            "duration": round(time.time() - self.started, 3),
+            "success": success,
+            "bytes": sum(s["bytes"] for s in self.sets),
+            "memory_peak": self.config.memory.peak,
+            "sets": self.sets,
+        }
+        try:
+            with (self.run_dir / "report.json").open("w") as f:
+                json.dump(report, f, indent=2)
+            self.config.profiler.save(self.run_dir)
+            self._prune_old_runs()
+        except OSError as e:
+            self.logger.debug("Failed to save run report: %s", str(e))
+
+    @classmethod
+    def average_throughput(cls, config: DownloadConfig) -> float | None:
+        """Get the average download throughput of recent runs in bytes per second.
+
+        Returns None if there are no previous runs to go by.
+        """
+        total_bytes = 0
+        total_seconds = 0.0
+
+        for report_file in cls._report_files(config)[-cls.THROUGHPUT_SAMPLES :]:
+            try:
+                with report_file.open() as f:
+                    report = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            for track_set in report.get("sets", []):
+                if track_set.get("bytes") and track_set.get("seconds"):
+                    total_bytes += track_set["bytes"]
+                    total_seconds += track_set["seconds"]
+
+        return total_bytes / total_seconds if total_seconds else None
+
+    @classmethod
+    def _report_files(cls, config: DownloadConfig) -> list[Path]:
+        """Get the report files of previous runs, oldest first."""
+        runs_dir = config.paths.from_state("runs", no_create=True)
+        if not runs_dir.exists():
+            return []
+        return sorted(runs_dir.glob("*/report.json"))
+
+    def _prune_old_runs(self) -> None:
+        runs_dir = self.run_dir.parent
+        for old_run in sorted(p for p in runs_dir.iterdir() if p.is_dir())[: -self.MAX_RUNS]:
+            shutil.rmtree(old_run, ignore_errors=True)
@@ -0,0 +1,122 @@
+"""Check for enough free disk space before downloading."""
+
+from __future__ import annotations
+
+import errno
+import os
+import shutil
+import sys
+from typing import TYPE_CHECKING, ClassVar
+
+from halo import Halo
+from polykit.text import color, print_color
+
+from evremixes.progress import format_bytes
+from evremixes.remote_files import head_files
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from evremixes.config import DownloadConfig
+
+
+class SpaceChecker:
+    """Helper class for checking free disk space against the size of a download.
+
+    Sizes come from the tracklist if it lists them, or parallel HEAD requests otherwise, so a
+    download that won't fit fails up front instead of partway through. Each set is staged in full
+    before it's moved into place, so the staging area needs room for the largest set and each
+    destination needs room for everything going to it. Folders on the same filesystem share the same
+    free space and are counted together.
+    """
+
+    HEADROOM: ClassVar[int] = 50 * 1024 * 1024
+
+    def __init__(self, config: DownloadConfig) -> None:
+        self.config = config
+
+        # Sizes found by the last check, kept so the download can use them without asking again
+        self.sizes: dict[str, int | None] = {}
+
+    def check(self, track_sets: list[tuple[Path, list[str]]]) -> bool:
+        """Check there's enough space for the given sets. Returns True if there is.
+
+        Args:
+            track_sets: The destination folder and the file URLs for each set to download.
+        """
+        spinner = Halo(
+            text=color("Checking available disk space...", "cyan"),
+            spinner="dots",
+            enabled=sys.stdout.isatty(),
+        )
+        spinner.start()
+        sizes = self.sizes = self.get_sizes([url for _, urls in track_sets for url in urls])
+        spinner.stop()
+
+        set_totals = [
+            (folder, sum(sizes.get(url) or 0 for url in urls)) for folder, urls in track_sets
+        ]
+        if not set_totals:
+            return True
+
+        # Staging only holds one set at a time, but destinations get everything
+        required: dict[int, tuple[Path, int]] = {}
+        staging = self.config.paths.from_state("staging", no_create=True)
+        self._add_requirement(required, staging, max(total for _, total in set_totals))
+        for folder, total in set_totals:
+            self._add_requirement(required, folder, total)
+
+        enough_space = True
+        for path, needed in required.values():
+            free = shutil.disk_usage(path).free
+            if free < needed + self.HEADROOM:
+                print_color(
+                    f"Not enough space in {path}: {format_bytes(needed)} needed, "
+                    f"{format_bytes(free)} available.",
+                    "red",
+                )
+                enough_space = False
+
+        return enough_space
+
+    def get_sizes(self, urls: list[str]) -> dict[str, int | None]:
+        """Get the size of each URL from its Content-Length, or None if it isn't available."""
+        return {
+            url: info.size if info else None
+            for url, info in head_files(urls, self.config.session, self.config.known_files).items()
+        }
+
+    def _add_requirement(
+        self, required: dict[int, tuple[Path, int]], path: Path, size: int
+    ) -> None:
+        """Add to the space needed on the filesystem containing the given path."""
+        existing = self._nearest_existing(path)
+        device = existing.stat().st_dev
+        _, total = required.get(device, (existing, 0))
+        required[device] = (existing, total + size)
+
+    @staticmethod
+    def _nearest_existing(path: Path) -> Path:
+        """Get the path, or its closest parent that exists (for folders not yet created)."""
+        path = path.expanduser().absolute()
+        while not path.exists() and path.parent != path:
+            path = path.parent
+        return path
+
+
+def preallocate(file_descriptor: int, size: int) -> None:
+    """Reserve space for a file before writing it, if the platform supports it.
+
+    This reduces fragmentation and makes a full disk fail immediately rather than partway through.
+
+    Raises:
+        OSError: If there isn't enough space for the file.
+    """
+    if not hasattr(os, "posix_fallocate") or size <= 0:
+        return
+    try:
+        os.posix_fallocate(file_descriptor, 0, size)
+    except OSError as e:
+        # Not all filesystems support preallocation, so only a full disk is an error
+        if e.errno == errno.ENOSPC:
+            raise
@@ -0,0 +1,238 @@
+"""Work out what a sync would do without downloading anything."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import TYPE_CHECKING
+
+from polykit.text import print_color
+
+from evremixes.progress import format_bytes
+from evremixes.remote_files import head_files
+from evremixes.run_report import RunReport
+from evremixes.types import AudioFormat
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from evremixes.config import DownloadConfig
+    from evremixes.track_downloader import TrackDownloader
+    from evremixes.types import AlbumInfo, RemoteFile, TrackMetadata, TrackSet
+
+
+class SyncAction(StrEnum):
+    """What a sync needs to do with a file."""
+
+    DOWNLOAD = "download"
+    RETAG = "retag"
+    DELETE = "delete"
+    KEEP = "keep"
+
+
+@dataclass(slots=True)
+class PlannedFile:
+    """A file in the destination and what a sync would do with it."""
+
+    path: Path
+    action: SyncAction
+    size: int = 0
+    reason: str = ""
+    track: TrackMetadata | None = None
+    is_instrumental: bool = False
+
+
+@dataclass
+class SyncPlan:
+    """Everything a sync would do to bring the destination up to date."""
+
+    album_info: AlbumInfo
+    files: list[PlannedFile] = field(default_factory=list)
+    unknown_sizes: int = 0
+
+    def get_files(self, action: SyncAction) -> list[PlannedFile]:
+        """Get the planned files with the given action."""
+        return [planned for planned in self.files if planned.action is action]
+
+    def total_size(self, action: SyncAction) -> int:
+        """Get the total size of the planned files with the given action."""
+        return sum(planned.size for planned in self.get_files(action))
+
+
+class SyncPlanner:
+    """Compare the tracklist with what's already at the destination to plan a sync.
+
+    Only file headers are read locally, and the server is only sent HEAD requests (and none for
+    files the tracklist lists the details of), so planning never transfers any audio. A local file's
+    audio is considered current if the source recorded in its tags matches the file on the server;
+    otherwise it would need to be downloaded again.
+    """
+
+    def __init__(self, config: DownloadConfig, downloader: TrackDownloader) -> None:
+        self.config = config
+        self.downloader = downloader
+        self.metadata = downloader.metadata
+
+    def plan(self, album_info: AlbumInfo, tracks: list[TrackMetadata] | None = None) -> SyncPlan:
+        """Plan a sync of the given tracks, or all of them if not specified."""
+        plan = SyncPlan(album_info)
+        set_tracks = album_info.tracks if tracks is None else tracks
+        track_sets = self.downloader.get_track_sets(album_info, self.config)
+
+        sources = {
+            (index, track.track_number): self.get_source_url(track, track_set)
+            for index, track_set in enumerate(track_sets)
+            for track in set_tracks
+        }
+        remote_files = head_files(
+            list(sources.values()), self.config.session, self.config.known_files
+        )
+        downloading: set[str] = set()
+
+        for index, track_set in enumerate(track_sets):
+            local_files = self._get_local_files(track_set.folder)
+            expected_names = {
+                self.downloader.get_track_filename(
+                    track, track_set.file_format, track_set.is_instrumental
+                )
+                for track in album_info.tracks
+            }
+
+            for track in set_tracks:
+                url = sources[index, track.track_number]
+                planned = self._plan_track(track, track_set, album_info, url, remote_files.get(url))
+
+                # Sets that share a source (like derived ALAC) only download it once
+                if planned.action is SyncAction.DOWNLOAD:
+                    if url in downloading:
+                        planned.size = 0
+                    elif remote_files.get(url) is None:
+                        plan.unknown_sizes += 1
+                    downloading.add(url)
+                plan.files.append(planned)
+
+            # A filtered sync leaves everything outside the filter alone
+            if self.config.track_filter is None:
+                plan.files.extend(
+                    PlannedFile(
+                        path, SyncAction.DELETE, path.stat().st_size, "no longer in tracklist"
+                    )
+                    for name, path in local_files.items()
+                    if name not in expected_names
+                )
+
+        return plan
+
+    def get_source_url(self, track: TrackMetadata, track_set: TrackSet) -> str:
+        """Get the URL a track's audio would come from for the given set."""
+        file_format = track_set.file_format
+        if (
+            self.config.is_admin
+            and self.config.derive_alac
+            and self.downloader.converter.available
+            and file_format is AudioFormat.ALAC
+        ):
+            file_format = AudioFormat.FLAC
+        return self.downloader.get_file_url(track, file_format, track_set.is_instrumental)
+
+    def print_plan(self, plan: SyncPlan) -> None:
+        """Print a summary of the plan along with the estimated duration."""
+        print_color(f"\nSync plan for {plan.album_info.album_name}:\n", "cyan")
+
+        for planned in plan.files:
+            if planned.action is not SyncAction.KEEP:
+                display_path = self.downloader.format_path_for_display(planned.path)
+                print(f"  {planned.action.value:<8} {display_path} ({planned.reason})")
+
+        download_size = plan.total_size(SyncAction.DOWNLOAD)
+        delete_size = plan.total_size(SyncAction.DELETE)
+        print_color(
+            f"\n  Download:   {len(plan.get_files(SyncAction.DOWNLOAD))} files, "
+            f"{format_bytes(download_size)}",
+            "white",
+        )
+        print_color(f"  Retag:      {len(plan.get_files(SyncAction.RETAG))} files", "white")
+        print_color(
+            f"  Delete:     {len(plan.get_files(SyncAction.DELETE))} files, "
+            f"{format_bytes(delete_size)}",
+            "white",
+        )
+        print_color(f"  Up to date: {len(plan.get_files(SyncAction.KEEP))} files", "white")
+
+        if plan.unknown_sizes:
+            print_color(f"\nCouldn't get the size of {plan.unknown_sizes} files.", "yellow")
+
+        if not download_size:
+            return
+
+        throughput = RunReport.average_throughput(self.config)
+        if throughput is None:
+            print_color("\nNo previous runs to estimate the duration from.", "yellow")
+            return
+
+        seconds = int(download_size / throughput)
+        print_color(
+            f"\nEstimated time: {seconds // 60}:{seconds % 60:02d} "
+            f"at {format_bytes(int(throughput))}/s (average of recent runs)",
+            "green",
+        )
+
+    def _plan_track(
+        self,
+        track: TrackMetadata,
+        track_set: TrackSet,
+        album_info: AlbumInfo,
+        url: str,
+        remote: RemoteFile | None,
+    ) -> PlannedFile:
+        """Work out what needs to happen for a single track in a set."""
+        path = track_set.folder / self.downloader.get_track_filename(
+            track, track_set.file_format, track_set.is_instrumental
+        )
+        size = (remote.size or 0) if remote else 0
+
+        def planned(action: SyncAction, reason: str = "", planned_size: int = 0) -> PlannedFile:
+            return PlannedFile(path, action, planned_size, reason, track, track_set.is_instrumental)
+
+        if not path.exists():
+            return planned(SyncAction.DOWNLOAD, "missing", size)
+
+        tags = self.metadata.read_tags(path)
+        if tags is None:
+            return planned(SyncAction.DOWNLOAD, "unreadable", size)
+
+        if not tags.get("source_url"):
+            return planned(SyncAction.DOWNLOAD, "unknown source", size)
+
+        if not self.is_audio_current(tags, url, remote):
+            return planned(SyncAction.DOWNLOAD, "audio changed", size)
+
+        expected = self.metadata.get_expected_tags(track, album_info, track_set.is_instrumental)
+        if any(tags.get(key, "") != value for key, value in expected.items()) or not tags.get(
+            "has_cover"
+        ):
+            return planned(SyncAction.RETAG, "metadata changed")
+
+        return planned(SyncAction.KEEP)
+
+    @staticmethod
+    def is_audio_current(tags: dict[str, str], url: str, remote: RemoteFile | None) -> bool:
+        """Check whether the source recorded in a file's tags matches the file on the server."""
+        if tags.get("source_url") != url:
+            return False
+        if remote is None:  # Can't tell, so assume it's fine rather than downloading blindly
+            return True
+        if remote.size is not None and tags.get("source_size") not in {None, str(remote.size)}:
+            return False
+        return not (remote.etag and tags.get("source_etag") not in {None, remote.etag})
+
+    @staticmethod
+    def _get_local_files(folder: Path) -> dict[str, Path]:
+        """Get the audio files at the top level of a folder, by name."""
+        if not folder.exists():
+            return {}
+        return {
+            path.name: path
+            for path in folder.glob("*")
+            if path.is_file() and path.suffix.lower() in {".flac", ".m4a"}
+        }
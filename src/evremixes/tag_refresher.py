@@ -0,0 +1,264 @@
+"""Bring the tags and names of existing files up to date without downloading them again."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from polykit.log import PolyLog
+from polykit.text import color, print_color
+
+from evremixes.remote_files import head_files
+from evremixes.sync_planner import SyncPlanner
+
+if TYPE_CHECKING:
+    from logging import Logger
+    from pathlib import Path
+
+    from evremixes.config import DownloadConfig
+    from evremixes.track_downloader import TrackDownloader
+    from evremixes.types import AlbumInfo, RemoteFile, TrackMetadata, TrackSet
+
+
+@dataclass(slots=True)
+class LocalTrack:
+    """An existing file matched to the track it holds."""
+
+    path: Path
+    track: TrackMetadata
+    source_url: str
+    tags: dict[str, str]
+
+
+class TagRefresher:
+    """Retag and rename existing files in place when only the metadata has changed upstream.
+
+    Files are matched to tracks in the current tracklist by the source URL recorded in their tags,
+    or for files without one, by their name in the tracklist they were last synced with. A file is
+    only touched if its audio is still current, so renames, renumbering, and changes to the album
+    details or cover art are applied in seconds with no audio transferred. Files with new audio are
+    left for a normal download.
+    """
+
+    def __init__(self, config: DownloadConfig, downloader: TrackDownloader) -> None:
+        self.config = config
+        self.downloader = downloader
+        self.metadata = downloader.metadata
+        self.planner = SyncPlanner(config, downloader)
+        self.logger: Logger = PolyLog.get_logger()
+
+    def refresh(self, album_info: AlbumInfo, previous: AlbumInfo | None = None) -> bool:
+        """Refresh the tags and names of existing files for an album. Returns success status.
+
+        Args:
+            album_info: The current metadata for the album.
+            previous: The metadata the album was last synced with, if it was saved.
+        """
+        track_sets = self.downloader.get_track_sets(album_info, self.config)
+        previous_sets = (
+            self.downloader.get_track_sets(previous, self.config)
+            if previous is not None
+            else [None] * len(track_sets)
+        )
+        remote_files = head_files(
+            [
+                self.planner.get_source_url(track, track_set)
+                for track_set in track_sets
+                for track in album_info.tracks
+            ],
+            self.config.session,
+            self.config.known_files,
+        )
+
+        success = True
+        unchanged = outdated = 0
+        for track_set, previous_set in zip(track_sets, previous_sets, strict=True):
+            if previous_set is not None:
+                self._move_folder(previous_set.folder, track_set.folder)
+
+            renames: dict[Path, Path] = {}
+            for local in self._match_files(track_set, album_info, previous):
+                if not self._is_audio_current(local, remote_files.get(local.source_url)):
+                    outdated += 1
+                    continue
+
+                retagged = self._needs_retag(local, album_info, track_set.is_instrumental)
+                if retagged:
+                    success &= self._retag(local, album_info, track_set, remote_files)
+
+                new_path = track_set.folder / self.downloader.get_track_filename(
+                    local.track, track_set.file_format, track_set.is_instrumental
+                )
+                if new_path != local.path:
+                    renames[local.path] = new_path
+                elif not retagged:
+                    unchanged += 1
+
+            success &= self._rename_files(renames)
+
+        print_color(f"\n{unchanged} files were already up to date.", "green")
+        if outdated:
+            print_color(
+                f"{outdated} files have new audio and need to be downloaded again.", "yellow"
+            )
+        return success
+
+    def _match_files(
+        self, track_set: TrackSet, album_info: AlbumInfo, previous: AlbumInfo | None
+    ) -> list[LocalTrack]:
+        """Match the files in a set's folder to the current tracks they hold."""
+        if not track_set.folder.exists():
+            return []
+
+        tracks_by_source = {
+            self.planner.get_source_url(track, track_set): track for track in album_info.tracks
+        }
+        previous_sources = {
+            self.downloader.get_track_filename(
+                track, track_set.file_format, track_set.is_instrumental
+            ): self.planner.get_source_url(track, track_set)
+            for track in (previous.tracks if previous is not None else [])
+        }
+
+        matched: list[LocalTrack] = []
+        for path in sorted(track_set.folder.glob(f"*.{track_set.file_format.extension}")):
+            tags = self.metadata.read_tags(path)
+            if tags is None:
+                continue
+
+            source_url = tags.get("source_url") or previous_sources.get(path.name)
+            if source_url is not None and (track := tracks_by_source.get(source_url)):
+                matched.append(LocalTrack(path, track, source_url, tags))
+
+        return matched
+
+    def _is_audio_current(self, local: LocalTrack, remote: RemoteFile | None) -> bool:
+        """Check whether a file's audio is still current, going by its recorded source."""
+        if not local.tags.get("source_url"):  # Matched by name, so the URL hasn't changed
+            return True
+        return self.planner.is_audio_current(local.tags, local.source_url, remote)
+
+    def _needs_retag(self, local: LocalTrack, album_info: AlbumInfo, is_instrumental: bool) -> bool:
+        expected = self.metadata.get_expected_tags(local.track, album_info, is_instrumental)
+        return not local.tags.get("has_cover") or any(
+            local.tags.get(key, "") != value for key, value in expected.items()
+        )
+
+    def _retag(
+        self,
+        local: LocalTrack,
+        album_info: AlbumInfo,
+        track_set: TrackSet,
+        remote_files: dict[str, RemoteFile | None],
+    ) -> bool:
+        """Rewrite a file's tags and cover art in place. Returns True if successful."""
+        cover_url = (
+            album_info.inst_art_url if track_set.is_instrumental else album_info.cover_art_url
+        )
+        try:
+            cover_data = self.metadata.get_cover_art(cover_url)
+        except ValueError as e:
+            self.logger.error("Failed to get cover art: %s", str(e))
+            return False
+
+        # Keep the recorded source, or record it now for files that didn't have one
+        source = self.metadata.read_source(local.path) or remote_files.get(local.source_url)
+        if not self.metadata.apply_metadata(
+            local.track, album_info, local.path, cover_data, track_set.is_instrumental, source
+        ):
+            print(color(f"✖ Failed to retag {local.path.name}.", "red"))
+            return False
+
+        print(color(f"✔ Retagged {local.path.name}", "green"))
+        return True
+
+    def _rename_files(self, renames: dict[Path, Path]) -> bool:
+        """Rename files to their new names. Returns True if all were renamed.
+
+        Files are moved aside first so tracks that swap names don't overwrite each other, and a
+        file is never renamed over one that isn't part of the refresh. A file that can't be renamed
+        stays where it is (or goes back there if it was already moved aside), so nothing else is
+        renamed over it either.
+        """
+        pending = dict(renames)
+        while blocked := [
+            old_path
+            for old_path, new_path in pending.items()
+            if new_path.exists() and new_path not in pending
+        ]:
+            for old_path in blocked:
+                new_path = pending.pop(old_path)
+                print(color(f"✖ Can't rename {old_path.name}: {new_path.name} exists.", "red"))
+
+        staged: dict[Path, tuple[Path, Path]] = {}
+        for old_path, new_path in pending.items():
+            temp_path = old_path.with_name(f".{old_path.name}.refresh")
+            try:
+                old_path.rename(temp_path)
+            except OSError as e:
+                print(color(f"✖ Failed to rename {old_path.name}: {e.strerror}", "red"))
+                continue
+            staged[temp_path] = (old_path, new_path)
+
+        placed: dict[Path, tuple[Path, Path]] = {}  # Temporary and old path by new path
+        failed: list[tuple[Path, Path]] = []  # Temporary and old path
+        for temp_path, (old_path, new_path) in staged.items():
+            # A file that couldn't be moved aside is still in the way
+            if new_path.exists():
+                print(color(f"✖ Can't rename {old_path.name}: {new_path.name} exists.", "red"))
+                failed.append((temp_path, old_path))
+                continue
+            try:
+                temp_path.rename(new_path)
+            except OSError as e:
+                print(color(f"✖ Failed to rename {old_path.name}: {e.strerror}", "red"))
+                failed.append((temp_path, old_path))
+                continue
+            placed[new_path] = (temp_path, old_path)
+
+        self._restore_names(failed, placed)
+        for new_path, (_, old_path) in placed.items():
+            print(color(f"✔ Renamed {old_path.name} to {new_path.name}", "green"))
+
+        return len(placed) == len(renames)
+
+    def _restore_names(
+        self, failed: list[tuple[Path, Path]], placed: dict[Path, tuple[Path, Path]]
+    ) -> None:
+        """Move files that couldn't be renamed back from their temporary names.
+
+        A file renamed onto the old name of one that failed is moved aside again first, and then
+        goes back to its own old name too, so a failure partway through a swap undoes the swap.
+        """
+        while failed:
+            temp_path, old_path = failed.pop()
+            if old_path in placed:
+                other_temp, other_old = placed.pop(old_path)
+                if self._move_back(old_path, other_temp):
+                    failed.append((other_temp, other_old))
+            if old_path.exists() or not self._move_back(temp_path, old_path):
+                print(color(f"✖ {old_path.name} was left as {temp_path.name}.", "red"))
+
+    def _move_back(self, source: Path, dest: Path) -> bool:
+        """Undo part of a refresh's renames. Returns True if the file was moved."""
+        try:
+            source.rename(dest)
+        except OSError as e:
+            self.logger.error("Failed to move %s back to %s: %s", source.name, dest.name, str(e))
+            return False
+        return True
+
+    def _move_folder(self, old_folder: Path, new_folder: Path) -> None:
+        """Move a set's folder to its new location if the album was renamed."""
+        if old_folder == new_folder or not old_folder.exists() or new_folder.exists():
+            return
+
+        new_folder.parent.mkdir(parents=True, exist_ok=True)
+        old_folder.rename(new_folder)
+        print(
+            color(
+                f"✔ Moved {self.downloader.format_path_for_display(old_folder)} to "
+                f"{self.downloader.format_path_for_display(new_folder)}",
+                "green",
+            )
+        )
@@ -6,39 +6,87 @@ import platform
 import shutil
 import string
 import subprocess
-import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from enum import StrEnum
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, BinaryIO, ClassVar
 
 import requests
-from halo import Halo
 from polykit.cli import handle_interrupt
-from polykit.text import color, print_color
+from polykit.text import print_color
 from polykit.log import PolyLog
 
+from evremixes.alac_converter import AlacConverter
 from evremixes.analytics import AnalyticsHelper
+from evremixes.audio_payload import hash_audio, hash_file
+from evremixes.concurrency_controller import ConcurrencyController, get_congestion_reason
+from evremixes.download_journal import DownloadJournal, SetState, TrackState
+from evremixes.file_links import link_or_copy
+from evremixes.job_scheduler import order_longest_first
+from evremixes.loudness_analyzer import LoudnessAnalyzer
 from evremixes.metadata_helper import MetadataHelper
-from evremixes.types import AudioFormat, TrackVersions
+from evremixes.progress import DownloadProgress
+from evremixes.remote_files import head_files
+from evremixes.run_report import RunReport
+from evremixes.space_checker import SpaceChecker, preallocate
+from evremixes.sync_planner import SyncPlanner
+from evremixes.types import AudioFormat, RemoteFile, TrackSet, TrackVersions
 
 if TYPE_CHECKING:
     from logging import Logger
 
     from evremixes.config import DownloadConfig
-    from evremixes.types import AlbumInfo
+    from evremixes.types import AlbumInfo, TrackMetadata
+
+
+class TrackOrigin(StrEnum):
+    """Where the audio for a staged track came from."""
+
+    KEPT = "Kept"  # The file already at the destination, retagged
+    COPIED = "Copied"  # The download cache
+    DOWNLOADED = "Downloaded"
 
 
 class TrackDownloader:
     """Helper class for downloading tracks."""
 
-    def __init__(self, config: DownloadConfig) -> None:
+    CHUNK_SIZE: ClassVar[int] = 1024 * 1024
+
+    # Attempts at a download that fails from congestion, and seconds to wait per attempt so far
+    MAX_ATTEMPTS: ClassVar[int] = 3
+    RETRY_DELAY: ClassVar[float] = 2.0
+
+    def __init__(self, config: DownloadConfig, metadata: MetadataHelper | None = None) -> None:
         self.config = config
-        self.metadata = MetadataHelper(config)
+        self.metadata = metadata or MetadataHelper(config)
+        self.converter = AlacConverter(self.metadata)
+        self.loudness = LoudnessAnalyzer(self.metadata)
         self.analytics = AnalyticsHelper(config)
+        self.space_checker = SpaceChecker(config)
+        self.concurrency = ConcurrencyController(
+            config.max_workers, maximum=max(config.max_workers, config.worker_ceiling)
+        )
         self.logger: Logger = PolyLog.get_logger()
+        self._cancelled = threading.Event()
+        self.report: RunReport | None = None
 
     @handle_interrupt()
-    def download_tracks(self, album_info: AlbumInfo, config: DownloadConfig) -> None:
-        """Download tracks according to configuration.
+    def download_tracks(
+        self,
+        album_info: AlbumInfo,
+        config: DownloadConfig,
+        tracks: list[TrackMetadata] | None = None,
+    ) -> bool:
+        """Download tracks according to configuration. Returns True if all downloads succeeded.
+
+        Args:
+            album_info: The metadata for the album.
+            config: The download configuration.
+            tracks: Only download these tracks, leaving the rest of the existing files in place.
+                Downloads the complete set if not specified.
 
         Raises:
             ValueError: If the configuration is incomplete.
@@ -47,194 +95,918 @@ class TrackDownloader:
             msg = "Download configuration is incomplete"
             raise ValueError(msg)
 
-        # Sanitize album name for folder creation
-        valid_chars = f"-_.() {string.ascii_letters}{string.digits}"
-        album_name = "".join(c for c in album_info.album_name if c in valid_chars)
+        track_sets = self.get_track_sets(album_info, config)
+        if not track_sets:
+            return False
 
-        # Get base output folder
-        base_folder = config.location / album_name
+        if not self._check_space(album_info.tracks if tracks is None else tracks, track_sets):
+            return False
+
+        self.report = RunReport(config)
+        base_folder = track_sets[0].folder
         overall_success = True
 
-        match config.versions:
-            case TrackVersions.ORIGINAL:
-                overall_success &= self._download_and_move_set(
-                    album_info, base_folder, config.audio_format, is_instrumental=False
-                )
-            case TrackVersions.INSTRUMENTAL:
-                overall_success &= self._download_and_move_set(
-                    album_info, base_folder, config.audio_format, is_instrumental=True
-                )
-            case TrackVersions.BOTH:
-                overall_success &= self._download_and_move_set(
-                    album_info, base_folder, config.audio_format, is_instrumental=False
-                )
+        for index, track_set in enumerate(track_sets):
+            if index:
                 print()
-                overall_success &= self._download_and_move_set(
-                    album_info,
-                    base_folder / "Instrumentals",
-                    config.audio_format,
-                    is_instrumental=True,
-                )
-            case _:
-                return
+            overall_success &= self._download_and_move_set(album_info, track_set, tracks)
 
         if overall_success and not config.is_admin:
             print_color("\nEnjoy!", "green")
-            self.open_folder_in_os(base_folder)
+            if config.open_when_done:
+                self.open_folder_in_os(base_folder)
         elif not overall_success:
             print_color("\nSome downloads were not completed successfully.", "yellow")
 
+        self.report.finish(overall_success)
+        return overall_success
+
+    def get_track_sets(self, album_info: AlbumInfo, config: DownloadConfig) -> list[TrackSet]:
+        """Get the sets of tracks a download will produce, along with where each set goes.
+
+        Each set is laid out the same way under any extra locations as it is under the main one.
+        """
+        album_folder = self.get_album_folder_name(album_info)
+
+        if config.is_admin:
+            base_path = config.get_onedrive_folder(album_folder)
+            track_sets = [
+                TrackSet(base_path / f"{prefix}{file_format.display_name}", file_format, inst)
+                for file_format in AudioFormat
+                for inst, prefix in ((False, ""), (True, "Instrumentals "))
+            ]
+        elif config.audio_format is None or config.location is None:
+            return []
+        else:
+            base_path = config.location / album_folder
+            match config.versions:
+                case TrackVersions.ORIGINAL:
+                    track_sets = [TrackSet(base_path, config.audio_format, is_instrumental=False)]
+                case TrackVersions.INSTRUMENTAL:
+                    track_sets = [TrackSet(base_path, config.audio_format, is_instrumental=True)]
+                case TrackVersions.BOTH:
+                    track_sets = [
+                        TrackSet(base_path, config.audio_format, is_instrumental=False),
+                        TrackSet(
+                            base_path / "Instrumentals", config.audio_format, is_instrumental=True
+                        ),
+                    ]
+                case _:
+                    return []
+
+        for track_set in track_sets:
+            track_set.mirrors = [
+                location / album_folder / track_set.folder.relative_to(base_path)
+                for location in config.extra_locations
+            ]
+        return track_sets
+
+    def _check_space(self, tracks: list[TrackMetadata], track_sets: list[TrackSet]) -> bool:
+        """Check there's enough disk space for the given sets. Returns True if there is."""
+        return self.space_checker.check(
+            [
+                (
+                    destination,
+                    [
+                        self.get_file_url(track, track_set.file_format, track_set.is_instrumental)
+                        for track in tracks
+                    ],
+                )
+                for track_set in track_sets
+                for destination in track_set.destinations
+            ]
+        )
+
     def _download_and_move_set(
         self,
         album_info: AlbumInfo,
-        final_folder: Path,
-        file_format: AudioFormat,
-        is_instrumental: bool,
+        track_set: TrackSet,
+        tracks: list[TrackMetadata] | None = None,
     ) -> bool:
-        """Download a track set to temp location and move to final location if successful."""
-        display_folder = self.format_path_for_display(final_folder)
+        """Download a track set to its staging folder and move it into place once it's complete.
+
+        If a subset of tracks is given, only those are downloaded and replaced, and files that are
+        no longer part of the album are pruned afterward. Everything else is left untouched. Tracks
+        staged by an earlier run that didn't finish are reused rather than downloaded again.
+        """
+        set_tracks = album_info.tracks if tracks is None else tracks
+        file_format, is_instrumental = track_set.file_format, track_set.is_instrumental
+        display_folder = self.format_path_for_display(track_set.folder)
         print_color(f"Downloading in {file_format.display_name} to {display_folder}...\n", "cyan")
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_folder = Path(temp_dir) / final_folder.name
+        journal = DownloadJournal(self.config, track_set.folder, file_format, is_instrumental)
+        if self._download_track_set(
+            album_info, set_tracks, journal, file_format, is_instrumental, display_folder
+        ):
+            return self._commit_set(journal, track_set, album_info, tracks)
 
-            # Download to temp location
-            if self._download_track_set(
-                album_info, temp_folder, file_format, is_instrumental, display_folder
-            ):
-                # Only remove previous downloads after successful download to temp
-                self.remove_previous_downloads(final_folder)
-                self._move_files_to_destination(temp_folder, final_folder)
-                return True
+        print_color(
+            "\nDownload incomplete. No changes were made to your existing files. "
+            "Completed tracks will be reused next time.",
+            "yellow",
+        )
+        return False
+
+    def _download_and_derive_set(
+        self,
+        album_info: AlbumInfo,
+        flac_set: TrackSet,
+        alac_set: TrackSet,
+        tracks: list[TrackMetadata] | None = None,
+    ) -> bool:
+        """Download a track set in FLAC and convert it locally to ALAC, then move both into place.
 
+        Both sets are only moved to their final locations once the download and all conversions
+        have succeeded, so a failure leaves the existing files for both formats untouched.
+        """
+        set_tracks = album_info.tracks if tracks is None else tracks
+        is_instrumental = flac_set.is_instrumental
+        display_folder = self.format_path_for_display(flac_set.folder)
+        print_color(f"Downloading in FLAC to {display_folder}...\n", "cyan")
+
+        flac_journal = DownloadJournal(
+            self.config, flac_set.folder, AudioFormat.FLAC, is_instrumental
+        )
+        alac_journal = DownloadJournal(
+            self.config, alac_set.folder, AudioFormat.ALAC, is_instrumental
+        )
+
+        success = self._download_track_set(
+            album_info, set_tracks, flac_journal, AudioFormat.FLAC, is_instrumental, display_folder
+        )
+        if success:
             print_color(
-                "\nDownload incomplete. No changes were made to your existing files.", "yellow"
+                f"\nConverting to ALAC for {self.format_path_for_display(alac_set.folder)}...\n",
+                "cyan",
+            )
+            success = self._derive_alac_set(
+                album_info, set_tracks, flac_journal, alac_journal, is_instrumental
+            )
+
+        if success:
+            committed = self._commit_set(flac_journal, flac_set, album_info, tracks)
+            return self._commit_set(alac_journal, alac_set, album_info, tracks) and committed
+
+        print_color(
+            "\nDownload incomplete. No changes were made to your existing files. "
+            "Completed tracks will be reused next time.",
+            "yellow",
+        )
+        return False
+
+    def _derive_alac_set(
+        self,
+        album_info: AlbumInfo,
+        tracks: list[TrackMetadata],
+        flac_journal: DownloadJournal,
+        alac_journal: DownloadJournal,
+        is_instrumental: bool,
+    ) -> bool:
+        """Convert a staged FLAC set to ALAC, skipping tracks converted by an earlier run.
+
+        ALAC files at the destination that were converted from the current FLAC audio are retagged
+        and kept rather than converted again, as `--plan` expects.
+        """
+        fingerprints = {
+            self.get_track_filename(track, AudioFormat.ALAC, is_instrumental): (
+                alac_journal.fingerprint(
+                    album_info,
+                    track,
+                    self.get_file_url(track, AudioFormat.FLAC, is_instrumental),
+                )
             )
+            for track in tracks
+        }
+        if staged := alac_journal.prepare(fingerprints):
+            print_color(f"Resuming with {staged} tracks already converted.\n", "cyan")
+        if alac_journal.state is SetState.COMPLETE:
+            return True
+
+        pending = [
+            track
+            for track in tracks
+            if not alac_journal.is_staged(
+                filename := self.get_track_filename(track, AudioFormat.ALAC, is_instrumental),
+                fingerprints[filename],
+            )
+        ]
+        current_files = self._find_current_files(
+            alac_journal, pending, AudioFormat.ALAC, is_instrumental, AudioFormat.FLAC
+        )
+
+        cover_url = album_info.inst_art_url if is_instrumental else album_info.cover_art_url
+        cover_data = self.metadata.get_cover_art(cover_url)
+        success = self._keep_current_files(
+            album_info,
+            pending,
+            alac_journal,
+            fingerprints,
+            current_files,
+            AudioFormat.ALAC,
+            is_instrumental,
+            cover_data,
+        )
+
+        jobs = [
+            (
+                track,
+                flac_journal.folder
+                / self.get_track_filename(track, AudioFormat.FLAC, is_instrumental),
+                alac_journal.folder / filename,
+            )
+            for track in pending
+            if (filename := self.get_track_filename(track, AudioFormat.ALAC, is_instrumental))
+            not in current_files
+        ]
+
+        def on_converted(output_path: Path) -> None:
+            alac_journal.record(output_path.name, fingerprints[output_path.name], TrackState.STAGED)
+
+        with self.config.profiler.stage("convert"):
+            success &= self.converter.derive_set(
+                album_info, jobs, is_instrumental, cover_data, on_converted
+            )
+        if not success:
             return False
 
-    def _move_files_to_destination(self, source_dir: Path, dest_dir: Path) -> None:
-        """Move files from temporary location to final destination."""
-        if not source_dir.exists():
-            return
+        alac_journal.mark_complete()
+        return True
+
+    def _keep_current_files(
+        self,
+        album_info: AlbumInfo,
+        tracks: list[TrackMetadata],
+        journal: DownloadJournal,
+        fingerprints: dict[str, str],
+        current_files: dict[str, Path],
+        file_format: AudioFormat,
+        is_instrumental: bool,
+        cover_data: bytes,
+    ) -> bool:
+        """Stage and retag the tracks whose files at the destination are already current.
+
+        Returns True if every one of them is staged.
+        """
+        all_successful = True
+
+        for track in tracks:
+            filename = self.get_track_filename(track, file_format, is_instrumental)
+            if (current_file := current_files.get(filename)) is None:
+                continue
+
+            output_path = journal.folder / filename
+            try:
+                link_or_copy(current_file, output_path, allow_hardlink=False)
+            except OSError as e:
+                print_color(f"✖ Failed to save {track.track_name}: {e.strerror}", "red")
+                all_successful = False
+                continue
+
+            if error := self._tag_staged_track(
+                track,
+                album_info,
+                journal,
+                fingerprints[filename],
+                output_path,
+                cover_data,
+                is_instrumental,
+                self.metadata.read_source(current_file),
+            ):
+                print_color(f"✖ {error}", "red")
+                all_successful = False
+                continue
+
+            print_color(f"✔ Kept {track.track_name}", "green")
+
+        return all_successful
+
+    def _commit_set(
+        self,
+        journal: DownloadJournal,
+        track_set: TrackSet,
+        album_info: AlbumInfo,
+        tracks: list[TrackMetadata] | None,
+    ) -> bool:
+        """Move a completely staged set into each of its destinations. Returns True if successful.
 
-        # Create destination directory if it doesn't exist
+        The staging folder is only cleared once every destination has the set. If this fails or is
+        interrupted, the journal still marks the set as complete, so the next run finds every track
+        staged and finishes putting it in place.
+        """
+        with self.config.profiler.stage("commit"):
+            success = True
+            for destination in track_set.destinations:
+                try:
+                    self._commit_to_destination(
+                        journal.folder, destination, track_set, album_info, tracks
+                    )
+                except OSError as e:
+                    display_folder = self.format_path_for_display(destination)
+                    print_color(f"Failed to move files into {display_folder}: {e}", "red")
+                    success = False
+
+            if success:
+                journal.discard()
+            return success
+
+    def _commit_to_destination(
+        self,
+        source_dir: Path,
+        dest_dir: Path,
+        track_set: TrackSet,
+        album_info: AlbumInfo,
+        tracks: list[TrackMetadata] | None,
+    ) -> None:
+        """Put a staged set in place in a single destination.
+
+        Files are first linked or copied into a pending folder next to the destination, so all the
+        slow work that can fail happens before anything existing is touched. Once every file is
+        there, the old files are removed and the new ones renamed into place.
+
+        Raises:
+            OSError: If the files couldn't be put in place. The destination is left unchanged if
+                this happens before the renames.
+        """
         dest_dir.mkdir(parents=True, exist_ok=True)
+        pending_dir = dest_dir.parent / f".{dest_dir.name}.pending"
+        shutil.rmtree(pending_dir, ignore_errors=True)
+        pending_dir.mkdir()
 
-        # Copy all files and directories
-        for item in source_dir.glob("*"):
-            dest_path = dest_dir / item.name
+        try:
+            methods = Counter(
+                link_or_copy(item, pending_dir / item.name) for item in source_dir.glob("*")
+            )
+            self.logger.debug("Committed to %s: %s", dest_dir, dict(methods))
 
-            if item.is_dir():
-                # Recursively copy directories
-                shutil.copytree(item, dest_path, dirs_exist_ok=True)
-            else:
-                # Copy files
-                shutil.copy2(item, dest_path)
+            # Only remove previous downloads once the whole set is in place alongside them
+            if tracks is None:
+                self.remove_previous_downloads(dest_dir)
+            for item in pending_dir.iterdir():
+                item.replace(dest_dir / item.name)
+            if tracks is not None and self.config.track_filter is None:
+                self.prune_stale_downloads(
+                    dest_dir, album_info, track_set.file_format, track_set.is_instrumental
+                )
+        finally:
+            shutil.rmtree(pending_dir, ignore_errors=True)
 
     @handle_interrupt()
     def _download_track_set(
         self,
         album_info: AlbumInfo,
-        output_folder: Path,
+        tracks: list[TrackMetadata],
+        journal: DownloadJournal,
         file_format: AudioFormat,
         is_instrumental: bool,
         display_folder: str,
     ) -> bool:
-        """Download a single complete set of tracks. Returns True if all downloads succeeded."""
-        output_folder.mkdir(parents=True, exist_ok=True)
+        """Download a single complete set of tracks into its staging folder.
 
-        # Choose cover art based on track type
-        cover_url = album_info.inst_art_url if is_instrumental else album_info.cover_art_url
-        cover_data = self.metadata.get_cover_art(cover_url)
-
-        spinner = Halo(spinner="dots")
-        total_tracks = len(album_info.tracks)
-        all_successful = True
+        Tracks already staged by an earlier run are skipped. Returns True if every track in the set
+        is staged, in which case the journal marks the set as complete.
+        """
+        fingerprints = {
+            self.get_track_filename(track, file_format, is_instrumental): journal.fingerprint(
+                album_info, track, self.get_file_url(track, file_format, is_instrumental)
+            )
+            for track in tracks
+        }
+        if staged := journal.prepare(fingerprints):
+            print_color(f"Resuming with {staged} tracks already downloaded.\n", "cyan")
+        if journal.state is SetState.COMPLETE:  # Only left to be put in place by an earlier run
+            return True
 
-        for index, track in enumerate(album_info.tracks, start=1):
-            track_number = f"{track.track_number:02d}"
-            track_name = track.track_name
+        pending = self._order_by_size(
+            [
+                track
+                for track in tracks
+                if not journal.is_staged(
+                    filename := self.get_track_filename(track, file_format, is_instrumental),
+                    fingerprints[filename],
+                )
+            ],
+            file_format,
+            is_instrumental,
+        )
 
-            if is_instrumental:
-                file_url = track.inst_url.rsplit(".", 1)[0] + f".{file_format.extension}"
-                if not track_name.endswith(" (Instrumental)"):
-                    track_name += " (Instrumental)"
-            else:
-                file_url = track.file_url.rsplit(".", 1)[0] + f".{file_format.extension}"
+        current_files = self._find_current_files(journal, pending, file_format, is_instrumental)
 
-            output_path = output_folder / f"{track_number} - {track_name}.{file_format.extension}"
+        # Choose cover art based on track type
+        cover_url = album_info.inst_art_url if is_instrumental else album_info.cover_art_url
+        cover_data = self.metadata.get_cover_art(cover_url) if pending else b""
 
-            spinner.text = color(f"Downloading {track_name}... ({index}/{total_tracks})", "cyan")
-            spinner.start()
+        total_tracks = len(tracks)
+        progress = DownloadProgress(len(pending))
+        all_successful = True
 
-            try:
-                # Add analytics headers to track downloads
-                headers = self.analytics.get_analytics_headers(
-                    track_name,
+        # Downloads wait for a slot from the controller, which decides how many run at once
+        executor = ThreadPoolExecutor(max_workers=self.concurrency.maximum)
+        try:
+            futures = {
+                executor.submit(
+                    self._download_track,
+                    track,
+                    album_info,
+                    journal,
                     file_format,
-                    TrackVersions.ORIGINAL if not is_instrumental else TrackVersions.INSTRUMENTAL,
-                )
-                response = requests.get(file_url, stream=True, timeout=30, headers=headers)
-                response.raise_for_status()
-                output_path.write_bytes(response.content)
-
-                spinner.text = color("Applying metadata...", "cyan")
-                success = self.metadata.apply_metadata(
-                    track, album_info, output_path, cover_data, is_instrumental
-                )
-
-                if not success:
-                    spinner.fail(color(f"Failed to add metadata to {track_name}.", "red"))
+                    is_instrumental,
+                    cover_data,
+                    progress,
+                    current_files.get(self.get_track_filename(track, file_format, is_instrumental)),
+                ): track
+                for track in pending
+            }
+            for future in as_completed(futures):
+                origin = future.result()
+                if origin is None:
                     all_successful = False
-                    continue
+                elif origin is not TrackOrigin.KEPT:  # Only count tracks that were fetched
+                    self.analytics.track_track_download(futures[future], file_format)
+        except KeyboardInterrupt:
+            # Stop in-flight transfers at the next chunk rather than waiting for them to finish
+            self._cancelled.set()
+            self.concurrency.drain()
+            executor.shutdown(wait=False, cancel_futures=True)
+            progress.close()
+            raise
+        executor.shutdown()
+        progress.close()
 
-                spinner.succeed(color(f"Downloaded {track_name}", "green"))
-                self.analytics.track_track_download(track, file_format)
+        limit_changes = self.concurrency.take_changes()
+        if self.report is not None:
+            self.report.record_set(
+                display_folder,
+                file_format,
+                total_tracks,
+                progress.transferred_bytes,
+                progress.elapsed,
+                all_successful,
+                self.concurrency.limit,
+                limit_changes,
+            )
 
-            except requests.RequestException:
-                spinner.fail(color(f"Failed to download {track_name}.", "red"))
-                all_successful = False
+        if not all_successful:
+            return False
 
-        spinner.stop()
+        # Measure before the set is marked complete, so an interrupted run measures it again
+        if self.config.replaygain and file_format is AudioFormat.FLAC:
+            self._add_replaygain(album_info, tracks, journal, is_instrumental)
 
+        journal.mark_complete()
         end_message = (
             f"All {total_tracks} {'instrumentals' if is_instrumental else 'remixes'} "
             f"downloaded in {file_format.display_name} to {display_folder}."
         )
         print_color(f"\n{end_message}", "green")
 
-        return all_successful
+        return True
+
+    def _add_replaygain(
+        self,
+        album_info: AlbumInfo,
+        tracks: list[TrackMetadata],
+        journal: DownloadJournal,
+        is_instrumental: bool,
+    ) -> None:
+        """Measure a staged FLAC set and add ReplayGain tags, if NumPy and `ffmpeg` are available.
+
+        This is optional, so tracks that can't be measured are still kept, just without the tags.
+        """
+        if not self.loudness.available:
+            self.logger.warning("ReplayGain needs NumPy and ffmpeg, so no tags will be added.")
+            return
+
+        print_color("\nMeasuring loudness...\n", "cyan")
+        jobs = [
+            (
+                track,
+                journal.folder / self.get_track_filename(track, AudioFormat.FLAC, is_instrumental),
+            )
+            for track in tracks
+        ]
+        cover_url = album_info.inst_art_url if is_instrumental else album_info.cover_art_url
+        cover_data = self.metadata.get_cover_art(cover_url)
+
+        with self.config.profiler.stage("loudness"):
+            include_album = len(tracks) == len(album_info.tracks)
+            if not self.loudness.analyze_set(
+                album_info, jobs, is_instrumental, cover_data, include_album
+            ):
+                print_color(
+                    "Some tracks couldn't be measured and have no ReplayGain tags.", "yellow"
+                )
+
+    def _order_by_size(
+        self, tracks: list[TrackMetadata], file_format: AudioFormat, is_instrumental: bool
+    ) -> list[TrackMetadata]:
+        """Order tracks to download so the largest start first and the smallest fill in last.
+
+        The worker pool takes tracks in the order they're submitted, so this keeps every worker
+        busy until close to the end rather than leaving one large file downloading on its own.
+        Sizes come from the disk space check, so they're only asked for if it didn't cover them.
+        """
+        if len(tracks) <= self.concurrency.limit:
+            return tracks
+
+        urls = [self.get_file_url(track, file_format, is_instrumental) for track in tracks]
+        sizes = self.space_checker.sizes
+        if missing := [url for url in urls if url not in sizes]:
+            sizes = {**sizes, **self.space_checker.get_sizes(missing)}
+        return order_longest_first(tracks, [sizes.get(url) for url in urls])
 
     @handle_interrupt()
-    def download_tracks_for_admin(self, album_info: AlbumInfo) -> None:
-        """Download all track versions to the custom OneDrive location."""
-        base_path = self.config.onedrive_folder
+    def download_tracks_for_admin(
+        self, album_info: AlbumInfo, tracks: list[TrackMetadata] | None = None
+    ) -> bool:
+        """Download all track versions to the custom OneDrive location.
+
+        Args:
+            album_info: The metadata for the album.
+            tracks: Only download these tracks, leaving the rest of the existing files in place.
+                Downloads the complete set if not specified.
+        """
+        track_sets = self.get_track_sets(album_info, self.config)
+        base_path = track_sets[0].folder.parent
         overall_success = True
 
+        if not self._check_space(album_info.tracks if tracks is None else tracks, track_sets):
+            return False
+
+        self.report = RunReport(self.config)
+
+        if self.config.derive_alac and self.converter.available:
+            # Download only FLAC and convert each set to ALAC locally
+            flac_sets = [t for t in track_sets if t.file_format is AudioFormat.FLAC]
+            alac_sets = [t for t in track_sets if t.file_format is AudioFormat.ALAC]
+            for flac_set, alac_set in zip(flac_sets, alac_sets, strict=True):
+                overall_success &= self._download_and_derive_set(
+                    album_info, flac_set, alac_set, tracks
+                )
+                print()
+            return self._finish_admin_download(base_path, overall_success)
+
+        if self.config.derive_alac:
+            self.logger.warning("No local ALAC encoder found, so ALAC files will be downloaded.")
+
         # Download all combinations, each as a separate operation
-        for file_format in AudioFormat:
-            # Original tracks
-            final_folder = base_path / file_format.display_name
-            success = self._download_and_move_set(
-                album_info, final_folder, file_format, is_instrumental=False
-            )
-            overall_success &= success
+        for track_set in track_sets:
+            overall_success &= self._download_and_move_set(album_info, track_set, tracks)
             print()
 
-            # Instrumental tracks
-            final_folder = base_path / f"Instrumentals {file_format.display_name}"
-            success = self._download_and_move_set(
-                album_info, final_folder, file_format, is_instrumental=True
-            )
-            overall_success &= success
-            print()
+        return self._finish_admin_download(base_path, overall_success)
+
+    def _finish_admin_download(self, base_path: Path, overall_success: bool) -> bool:
+        """Report the outcome of an admin download. Returns the overall success status."""
+        if self.report is not None:
+            self.report.finish(overall_success)
 
         if overall_success:
             print_color("All downloads completed successfully!", "green")
-            self.open_folder_in_os(base_path)
+            if self.config.open_when_done:
+                self.open_folder_in_os(base_path)
         else:
             print_color("Some downloads were not completed successfully.", "yellow")
 
+        return overall_success
+
+    def _download_track(
+        self,
+        track: TrackMetadata,
+        album_info: AlbumInfo,
+        journal: DownloadJournal,
+        file_format: AudioFormat,
+        is_instrumental: bool,
+        cover_data: bytes,
+        progress: DownloadProgress,
+        current_file: Path | None = None,
+    ) -> TrackOrigin | None:
+        """Download, tag, and verify a single track into the staging folder.
+
+        If the track's file at the destination already has the current audio, it's copied and
+        retagged rather than downloaded again. Each step is recorded in the journal as it
+        completes. Returns where the audio came from, or None if the track couldn't be staged.
+        """
+        with self.config.profiler.stage("tracks"):
+            track_name = self.get_display_name(track, is_instrumental)
+            file_url = self.get_file_url(track, file_format, is_instrumental)
+            output_path = journal.folder / self.get_track_filename(
+                track, file_format, is_instrumental
+            )
+            fingerprint = journal.fingerprint(album_info, track, file_url)
+
+            key = output_path.name
+            progress.start(key, track_name)
+
+            try:
+                source, origin = self._get_audio(
+                    track, file_format, is_instrumental, output_path, progress, current_file
+                )
+                if source is None:
+                    return None
+
+                # Files from the destination have been tagged, so they no longer match the hash
+                if current_file is None and not self._matches_tracklist(
+                    output_path, track, file_format, is_instrumental
+                ):
+                    progress.fail(
+                        key, f"Failed to verify {track_name}: it doesn't match the tracklist."
+                    )
+                    return None
+
+                # Hash new audio once here, so retagging it later only has to rewrite the tags
+                audio_sha256 = hash_audio(output_path) if current_file is None else None
+
+            except requests.RequestException:
+                progress.fail(key, f"Failed to download {track_name}.")
+                return None
+            except ValueError:
+                progress.fail(key, f"Failed to verify {track_name}: it isn't a valid audio file.")
+                return None
+            except OSError as e:
+                progress.fail(key, f"Failed to save {track_name}: {e.strerror}")
+                return None
+
+            progress.set_status(key, "Applying metadata to")
+            if error := self._tag_staged_track(
+                track,
+                album_info,
+                journal,
+                fingerprint,
+                output_path,
+                cover_data,
+                is_instrumental,
+                source,
+                audio_sha256,
+            ):
+                progress.fail(key, error)
+                return None
+
+            progress.succeed(key, f"{origin.value} {track_name}")
+            return origin
+
+    def _tag_staged_track(
+        self,
+        track: TrackMetadata,
+        album_info: AlbumInfo,
+        journal: DownloadJournal,
+        fingerprint: str,
+        output_path: Path,
+        cover_data: bytes,
+        is_instrumental: bool,
+        source: RemoteFile | None,
+        audio_sha256: str | None = None,
+    ) -> str | None:
+        """Tag a track in the staging folder and read the tags back, recording each step.
+
+        Returns why the track couldn't be staged, or None if it was.
+        """
+        track_name = self.get_display_name(track, is_instrumental)
+        key = output_path.name
+
+        success = self.metadata.apply_metadata(
+            track,
+            album_info,
+            output_path,
+            cover_data,
+            is_instrumental,
+            source,
+            audio_sha256=audio_sha256,
+        )
+        if not success:
+            return f"Failed to add metadata to {track_name}."
+        journal.record(key, fingerprint, TrackState.TAGGED)
+
+        # Read the tags back to make sure the file is intact before counting it as done
+        tags = self.metadata.read_tags(output_path)
+        expected = self.metadata.get_expected_tags(track, album_info, is_instrumental)
+        if tags is None or any(tags.get(name) != value for name, value in expected.items()):
+            return f"Failed to verify {track_name}."
+        journal.record(key, fingerprint, TrackState.VERIFIED)
+        journal.record(key, fingerprint, TrackState.STAGED)
+        return None
+
+    def _get_audio(
+        self,
+        track: TrackMetadata,
+        file_format: AudioFormat,
+        is_instrumental: bool,
+        output_path: Path,
+        progress: DownloadProgress,
+        current_file: Path | None,
+    ) -> tuple[RemoteFile | None, TrackOrigin]:
+        """Put a track's audio in the output path, from the destination, the cache, or the server.
+
+        Returns the details of the source (or None if cancelled) and where the file came from.
+
+        Raises:
+            requests.RequestException: If the download fails.
+            OSError: If the file can't be written.
+        """
+        if current_file is not None:
+            link_or_copy(current_file, output_path, allow_hardlink=False)
+            return self.metadata.read_source(current_file), TrackOrigin.KEPT
+
+        # Add analytics headers to track downloads
+        file_url = self.get_file_url(track, file_format, is_instrumental)
+        headers = self.analytics.get_analytics_headers(
+            self.get_display_name(track, is_instrumental),
+            file_format,
+            TrackVersions.ORIGINAL if not is_instrumental else TrackVersions.INSTRUMENTAL,
+        )
+
+        def download(path: Path) -> RemoteFile | None:
+            return self._fetch_file(file_url, path, headers, output_path.name, progress)
+
+        if self.config.cache is not None:
+            source, cached = self.config.cache.fetch(file_url, output_path, download)
+            return source, TrackOrigin.COPIED if cached else TrackOrigin.DOWNLOADED
+        return download(output_path), TrackOrigin.DOWNLOADED
+
+    def _find_current_files(
+        self,
+        journal: DownloadJournal,
+        tracks: list[TrackMetadata],
+        file_format: AudioFormat,
+        is_instrumental: bool,
+        source_format: AudioFormat | None = None,
+    ) -> dict[str, Path]:
+        """Find the files at the destination that already have the current audio, by filename.
+
+        This is the same check `--plan` uses to count files as kept or retagged rather than
+        downloaded, so a sync only downloads what the plan says it will. Files derived from
+        another format (like ALAC converted from FLAC) are checked against the source format.
+        """
+        candidates: dict[str, tuple[Path, dict[str, str], str]] = {}
+        for track in tracks:
+            filename = self.get_track_filename(track, file_format, is_instrumental)
+            path = journal.final_folder / filename
+            tags = self.metadata.read_tags(path) if path.is_file() else None
+            if tags and tags.get("source_url"):
+                url = self.get_file_url(track, source_format or file_format, is_instrumental)
+                candidates[filename] = (path, tags, url)
+        if not candidates:
+            return {}
+
+        remote_files = head_files(
+            [url for _, _, url in candidates.values()],
+            self.config.session,
+            self.config.known_files,
+        )
+        return {
+            filename: path
+            for filename, (path, tags, url) in candidates.items()
+            if SyncPlanner.is_audio_current(tags, url, remote_files.get(url))
+        }
+
+    @staticmethod
+    def _matches_tracklist(
+        path: Path, track: TrackMetadata, file_format: AudioFormat, is_instrumental: bool
+    ) -> bool:
+        """Check a downloaded file against the size and hash the tracklist lists, if it does."""
+        expected = track.get_source(file_format, is_instrumental)
+        if expected is None:
+            return True
+        return path.stat().st_size == expected.size and hash_file(path) == expected.sha256
+
+    def _fetch_file(
+        self,
+        file_url: str,
+        output_path: Path,
+        headers: dict[str, str],
+        key: str,
+        progress: DownloadProgress,
+    ) -> RemoteFile | None:
+        """Download a file to the given path. Returns its details, or None if cancelled.
+
+        The transfer holds a slot from the concurrency controller. If it times out or the server
+        asks for fewer requests, the controller backs off and the download is tried again.
+
+        Raises:
+            requests.RequestException: If the download fails.
+            OSError: If the file can't be written.
+        """
+        attempt = 1
+        while True:
+            try:
+                with self.concurrency.slot():
+                    if self._cancelled.is_set():
+                        return None
+                    return self._transfer_file(file_url, output_path, headers, key, progress)
+            except requests.RequestException as e:
+                reason = get_congestion_reason(e)
+                if reason is None or attempt >= self.MAX_ATTEMPTS:
+                    raise
+                self.concurrency.back_off(reason)
+                self.logger.debug("Retrying %s after %s.", file_url, reason)
+
+            progress.set_status(key, "Waiting to retry")
+            time.sleep(self.RETRY_DELAY * attempt)
+            progress.restart(key)
+            attempt += 1
+
+    def _transfer_file(
+        self,
+        file_url: str,
+        output_path: Path,
+        headers: dict[str, str],
+        key: str,
+        progress: DownloadProgress,
+    ) -> RemoteFile | None:
+        """Stream a file to the given path. Returns its details, or None if cancelled.
+
+        Raises:
+            requests.RequestException: If the download fails.
+            OSError: If the file can't be written.
+        """
+        with self.config.session.get(
+            file_url, stream=True, timeout=30, headers=headers
+        ) as response:
+            response.raise_for_status()
+            source = RemoteFile.from_headers(file_url, response.headers)
+            progress.set_total(key, source.size)
+
+            with output_path.open("wb") as f:
+                if source.size:
+                    preallocate(f.fileno(), source.size)
+                if not self._write_body(response, f, key, progress):
+                    return None
+
+                # Drop any preallocated space we didn't end up using
+                f.truncate()
+
+        return source
+
+    def _write_body(
+        self, response: requests.Response, f: BinaryIO, key: str, progress: DownloadProgress
+    ) -> bool:
+        """Stream a response body to a file. Returns False if the download was cancelled.
+
+        Each chunk is reserved from the shared memory budget before it's read, so downloads wait
+        for room rather than buffering more than the budget allows.
+        """
+        chunks = response.iter_content(chunk_size=self.CHUNK_SIZE)
+        while not self._cancelled.is_set():
+            with self.config.memory.reserve(self.CHUNK_SIZE):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return True
+                f.write(chunk)
+            progress.advance(key, len(chunk))
+            self.concurrency.record(len(chunk))
+        return False
+
+    def get_album_folder_name(self, album_info: AlbumInfo) -> str:
+        """Get the album name sanitized for use as a folder name."""
+        valid_chars = f"-_.() {string.ascii_letters}{string.digits}"
+        return "".join(c for c in album_info.album_name if c in valid_chars)
+
+    def get_display_name(self, track: TrackMetadata, is_instrumental: bool) -> str:
+        """Get the track name as displayed, with the instrumental suffix if needed."""
+        track_name = track.track_name
+        if is_instrumental and not track_name.endswith(" (Instrumental)"):
+            track_name += " (Instrumental)"
+        return track_name
+
+    def get_file_url(
+        self, track: TrackMetadata, file_format: AudioFormat, is_instrumental: bool
+    ) -> str:
+        """Get the download URL for a track in the given format."""
+        return track.get_file_url(file_format, is_instrumental)
+
+    def get_track_filename(
+        self, track: TrackMetadata, file_format: AudioFormat, is_instrumental: bool
+    ) -> str:
+        """Get the final filename for a track, in the form of `NN - Title.ext`."""
+        track_name = self.get_display_name(track, is_instrumental)
+        return f"{track.track_number:02d} - {track_name}.{file_format.extension}"
+
+    def prune_stale_downloads(
+        self,
+        output_folder: Path,
+        album_info: AlbumInfo,
+        file_format: AudioFormat,
+        is_instrumental: bool,
+    ) -> None:
+        """Remove files in the output folder that are no longer part of the album.
+
+        Only looks at the top level of the folder, so nested sets (like the instrumentals inside the
+        originals folder) are left alone.
+        """
+        if not output_folder.exists():
+            return
+
+        expected = {
+            self.get_track_filename(track, file_format, is_instrumental)
+            for track in album_info.tracks
+        }
+        for file_path in output_folder.glob("*"):
+            if file_path.suffix.lower() not in {".flac", ".m4a"} or file_path.name in expected:
+                continue
+            try:
+                file_path.unlink()
+            except Exception as e:
+                self.logger.error("Failed to delete %s: %s", file_path, str(e))
+
     def remove_previous_downloads(self, output_folder: str | Path) -> None:
         """Remove any existing files with the specified file extension in the output folder."""
         output_folder = Path(output_folder)
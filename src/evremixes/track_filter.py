@@ -0,0 +1,85 @@
+"""Choose a subset of the tracks in an album to sync."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date
+from fnmatch import fnmatchcase
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from evremixes.types import TrackMetadata
+
+
+@dataclass(slots=True)
+class TrackFilter:
+    """Criteria for which tracks to sync. A track has to match every criterion that's set.
+
+    Title patterns use shell-style wildcards and ignore case. A pattern without wildcards matches
+    anywhere in the title. Tracks whose start date can't be read never match a date range.
+    """
+
+    since: date | None = None
+    until: date | None = None
+    track_numbers: set[int] = field(default_factory=set)
+    title_patterns: list[str] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether no criteria are set, so every track matches."""
+        return (
+            self.since is None
+            and self.until is None
+            and not self.track_numbers
+            and not self.title_patterns
+        )
+
+    def apply(self, tracks: list[TrackMetadata]) -> list[TrackMetadata]:
+        """Get the tracks that match the filter, in their original order."""
+        return [track for track in tracks if self.matches(track)]
+
+    def matches(self, track: TrackMetadata) -> bool:
+        """Check whether a track matches the filter."""
+        if self.track_numbers and track.track_number not in self.track_numbers:
+            return False
+
+        if self.title_patterns and not any(
+            self._matches_title(track.track_name, pattern) for pattern in self.title_patterns
+        ):
+            return False
+
+        if self.since is not None or self.until is not None:
+            try:
+                start_date = date.fromisoformat(track.start_date)
+            except ValueError:
+                return False
+            if self.since is not None and start_date < self.since:
+                return False
+            if self.until is not None and start_date > self.until:
+                return False
+
+        return True
+
+    @staticmethod
+    def parse_track_numbers(value: str) -> set[int]:
+        """Parse a list of track numbers and ranges, like `1-3,7`.
+
+        Raises:
+            ValueError: If the list isn't valid.
+        """
+        numbers: set[int] = set()
+        for part in value.split(","):
+            start, dash, end = part.strip().partition("-")
+            first = int(start)
+            last = int(end) if dash else first
+            if first < 1 or last < first:
+                msg = f"Invalid track range: {part.strip()}"
+                raise ValueError(msg)
+            numbers.update(range(first, last + 1))
+        return numbers
+
+    @staticmethod
+    def _matches_title(title: str, pattern: str) -> bool:
+        if not any(char in pattern for char in "*?["):
+            pattern = f"*{pattern}*"
+        return fnmatchcase(title.casefold(), pattern.casefold())
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import StrEnum
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+    from pathlib import Path
 
 
 class AudioFormat(StrEnum):
@@ -45,7 +49,67 @@ class DownloadLocation(StrEnum):
     CUSTOM = "Custom path"
 
 
-@dataclass
+@dataclass(slots=True)
+class TrackSet:
+    """A set of tracks to download in one format, and the folders it goes in."""
+
+    folder: Path
+    file_format: AudioFormat
+    is_instrumental: bool
+
+    # Additional folders that get their own copy of the set
+    mirrors: list[Path] = field(default_factory=list)
+
+    @property
+    def destinations(self) -> list[Path]:
+        """Every folder the set goes in, starting with the main one."""
+        return [self.folder, *self.mirrors]
+
+
+@dataclass(slots=True)
+class RemoteFile:
+    """Size and validators for a file on the server, as reported in its response headers."""
+
+    url: str
+    size: int | None = None
+    etag: str | None = None
+    last_modified: str | None = None
+
+    @classmethod
+    def from_headers(cls, url: str, headers: Mapping[str, str]) -> RemoteFile:
+        """Create a RemoteFile from the headers of a HEAD or GET response."""
+        content_length = headers.get("Content-Length")
+        return cls(
+            url=url,
+            size=int(content_length) if content_length else None,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+        )
+
+
+@dataclass(slots=True)
+class SourceFile:
+    """Size, hash, and ETag of a track's file on the server, as listed in the tracklist."""
+
+    size: int
+    sha256: str
+    etag: str | None = None
+
+    @staticmethod
+    def key(file_format: AudioFormat, is_instrumental: bool) -> str:
+        """Get the name a track's file in the given format is listed under, like `flac_inst`."""
+        return f"{file_format.extension}_inst" if is_instrumental else file_format.extension
+
+
+@dataclass(slots=True)
+class CatalogEntry:
+    """An album listed in the catalog, with the URL of its tracklist."""
+
+    album_name: str
+    manifest_url: str
+
+
+@dataclass(slots=True)
 class AlbumInfo:
     """Full metadata for an album (track set)."""
 
@@ -58,8 +122,20 @@ class AlbumInfo:
     inst_art_url: str
     tracks: list[TrackMetadata]
 
+    def get_remote_files(self) -> dict[str, RemoteFile]:
+        """Get the details the tracklist lists for each track file, by URL."""
+        remote_files: dict[str, RemoteFile] = {}
+        for track in self.tracks:
+            for is_instrumental in (False, True):
+                for file_format in AudioFormat:
+                    source = track.get_source(file_format, is_instrumental)
+                    if source is not None:
+                        url = track.get_file_url(file_format, is_instrumental)
+                        remote_files[url] = RemoteFile(url=url, size=source.size, etag=source.etag)
+        return remote_files
+
 
-@dataclass
+@dataclass(slots=True)
 class TrackMetadata:
     """Metadata for a single track."""
 
@@ -68,3 +144,15 @@ class TrackMetadata:
     inst_url: str
     start_date: str
     track_number: int
+
+    # Details of each file by `SourceFile.key`, if the tracklist was generated with them
+    sources: dict[str, SourceFile] = field(default_factory=dict)
+
+    def get_file_url(self, file_format: AudioFormat, is_instrumental: bool) -> str:
+        """Get the download URL for the track in the given format."""
+        base_url = self.inst_url if is_instrumental else self.file_url
+        return base_url.rsplit(".", 1)[0] + f".{file_format.extension}"
+
+    def get_source(self, file_format: AudioFormat, is_instrumental: bool) -> SourceFile | None:
+        """Get the listed details of the track's file in the given format, if there are any."""
+        return self.sources.get(SourceFile.key(file_format, is_instrumental))
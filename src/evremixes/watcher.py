@@ -0,0 +1,245 @@
+"""Watch the tracklist for changes and sync new or updated tracks as they're released."""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import time
+from typing import TYPE_CHECKING, Any
+
+import requests
+from polykit.cli import handle_interrupt
+from polykit.log import PolyLog
+from polykit.text import print_color
+
+from evremixes.metadata_helper import MetadataHelper
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from logging import Logger
+
+    from evremixes.config import DownloadConfig
+    from evremixes.types import AlbumInfo, TrackMetadata
+
+
+class ManifestWatcher:
+    """Poll the tracklist with conditional requests and sync only what changed.
+
+    The ETag and Last-Modified validators from the last successful sync are kept in the state
+    directory along with the manifest they belong to, so an unchanged tracklist costs a single 304
+    per poll and no audio is transferred until something actually changes.
+    """
+
+    def __init__(
+        self,
+        config: DownloadConfig,
+        sync: Callable[[AlbumInfo, list[TrackMetadata] | None], bool],
+        manifest_url: str,
+        on_update_command: str | None = None,
+        on_update_webhook: str | None = None,
+    ) -> None:
+        """Initialize the ManifestWatcher class.
+
+        Args:
+            config: The download configuration.
+            sync: Callback to download the given tracks (or all tracks if None) for an album.
+                Returns True if all downloads succeeded.
+            manifest_url: The URL of the album tracklist to watch.
+            on_update_command: Command to run after an update has been synced.
+            on_update_webhook: URL to POST a JSON summary to after an update has been synced.
+        """
+        self.config = config
+        self.sync = sync
+        self.manifest_url = manifest_url
+        self.on_update_command = on_update_command
+        self.on_update_webhook = on_update_webhook
+        self.logger: Logger = PolyLog.get_logger()
+
+        url_hash = hashlib.sha256(manifest_url.encode()).hexdigest()[:12]
+        self.state_file = config.paths.from_state(f"watch-{url_hash}.json")
+        self.state = self._load_state()
+
+        # Poll the URL we were redirected to last time to avoid paying for the redirect every time
+        self.poll_url: str = self.state.get("poll_url") or manifest_url
+
+    @classmethod
+    @handle_interrupt()
+    def run(cls, watchers: list[ManifestWatcher], interval: int) -> None:
+        """Check each watcher for updates every `interval` seconds until interrupted."""
+        print_color(f"Watching for new releases every {interval} seconds...\n", "cyan")
+        while True:
+            for watcher in watchers:
+                watcher.check_for_updates()
+            time.sleep(interval)
+
+    def check_for_updates(self) -> bool:
+        """Check the tracklist once and sync anything that changed. Returns True if up to date.
+
+        Failures are logged rather than raised, so one bad poll doesn't stop the watcher.
+        """
+        try:
+            response = self._fetch_tracklist()
+        except requests.RequestException as e:
+            self.logger.warning("Failed to check tracklist: %s", str(e))
+            self.poll_url = self.manifest_url
+            return False
+
+        if response is None:
+            self.logger.debug("Tracklist not modified.")
+            return True
+
+        try:
+            track_data = json.loads(response.content)
+            current = MetadataHelper.parse_metadata(track_data, base_url=self.manifest_url)
+            previous = (
+                MetadataHelper.parse_metadata(self.state["manifest"], base_url=self.manifest_url)
+                if self.state.get("manifest")
+                else None
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            self.logger.warning("Failed to read tracklist: %s", str(e))
+            return False
+
+        try:
+            return self._sync_update(response, track_data, previous, current)
+        except (OSError, ValueError) as e:
+            self.logger.error("Failed to sync update: %s", str(e))
+        except SystemExit as e:
+            # Failed fetches exit with the error, but one with a status (as after Ctrl-C) is real
+            if e.code is None or isinstance(e.code, int):
+                raise
+            self.logger.error("Failed to sync update: %s", e.code)
+        return False
+
+    def _sync_update(
+        self,
+        response: requests.Response,
+        track_data: dict[str, Any],
+        previous: AlbumInfo | None,
+        current: AlbumInfo,
+    ) -> bool:
+        """Sync the tracks that changed since the last sync. Returns True if successful.
+
+        Raises:
+            OSError: If the files or the state can't be written.
+            ValueError: If the cover art can't be fetched.
+            SystemExit: If a download fails in a way that would end a normal run.
+        """
+        # Files whose audio changed under the same URL are only caught with the current details
+        self.config.update_known_files(current)
+        changed, removed = self.diff_tracks(previous, current)
+
+        if previous is not None and not changed and not removed:
+            self.logger.debug("Tracklist changed but no tracks were affected.")
+            self._save_state(response, track_data)
+            return True
+
+        success = self.sync(current, None if previous is None else changed)
+        if success:
+            self._save_state(response, track_data)
+
+        self._run_hooks(current, changed, removed, success)
+        return success
+
+    @staticmethod
+    def diff_tracks(
+        previous: AlbumInfo | None, current: AlbumInfo
+    ) -> tuple[list[TrackMetadata], list[TrackMetadata]]:
+        """Compare two versions of the album. Returns the added or changed and the removed tracks.
+
+        Changes to the album-level metadata (name, year, art, etc.) affect the tags on every track,
+        so they mark all of the current tracks as changed.
+        """
+        if previous is None:
+            return list(current.tracks), []
+
+        if dataclasses.replace(previous, tracks=[]) != dataclasses.replace(current, tracks=[]):
+            return list(current.tracks), []
+
+        previous_tracks = {track.track_number: track for track in previous.tracks}
+        current_tracks = {track.track_number: track for track in current.tracks}
+
+        changed = [
+            track
+            for number, track in current_tracks.items()
+            if previous_tracks.get(number) != track
+        ]
+        removed = [
+            track for number, track in previous_tracks.items() if number not in current_tracks
+        ]
+        return changed, removed
+
+    def _fetch_tracklist(self) -> requests.Response | None:
+        """Fetch the tracklist if it has changed since the last sync. Returns None if it hasn't."""
+        headers = {}
+        if etag := self.state.get("etag"):
+            headers["If-None-Match"] = etag
+        if last_modified := self.state.get("last_modified"):
+            headers["If-Modified-Since"] = last_modified
+
+        response = requests.get(self.poll_url, headers=headers, timeout=10)
+        if response.status_code == 304:
+            return None
+
+        response.raise_for_status()
+        self.poll_url = response.url
+        return response
+
+    def _run_hooks(
+        self,
+        album_info: AlbumInfo,
+        changed: list[TrackMetadata],
+        removed: list[TrackMetadata],
+        success: bool,
+    ) -> None:
+        """Notify the configured command and webhook that an update was synced."""
+        summary: dict[str, Any] = {
+            "album": album_info.album_name,
+            "updated": [track.track_name for track in changed],
+            "removed": [track.track_name for track in removed],
+            "success": success,
+        }
+
+        if self.on_update_command:
+            env = {
+                **os.environ,
+                "EVREMIXES_UPDATED": "\n".join(summary["updated"]),
+                "EVREMIXES_REMOVED": "\n".join(summary["removed"]),
+                "EVREMIXES_SUCCESS": "1" if success else "0",
+            }
+            try:
+                subprocess.run(shlex.split(self.on_update_command), env=env, check=False)
+            except OSError as e:
+                self.logger.error("Failed to run update command: %s", str(e))
+
+        if self.on_update_webhook:
+            try:
+                requests.post(self.on_update_webhook, json=summary, timeout=10)
+            except requests.RequestException as e:
+                self.logger.error("Failed to send update webhook: %s", str(e))
+
+    def _load_state(self) -> dict[str, Any]:
+        """Load the validators and manifest from the last successful sync."""
+        try:
+            with self.state_file.open() as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, response: requests.Response, track_data: dict[str, Any]) -> None:
+        """Save the validators and manifest after a successful sync."""
+        self.state = {
+            "poll_url": self.poll_url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "manifest": track_data,
+        }
+        # Write it alongside and swap it in, so a run killed partway through keeps the old state
+        temp_path = self.state_file.with_suffix(".tmp")
+        with temp_path.open("w") as f:
+            json.dump(self.state, f, indent=2)
+        temp_path.replace(self.state_file)
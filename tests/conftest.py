@@ -0,0 +1,62 @@
+"""Shared fixtures for the tests."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from evremixes.config import DownloadConfig
+from evremixes.types import AlbumInfo, TrackMetadata
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+class TempStatePaths:
+    """Stand-in for PolyPath that keeps the state directory in a temporary folder."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def from_state(self, *parts: str, no_create: bool = False) -> Path:
+        """Get a path in the state directory, creating its parent unless told not to."""
+        path = self.root.joinpath("state", *parts)
+        if not no_create:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> DownloadConfig:
+    """A download configuration with its state directory in a temporary folder."""
+    config = DownloadConfig(is_admin=False)
+    config.paths = TempStatePaths(tmp_path)  # type: ignore[assignment]
+    return config
+
+
+def make_track(
+    number: int, name: str | None = None, start_date: str = "2024-01-01"
+) -> TrackMetadata:
+    """Make a track with URLs based on its number."""
+    return TrackMetadata(
+        track_name=name or f"Track {number}",
+        file_url=f"https://example.com/{number:02d}.flac",
+        inst_url=f"https://example.com/{number:02d} (Instrumental).flac",
+        start_date=start_date,
+        track_number=number,
+    )
+
+
+def make_album(tracks: list[TrackMetadata], album_name: str = "Album") -> AlbumInfo:
+    """Make an album with the given tracks."""
+    return AlbumInfo(
+        album_name=album_name,
+        album_artist="Danny Stewart",
+        artist_name="Evanescence",
+        genre="Electronic",
+        year=2024,
+        cover_art_url="https://example.com/cover.jpg",
+        inst_art_url="https://example.com/cover-inst.jpg",
+        tracks=tracks,
+    )
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import struct
+from typing import TYPE_CHECKING
+
+import pytest
+
+from evremixes.audio_payload import get_audio_size, hash_audio, hash_file
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+AUDIO = bytes(range(256)) * 64
+
+
+def flac_block(block_type: int, data: bytes, is_last: bool = False) -> bytes:
+    return bytes([block_type | (0x80 if is_last else 0)]) + len(data).to_bytes(3, "big") + data
+
+
+def mp4_atom(atom_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(data), atom_type) + data
+
+
+def test_flac_hash_ignores_metadata_blocks(tmp_path: Path) -> None:
+    plain = tmp_path / "plain.flac"
+    plain.write_bytes(b"fLaC" + flac_block(0, bytes(34), is_last=True) + AUDIO)
+
+    tagged = tmp_path / "tagged.flac"
+    tagged.write_bytes(
+        b"fLaC"
+        + flac_block(0, bytes(34))
+        + flac_block(4, b"vorbis comments")
+        + flac_block(1, bytes(1000), is_last=True)
+        + AUDIO
+    )
+
+    assert hash_audio(plain) == hash_audio(tagged)
+    assert hash_file(plain) != hash_file(tagged)
+    assert get_audio_size(tagged) == len(AUDIO)
+
+
+def test_flac_with_id3_tag_is_read_past_it(tmp_path: Path) -> None:
+    id3 = b"ID3\x04\x00\x00" + bytes([0, 0, 0, 20]) + bytes(20)
+    path = tmp_path / "id3.flac"
+    path.write_bytes(id3 + b"fLaC" + flac_block(0, bytes(34), is_last=True) + AUDIO)
+
+    assert get_audio_size(path) == len(AUDIO)
+
+
+def test_mp4_audio_is_every_top_level_mdat(tmp_path: Path) -> None:
+    path = tmp_path / "track.m4a"
+    path.write_bytes(
+        mp4_atom(b"ftyp", b"M4A \x00\x00\x00\x00")
+        + mp4_atom(b"mdat", AUDIO[:100])
+        + mp4_atom(b"moov", bytes(50))
+        + mp4_atom(b"mdat", AUDIO[100:])
+    )
+
+    assert get_audio_size(path) == len(AUDIO)
+
+
+@pytest.mark.parametrize(
+    ("name", "content"),
+    [
+        ("bad.flac", b"OggS" + bytes(100)),
+        ("truncated.flac", b"fLaC" + flac_block(0, bytes(34))),
+        ("empty.flac", b"fLaC" + flac_block(0, bytes(34), is_last=True)),
+        ("bad.m4a", struct.pack(">I4s", 500, b"mdat") + bytes(10)),
+        ("track.mp3", AUDIO),
+    ],
+)
+def test_invalid_files_raise_value_error(tmp_path: Path, name: str, content: bytes) -> None:
+    path = tmp_path / name
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        hash_audio(path)
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+from evremixes import concurrency_controller
+from evremixes.concurrency_controller import ConcurrencyController, get_congestion_reason
+
+MB = 1024 * 1024
+
+
+class FakeClock:
+    """Stands in for the time module, only moving forward when told to."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(concurrency_controller, "time", clock)
+    return clock
+
+
+class Queue:
+    """Downloads queued for slots, which hold them until the queue is closed."""
+
+    def __init__(self, controller: ConcurrencyController, size: int) -> None:
+        self.controller = controller
+        self.done = threading.Event()
+        self.threads = [threading.Thread(target=self._download) for _ in range(size)]
+        for thread in self.threads:
+            thread.start()
+        self.wait_for_slots()
+
+    def wait_for_slots(self) -> None:
+        """Wait until the queued downloads have taken every free slot."""
+        while self.controller.active < self.controller.limit:
+            self.done.wait(0.001)
+
+    def close(self) -> None:
+        self.done.set()
+        self.controller.drain()
+        for thread in self.threads:
+            thread.join(5)
+
+    def _download(self) -> None:
+        with self.controller.slot():
+            self.done.wait(5)
+
+
+def sample(controller: ConcurrencyController, clock: FakeClock, throughput: float) -> None:
+    """Feed the controller one sample's worth of downloads at the given throughput."""
+    clock.now += controller.SAMPLE_SECONDS
+    controller.record(int(throughput * controller.SAMPLE_SECONDS))
+
+
+def reasons(controller: ConcurrencyController) -> list[tuple[int, str]]:
+    return [(change.limit, change.reason) for change in controller.take_changes()]
+
+
+def test_limit_rises_while_connections_help_and_gives_back_one_that_doesnt(
+    clock: FakeClock,
+) -> None:
+    controller = ConcurrencyController(initial=2, maximum=8)
+    queue = Queue(controller, 10)
+    try:
+        sample(controller, clock, 10 * MB)  # Baseline
+        sample(controller, clock, 10 * MB)
+        queue.wait_for_slots()
+        sample(controller, clock, 12 * MB)
+        queue.wait_for_slots()
+        sample(controller, clock, 12 * MB)
+    finally:
+        queue.close()
+
+    assert reasons(controller) == [
+        (3, "probing"),
+        (4, "throughput rising"),
+        (3, "no gain from last increase"),
+    ]
+
+
+def test_falling_throughput_cuts_the_limit(clock: FakeClock) -> None:
+    controller = ConcurrencyController(initial=4)
+    queue = Queue(controller, 4)
+    try:
+        sample(controller, clock, 10 * MB)
+        sample(controller, clock, 5 * MB)
+    finally:
+        queue.close()
+
+    assert reasons(controller) == [(3, "throughput falling")]
+
+
+def test_limit_is_left_alone_when_slots_are_free(clock: FakeClock) -> None:
+    controller = ConcurrencyController(initial=4)
+    with controller.slot():
+        for throughput in [10 * MB, 10 * MB, 2 * MB, 10 * MB]:
+            sample(controller, clock, throughput)
+
+    assert controller.limit == 4
+    assert reasons(controller) == []
+
+
+def test_back_off_halves_the_limit_once_per_sample(clock: FakeClock) -> None:
+    controller = ConcurrencyController(initial=8)
+    controller.back_off("HTTP 429")
+    controller.back_off("HTTP 429")
+    clock.now += controller.SAMPLE_SECONDS
+    controller.back_off("timeout")
+    clock.now += controller.SAMPLE_SECONDS
+    controller.back_off("timeout")
+    clock.now += controller.SAMPLE_SECONDS
+    controller.back_off("timeout")
+
+    assert reasons(controller) == [(4, "HTTP 429"), (2, "timeout"), (1, "timeout")]
+
+
+def test_fixed_limit_never_changes(clock: FakeClock) -> None:
+    controller = ConcurrencyController(initial=3, minimum=3, maximum=3)
+    queue = Queue(controller, 5)
+    try:
+        for throughput in [10 * MB, 10 * MB, 20 * MB, 2 * MB]:
+            sample(controller, clock, throughput)
+    finally:
+        queue.close()
+    controller.back_off("timeout")
+
+    assert controller.limit == 3
+    assert reasons(controller) == []
+
+
+def test_slots_are_limited_and_handed_out_in_order() -> None:
+    controller = ConcurrencyController(initial=1, minimum=1, maximum=1)
+    started: list[int] = []
+    release = threading.Event()
+
+    def download(number: int) -> None:
+        with controller.slot():
+            started.append(number)
+            release.wait(5)
+
+    threads = []
+    for number in range(3):
+        thread = threading.Thread(target=download, args=(number,))
+        thread.start()
+        threads.append(thread)
+        while controller._next_ticket <= number:  # Wait until it's queued before the next one
+            threading.Event().wait(0.001)
+
+    assert started == [0]
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert started == [0, 1, 2]
+    assert controller.active == 0
+
+
+def test_drain_lets_every_waiting_download_through() -> None:
+    controller = ConcurrencyController(initial=1, minimum=1, maximum=1)
+    entered = threading.Event()
+
+    def download() -> None:
+        with controller.slot():
+            entered.set()
+
+    with controller.slot():
+        thread = threading.Thread(target=download)
+        thread.start()
+        assert not entered.wait(0.1)
+        controller.drain()
+        assert entered.wait(5)
+    thread.join(5)
+
+
+def http_error(status: int) -> requests.HTTPError:
+    return requests.HTTPError(response=SimpleNamespace(status_code=status))  # type: ignore[arg-type]
+
+
+@pytest.mark.parametrize(
+    ("error", "expected"),
+    [
+        (requests.ReadTimeout(), "timeout"),
+        (requests.ConnectionError(ReadTimeoutError(None, "url", "read timed out")), "timeout"),  # type: ignore[arg-type]
+        (http_error(429), "HTTP 429"),
+        (http_error(503), "HTTP 503"),
+        (http_error(404), None),
+        (requests.ConnectionError("connection refused"), None),
+    ],
+)
+def test_congestion_reason(error: requests.RequestException, expected: str | None) -> None:
+    assert get_congestion_reason(error) == expected
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING
+
+import pytest
+
+from evremixes import download_cache
+from evremixes.download_cache import DownloadCache
+from evremixes.types import RemoteFile
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+URL = "https://example.com/01.flac"
+
+pytestmark = pytest.mark.skipif(not DownloadCache.is_supported(), reason="needs file locking")
+
+
+@pytest.fixture
+def cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> DownloadCache:
+    remote = RemoteFile(URL, size=5, etag='"abc"')
+    monkeypatch.setattr(download_cache, "head_file", lambda url, session: remote)
+    return DownloadCache(tmp_path / "cache")
+
+
+def test_key_changes_with_the_version_of_the_file() -> None:
+    key = DownloadCache._get_key(URL, RemoteFile(URL, etag='"abc"'))
+    assert key is not None
+    assert key != DownloadCache._get_key(URL, RemoteFile(URL, etag='"def"'))
+    assert key != DownloadCache._get_key(
+        "https://example.com/02.flac", RemoteFile(URL, etag='"abc"')
+    )
+
+
+def test_file_without_validators_has_no_key() -> None:
+    assert DownloadCache._get_key(URL, RemoteFile(URL, size=5)) is None
+    assert DownloadCache._get_key(URL, RemoteFile(URL, size=5, last_modified="today")) is not None
+
+
+def test_second_fetch_comes_from_the_cache(cache: DownloadCache, tmp_path: Path) -> None:
+    downloads: list[Path] = []
+
+    def download(path: Path) -> RemoteFile:
+        downloads.append(path)
+        path.write_bytes(b"audio")
+        return RemoteFile(URL, size=5, etag='"abc"')
+
+    first, first_cached = cache.fetch(URL, tmp_path / "first.flac", download)
+    second, second_cached = cache.fetch(URL, tmp_path / "second.flac", download)
+
+    assert len(downloads) == 1
+    assert (first_cached, second_cached) == (False, True)
+    assert first == second
+    assert (tmp_path / "second.flac").read_bytes() == b"audio"
+
+
+def test_file_changed_during_download_is_not_cached(cache: DownloadCache, tmp_path: Path) -> None:
+    def download(path: Path) -> RemoteFile:
+        path.write_bytes(b"newer")
+        return RemoteFile(URL, size=5, etag='"def"')
+
+    _, cached = cache.fetch(URL, tmp_path / "track.flac", download)
+
+    assert not cached
+    assert (tmp_path / "track.flac").read_bytes() == b"newer"
+    assert not any(cache.objects_dir.iterdir())
+
+
+def test_lock_held_elsewhere_is_not_acquired_without_blocking(tmp_path: Path) -> None:
+    lock_path = tmp_path / "entry.lock"
+    with DownloadCache._locked(lock_path) as held:
+        assert held
+        with DownloadCache._locked(lock_path, blocking=False) as acquired:
+            assert not acquired
+    with DownloadCache._locked(lock_path, blocking=False) as acquired:
+        assert acquired
+
+
+def test_eviction_removes_least_recently_used_entries(tmp_path: Path) -> None:
+    cache = DownloadCache(tmp_path / "cache", max_size=10)
+    for age, name in enumerate(["newest", "middle", "oldest"]):
+        path = cache.objects_dir / name
+        path.write_bytes(b"12345")
+        mtime = 1_000_000 - age * 100
+        os.utime(path, (mtime, mtime))
+
+    cache.evict()
+
+    assert sorted(path.name for path in cache.objects_dir.iterdir()) == ["middle", "newest"]
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from evremixes.download_journal import DownloadJournal, SetState, TrackState
+from evremixes.types import AudioFormat
+
+from conftest import make_album, make_track
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from evremixes.config import DownloadConfig
+
+
+def make_journal(config: DownloadConfig, tmp_path: Path) -> DownloadJournal:
+    return DownloadJournal(config, tmp_path / "Album", AudioFormat.FLAC, is_instrumental=False)
+
+
+def stage(journal: DownloadJournal, filename: str, fingerprint: str) -> None:
+    (journal.folder / filename).write_bytes(b"audio")
+    journal.record(filename, fingerprint, TrackState.STAGED)
+
+
+def test_staged_tracks_are_reused_by_the_next_run(config: DownloadConfig, tmp_path: Path) -> None:
+    journal = make_journal(config, tmp_path)
+    assert journal.prepare({"01.flac": "a", "02.flac": "b"}) == 0
+    stage(journal, "01.flac", "a")
+    (journal.folder / "02.flac").write_bytes(b"partial")
+
+    resumed = make_journal(config, tmp_path)
+    assert resumed.prepare({"01.flac": "a", "02.flac": "b"}) == 1
+    assert resumed.is_staged("01.flac", "a")
+    assert not (resumed.folder / "02.flac").exists()
+    assert resumed.state is SetState.IN_PROGRESS
+
+
+def test_complete_set_stays_complete_when_nothing_changed(
+    config: DownloadConfig, tmp_path: Path
+) -> None:
+    journal = make_journal(config, tmp_path)
+    journal.prepare({"01.flac": "a"})
+    stage(journal, "01.flac", "a")
+    journal.mark_complete()
+
+    resumed = make_journal(config, tmp_path)
+    resumed.prepare({"01.flac": "a"})
+    assert resumed.state is SetState.COMPLETE
+
+
+def test_changed_fingerprint_discards_the_track(config: DownloadConfig, tmp_path: Path) -> None:
+    journal = make_journal(config, tmp_path)
+    journal.prepare({"01.flac": "a"})
+    stage(journal, "01.flac", "a")
+    journal.mark_complete()
+
+    resumed = make_journal(config, tmp_path)
+    assert resumed.prepare({"01.flac": "changed"}) == 0
+    assert resumed.state is SetState.IN_PROGRESS
+    assert not (resumed.folder / "01.flac").exists()
+
+
+def test_truncated_file_is_not_reused(config: DownloadConfig, tmp_path: Path) -> None:
+    journal = make_journal(config, tmp_path)
+    journal.prepare({"01.flac": "a"})
+    stage(journal, "01.flac", "a")
+    (journal.folder / "01.flac").write_bytes(b"au")
+
+    assert not journal.is_staged("01.flac", "a")
+
+
+def test_fingerprint_changes_with_album_metadata() -> None:
+    track = make_track(1)
+    album = make_album([track])
+    renamed = make_album([track], album_name="Other Album")
+
+    assert DownloadJournal.fingerprint(album, track, "url") == DownloadJournal.fingerprint(
+        make_album([track, make_track(2)]), track, "url"
+    )
+    assert DownloadJournal.fingerprint(album, track, "url") != DownloadJournal.fingerprint(
+        renamed, track, "url"
+    )
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from evremixes.file_links import LinkMethod, link_or_copy
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_link_or_copy_creates_an_identical_file(tmp_path: Path) -> None:
+    source = tmp_path / "source.flac"
+    source.write_bytes(b"audio" * 1000)
+    dest = tmp_path / "dest.flac"
+
+    method = link_or_copy(source, dest)
+
+    assert method in set(LinkMethod)
+    assert dest.read_bytes() == source.read_bytes()
+
+
+def test_file_that_will_be_modified_is_never_hardlinked(tmp_path: Path) -> None:
+    source = tmp_path / "source.flac"
+    source.write_bytes(b"audio" * 1000)
+    dest = tmp_path / "dest.flac"
+
+    method = link_or_copy(source, dest, allow_hardlink=False)
+    dest.write_bytes(b"retagged")
+
+    assert method is not LinkMethod.HARDLINK
+    assert not dest.samefile(source)
+    assert source.read_bytes() == b"audio" * 1000
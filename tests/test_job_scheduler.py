@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from evremixes.job_scheduler import estimate_cost, order_longest_first
+
+MB = 1024 * 1024
+
+
+def test_largest_files_go_first() -> None:
+    jobs = ["small", "large", "medium"]
+    assert order_longest_first(jobs, [10 * MB, 90 * MB, 40 * MB]) == ["large", "medium", "small"]
+
+
+def test_unknown_sizes_are_costed_at_the_average() -> None:
+    jobs = ["small", "unknown", "large"]
+    assert order_longest_first(jobs, [10 * MB, None, 90 * MB]) == ["large", "unknown", "small"]
+
+
+def test_equal_costs_keep_their_original_order() -> None:
+    jobs = ["a", "b", "c", "d"]
+    assert order_longest_first(jobs, [5 * MB, 5 * MB, None, 5 * MB]) == jobs
+    assert order_longest_first(jobs, [None, None, None, None]) == jobs
+
+
+def test_cost_grows_with_size_from_a_fixed_minimum() -> None:
+    assert estimate_cost(0) > 0
+    assert estimate_cost(100 * MB) > estimate_cost(10 * MB)
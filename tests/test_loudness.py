@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from evremixes.loudness import LoudnessMeter, gated_loudness  # noqa: E402
+from evremixes.loudness_analyzer import measure_track  # noqa: E402
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+SAMPLE_RATE = 48000
+
+
+def sine(seconds: float, channels: int, amplitude: float = 1.0) -> np.ndarray:
+    """A 997 Hz sine, the reference tone for BS.1770, in every channel."""
+    t = np.arange(round(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    wave = amplitude * np.sin(2 * np.pi * 997 * t)
+    return np.repeat(wave[:, np.newaxis], channels, axis=1)
+
+
+def measure(samples: np.ndarray, chunk_frames: int | None = None) -> tuple[float | None, float]:
+    meter = LoudnessMeter(SAMPLE_RATE, samples.shape[1])
+    step = chunk_frames or len(samples)
+    for start in range(0, len(samples), step):
+        meter.add(samples[start : start + step])
+    result = meter.result()
+    return result.loudness, result.peak
+
+
+def test_full_scale_sine_measures_zero_lufs_in_stereo() -> None:
+    loudness, peak = measure(sine(3, channels=2))
+    assert loudness == pytest.approx(0.0, abs=0.05)
+    assert peak == pytest.approx(1.0, abs=1e-3)
+
+
+def test_full_scale_sine_in_one_channel_measures_minus_three_lufs() -> None:
+    loudness, _ = measure(sine(3, channels=1))
+    assert loudness == pytest.approx(-3.01, abs=0.05)
+
+
+def test_loudness_doesnt_depend_on_how_samples_are_split() -> None:
+    samples = sine(3, channels=2, amplitude=0.25)
+    assert measure(samples, chunk_frames=12345)[0] == pytest.approx(measure(samples)[0], abs=1e-6)
+
+
+def test_silence_and_short_tracks_have_no_loudness() -> None:
+    assert measure(np.zeros((SAMPLE_RATE * 2, 2)))[0] is None
+    assert measure(sine(0.2, channels=2))[0] is None
+    assert gated_loudness(np.zeros(0)) is None
+
+
+def test_quiet_blocks_are_gated_out() -> None:
+    loud = np.full(10, 1.0)
+    quiet = np.full(10, 1e-4)
+    assert gated_loudness(np.concatenate((loud, quiet))) == pytest.approx(gated_loudness(loud))
+
+
+def test_invalid_flac_raises_value_error(tmp_path: Path) -> None:
+    path = tmp_path / "bad.flac"
+    path.write_bytes(b"not a flac file")
+    with pytest.raises(ValueError):
+        measure_track("ffmpeg", path)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import threading
+
+from evremixes.memory_budget import MemoryBudget
+
+
+def test_reservations_are_released_and_peak_is_recorded() -> None:
+    budget = MemoryBudget(limit=100)
+    with budget.reserve(30), budget.reserve(50):
+        assert budget.in_use == 80
+    assert budget.in_use == 0
+    assert budget.peak == 80
+
+
+def test_oversized_reservation_runs_on_its_own() -> None:
+    budget = MemoryBudget(limit=100)
+    with budget.reserve(1000):
+        assert budget.in_use == 100
+    assert budget.in_use == 0
+
+
+def test_reservation_waits_until_bytes_are_free() -> None:
+    budget = MemoryBudget(limit=100)
+    acquired = threading.Event()
+
+    def reserve() -> None:
+        with budget.reserve(60):
+            acquired.set()
+
+    with budget.reserve(60):
+        thread = threading.Thread(target=reserve)
+        thread.start()
+        assert not acquired.wait(0.1)
+
+    assert acquired.wait(5)
+    thread.join()
+    assert budget.peak == 60
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import struct
+from typing import TYPE_CHECKING
+
+import pytest
+
+from evremixes.mp4_layout import TAG_PADDING, get_tag_padding, move_moov_first
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def atom(atom_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(data), atom_type) + data
+
+
+def chunk_offset_atom(atom_type: bytes, offsets: list[int]) -> bytes:
+    entry_format = ">I" if atom_type == b"stco" else ">Q"
+    entries = b"".join(struct.pack(entry_format, offset) for offset in offsets)
+    return atom(atom_type, bytes(4) + struct.pack(">I", len(offsets)) + entries)
+
+
+def make_moov(atom_type: bytes, offsets: list[int]) -> bytes:
+    stbl = atom(b"stbl", chunk_offset_atom(atom_type, offsets))
+    return atom(b"moov", atom(b"trak", atom(b"mdia", atom(b"minf", stbl))))
+
+
+def read_chunk_offsets(data: bytes, atom_type: bytes) -> list[int]:
+    position = data.index(atom_type) + 4
+    (count,) = struct.unpack_from(">I", data, position + 4)
+    entry_format = ">I" if atom_type == b"stco" else ">Q"
+    entry_size = struct.calcsize(entry_format)
+    return [
+        struct.unpack_from(entry_format, data, position + 8 + i * entry_size)[0]
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("atom_type", [b"stco", b"co64"])
+def test_chunk_offsets_follow_the_audio_they_point_to(tmp_path: Path, atom_type: bytes) -> None:
+    """Chunks in the first mdat move with moov, while those after where it was stay put."""
+    ftyp = atom(b"ftyp", b"M4A \x00\x00\x00\x00")
+    first_mdat = atom(b"mdat", b"AAAA" + b"BBBB")
+    second_mdat = atom(b"mdat", b"CCCC")
+    chunks = [b"AAAA", b"BBBB", b"CCCC"]
+
+    # moov's size doesn't depend on the offsets, so lay the file out once to find them
+    moov_size = len(make_moov(atom_type, [0, 0, 0]))
+    first_audio = len(ftyp) + 8
+    second_audio = len(ftyp) + len(first_mdat) + moov_size + 8
+    offsets = [first_audio, first_audio + 4, second_audio]
+    original = ftyp + first_mdat + make_moov(atom_type, offsets) + second_mdat
+
+    path = tmp_path / "track.m4a"
+    path.write_bytes(original)
+    assert [original[offset : offset + 4] for offset in offsets] == chunks
+
+    assert move_moov_first(path)
+
+    data = path.read_bytes()
+    assert data.index(b"moov") < data.index(b"mdat")
+    new_offsets = read_chunk_offsets(data, atom_type)
+    assert [data[offset : offset + 4] for offset in new_offsets] == chunks
+    assert new_offsets[2] == offsets[2]
+
+
+def test_file_with_moov_first_is_left_alone(tmp_path: Path) -> None:
+    path = tmp_path / "track.m4a"
+    moov = make_moov(b"stco", [0])
+    content = atom(b"ftyp", b"M4A ") + moov + atom(b"mdat", b"AAAA")
+    path.write_bytes(content)
+
+    assert not move_moov_first(path)
+    assert path.read_bytes() == content
+
+
+def test_fragmented_file_is_left_alone(tmp_path: Path) -> None:
+    path = tmp_path / "track.m4a"
+    content = atom(b"mdat", b"AAAA") + make_moov(b"stco", [8]) + atom(b"moof", b"")
+    path.write_bytes(content)
+
+    assert not move_moov_first(path)
+
+
+class Padding:
+    def __init__(self, padding: int) -> None:
+        self.padding = padding
+
+
+@pytest.mark.parametrize(
+    ("padding", "expected"),
+    [(0, 0), (1000, 1000), (-10, TAG_PADDING), (100 * TAG_PADDING, TAG_PADDING)],
+)
+def test_tag_padding_is_kept_when_the_tags_fit(padding: int, expected: int) -> None:
+    assert get_tag_padding(Padding(padding)) == expected  # type: ignore[arg-type]
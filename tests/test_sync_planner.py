@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from evremixes.sync_planner import SyncPlanner
+from evremixes.types import RemoteFile
+
+URL = "https://example.com/01.flac"
+
+
+def test_file_from_another_source_is_not_current() -> None:
+    tags = {"source_url": "https://example.com/old.flac", "source_size": "100"}
+    assert not SyncPlanner.is_audio_current(tags, URL, RemoteFile(URL, size=100))
+
+
+def test_file_without_remote_details_is_assumed_current() -> None:
+    assert SyncPlanner.is_audio_current({"source_url": URL}, URL, None)
+
+
+def test_size_and_etag_must_match_when_recorded() -> None:
+    tags = {"source_url": URL, "source_size": "100", "source_etag": '"abc"'}
+
+    assert SyncPlanner.is_audio_current(tags, URL, RemoteFile(URL, size=100, etag='"abc"'))
+    assert not SyncPlanner.is_audio_current(tags, URL, RemoteFile(URL, size=101, etag='"abc"'))
+    assert not SyncPlanner.is_audio_current(tags, URL, RemoteFile(URL, size=100, etag='"def"'))
+
+
+def test_missing_tags_are_not_treated_as_changes() -> None:
+    remote = RemoteFile(URL, size=100, etag='"abc"')
+    assert SyncPlanner.is_audio_current({"source_url": URL}, URL, remote)
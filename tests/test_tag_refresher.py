@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from evremixes.config import DownloadConfig
+from evremixes.tag_refresher import TagRefresher
+from evremixes.track_downloader import TrackDownloader
+
+
+@pytest.fixture
+def refresher(config: DownloadConfig) -> TagRefresher:
+    return TagRefresher(config, TrackDownloader(config))
+
+
+def make_files(folder: Path, *names: str) -> dict[str, Path]:
+    for name in names:
+        (folder / name).write_text(name)
+    return {name: folder / name for name in names}
+
+
+def contents(folder: Path) -> dict[str, str]:
+    return {path.name: path.read_text() for path in folder.iterdir()}
+
+
+def test_tracks_that_swap_names_are_renamed(refresher: TagRefresher, tmp_path: Path) -> None:
+    files = make_files(tmp_path, "01 - A.flac", "02 - B.flac")
+
+    assert refresher._rename_files(
+        {files["01 - A.flac"]: files["02 - B.flac"], files["02 - B.flac"]: files["01 - A.flac"]}
+    )
+    assert contents(tmp_path) == {"01 - A.flac": "02 - B.flac", "02 - B.flac": "01 - A.flac"}
+
+
+def test_file_outside_the_refresh_is_never_renamed_over(
+    refresher: TagRefresher, tmp_path: Path
+) -> None:
+    files = make_files(tmp_path, "01 - A.flac", "02 - B.flac", "03 - C.flac")
+
+    # B can't move onto C, so A can't move onto B either
+    assert not refresher._rename_files(
+        {files["01 - A.flac"]: files["02 - B.flac"], files["02 - B.flac"]: files["03 - C.flac"]}
+    )
+    assert contents(tmp_path) == {name: name for name in files}
+
+
+@pytest.mark.parametrize("failing_target", [".02 - B.flac.refresh", "01 - A.flac"])
+def test_failed_rename_leaves_no_temporary_files(
+    refresher: TagRefresher,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    failing_target: str,
+) -> None:
+    """A rename that fails while moving aside or into place puts the file back where it was."""
+    files = make_files(tmp_path, "01 - A.flac", "02 - B.flac", "03 - C.flac")
+    rename = Path.rename
+
+    def failing_rename(self: Path, target: Path) -> Path:
+        """Fail to move B's file to the given name, whether it's aside or into place."""
+        if self.read_text() == "02 - B.flac" and Path(target).name == failing_target:
+            raise PermissionError(13, "Permission denied")
+        return rename(self, target)
+
+    monkeypatch.setattr(Path, "rename", failing_rename)
+
+    # A and B swap, and C moves onto a free name
+    renamed = refresher._rename_files(
+        {
+            files["01 - A.flac"]: files["02 - B.flac"],
+            files["02 - B.flac"]: files["01 - A.flac"],
+            files["03 - C.flac"]: tmp_path / "04 - C.flac",
+        }
+    )
+
+    assert not renamed
+    assert not list(tmp_path.glob("*.refresh"))
+    assert contents(tmp_path) == {
+        "01 - A.flac": "01 - A.flac",
+        "02 - B.flac": "02 - B.flac",
+        "04 - C.flac": "03 - C.flac",
+    }
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+from evremixes.download_journal import DownloadJournal, SetState, TrackState
+from evremixes.track_downloader import TrackDownloader, TrackOrigin
+from evremixes.types import AudioFormat, RemoteFile
+
+from conftest import make_album, make_track
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from collections.abc import Callable
+
+    from evremixes.config import DownloadConfig
+    from evremixes.types import AlbumInfo, TrackMetadata
+
+
+@pytest.fixture
+def downloader(config: DownloadConfig, monkeypatch: pytest.MonkeyPatch) -> TrackDownloader:
+    downloader = TrackDownloader(config)
+    monkeypatch.setattr(downloader.metadata, "get_cover_art", lambda url: b"cover")
+    return downloader
+
+
+def test_only_fetched_tracks_count_as_downloads(
+    downloader: TrackDownloader, config: DownloadConfig, tmp_path: Path
+) -> None:
+    """Tracks kept from the destination weren't downloaded, so they stay out of the analytics."""
+    tracks = [make_track(1), make_track(2), make_track(3), make_track(4)]
+    origins = {1: TrackOrigin.DOWNLOADED, 2: TrackOrigin.KEPT, 3: TrackOrigin.COPIED, 4: None}
+    counted: list[int] = []
+
+    downloader._download_track = lambda track, *args: origins[track.track_number]  # type: ignore[method-assign]
+    downloader.analytics.track_track_download = lambda track, file_format: counted.append(  # type: ignore[method-assign]
+        track.track_number
+    )
+
+    journal = DownloadJournal(config, tmp_path / "Album", AudioFormat.FLAC, is_instrumental=False)
+    success = downloader._download_track_set(
+        make_album(tracks), tracks, journal, AudioFormat.FLAC, False, "Album"
+    )
+
+    assert not success
+    assert sorted(counted) == [1, 3]
+
+
+def test_current_alac_files_are_kept_instead_of_converted(
+    downloader: TrackDownloader,
+    config: DownloadConfig,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """ALAC files converted from the current FLAC audio are reused, as the plan says they will be."""
+    tracks = [make_track(1), make_track(2)]
+    flac_urls = [track.get_file_url(AudioFormat.FLAC, False) for track in tracks]
+    config.known_files = {url: RemoteFile(url, size=100) for url in flac_urls}
+
+    # Track 1 was converted from the current FLAC file, and track 2 from an older one
+    destination = tmp_path / "ALAC"
+    destination.mkdir()
+    filenames = [downloader.get_track_filename(track, AudioFormat.ALAC, False) for track in tracks]
+    tags = {
+        filenames[0]: {"source_url": flac_urls[0], "source_size": "100"},
+        filenames[1]: {"source_url": flac_urls[1], "source_size": "99"},
+    }
+    for filename in filenames:
+        (destination / filename).write_bytes(b"old audio")
+    monkeypatch.setattr(downloader.metadata, "read_tags", lambda path: tags.get(path.name))
+    monkeypatch.setattr(downloader.metadata, "read_source", lambda path: None)
+
+    def tag_staged_track(
+        track: TrackMetadata,
+        album_info: AlbumInfo,
+        journal: DownloadJournal,
+        fingerprint: str,
+        output_path: Path,
+        *args: object,
+    ) -> None:
+        journal.record(output_path.name, fingerprint, TrackState.STAGED)
+
+    converted: list[int] = []
+
+    def derive_set(
+        album_info: AlbumInfo,
+        jobs: list[tuple[TrackMetadata, Path, Path]],
+        is_instrumental: bool,
+        cover_data: bytes,
+        on_converted: Callable[[Path], None],
+    ) -> bool:
+        for track, _, output_path in jobs:
+            output_path.write_bytes(b"new audio")
+            on_converted(output_path)
+            converted.append(track.track_number)
+        return True
+
+    monkeypatch.setattr(downloader, "_tag_staged_track", tag_staged_track)
+    monkeypatch.setattr(downloader.converter, "derive_set", derive_set)
+
+    flac_journal = DownloadJournal(config, tmp_path / "FLAC", AudioFormat.FLAC, False)
+    alac_journal = DownloadJournal(config, destination, AudioFormat.ALAC, False)
+    assert downloader._derive_alac_set(
+        make_album(tracks), tracks, flac_journal, alac_journal, False
+    )
+
+    assert converted == [2]
+    assert (alac_journal.folder / filenames[0]).read_bytes() == b"old audio"
+    assert alac_journal.state is SetState.COMPLETE
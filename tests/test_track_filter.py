@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from evremixes.config import DownloadConfig
+from evremixes.main import EvRemixes
+from evremixes.track_filter import TrackFilter
+from evremixes.types import TrackMetadata
+
+from conftest import make_album, make_track
+
+TRACKS = [
+    make_track(1, "Bring Me to Life (Remix)", "2023-05-01"),
+    make_track(2, "Going Under", "2024-02-10"),
+    make_track(3, "My Immortal (Piano Mix)", "not a date"),
+    make_track(4, "Lithium", "2024-11-30"),
+]
+
+
+def numbers(tracks: list[TrackMetadata]) -> list[int]:
+    return [track.track_number for track in tracks]
+
+
+def test_track_numbers_and_ranges_are_parsed() -> None:
+    assert TrackFilter.parse_track_numbers("1-3, 7") == {1, 2, 3, 7}
+    assert TrackFilter.parse_track_numbers("5") == {5}
+
+
+@pytest.mark.parametrize("value", ["", "a", "0", "3-1", "1-", "1,,2"])
+def test_invalid_track_numbers_are_rejected(value: str) -> None:
+    with pytest.raises(ValueError):
+        TrackFilter.parse_track_numbers(value)
+
+
+def test_title_pattern_without_wildcards_matches_anywhere() -> None:
+    track_filter = TrackFilter(title_patterns=["REMIX", "under"])
+    assert numbers(track_filter.apply(TRACKS)) == [1, 2]
+
+
+def test_title_pattern_with_wildcards_matches_the_whole_title() -> None:
+    assert numbers(TrackFilter(title_patterns=["*mix"]).apply(TRACKS)) == []
+    assert numbers(TrackFilter(title_patterns=["*mix)"]).apply(TRACKS)) == [1, 3]
+
+
+def test_date_range_skips_tracks_without_a_valid_date() -> None:
+    track_filter = TrackFilter(since=date(2024, 1, 1), until=date(2024, 6, 30))
+    assert numbers(track_filter.apply(TRACKS)) == [2]
+    assert numbers(TrackFilter(since=date(2000, 1, 1)).apply(TRACKS)) == [1, 2, 4]
+
+
+def test_every_criterion_has_to_match() -> None:
+    track_filter = TrackFilter(track_numbers={1, 2, 3}, title_patterns=["mix"])
+    assert not track_filter.is_empty
+    assert numbers(track_filter.apply(TRACKS)) == [1, 3]
+    assert TrackFilter().is_empty
+    assert numbers(TrackFilter().apply(TRACKS)) == [1, 2, 3, 4]
+
+
+def make_evremixes(track_filter: TrackFilter | None) -> tuple[EvRemixes, list[object]]:
+    """Make an EvRemixes that records what it's asked to download instead of downloading it."""
+    downloads: list[object] = []
+    evremixes = EvRemixes.__new__(EvRemixes)
+    evremixes.config = DownloadConfig(is_admin=False, track_filter=track_filter)
+    evremixes.download_helper = SimpleNamespace(  # type: ignore[assignment]
+        download_tracks=lambda album_info, config, tracks: downloads.append(tracks) or True
+    )
+    return evremixes, downloads
+
+
+def test_empty_update_without_a_filter_still_syncs() -> None:
+    """An update that only removes tracks has to reach the downloader so they're pruned."""
+    evremixes, downloads = make_evremixes(None)
+    assert evremixes.sync_tracks(make_album(TRACKS), [])
+    assert downloads == [[]]
+
+
+def test_filter_that_matches_nothing_skips_the_download() -> None:
+    evremixes, downloads = make_evremixes(TrackFilter(title_patterns=["nothing like this"]))
+    assert evremixes.sync_tracks(make_album(TRACKS))
+    assert downloads == []
+
+
+def test_only_matching_tracks_are_downloaded() -> None:
+    evremixes, downloads = make_evremixes(TrackFilter(track_numbers={2, 4}))
+    assert evremixes.sync_tracks(make_album(TRACKS))
+    assert [numbers(tracks) for tracks in downloads] == [[2, 4]]  # type: ignore[arg-type]
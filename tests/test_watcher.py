@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import sys
+from typing import TYPE_CHECKING
+
+import pytest
+import requests
+
+from evremixes.download_journal import DownloadJournal
+from evremixes.main import parse_arguments
+from evremixes.metadata_helper import MetadataHelper
+from evremixes.track_downloader import TrackDownloader
+from evremixes.types import AudioFormat, SourceFile
+from evremixes.watcher import ManifestWatcher
+
+from conftest import make_album, make_track
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from evremixes.config import DownloadConfig
+    from evremixes.types import AlbumInfo, TrackMetadata
+
+MANIFEST_URL = "https://example.com/evtracks.json"
+
+
+def make_response(content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    response.url = MANIFEST_URL
+    return response
+
+
+def make_watcher(config: DownloadConfig, content: bytes, sync: object) -> ManifestWatcher:
+    watcher = ManifestWatcher(config, sync, MANIFEST_URL)  # type: ignore[arg-type]
+    watcher._fetch_tracklist = lambda: make_response(content)  # type: ignore[method-assign]
+    return watcher
+
+
+def serialize(album: AlbumInfo) -> bytes:
+    return json.dumps(MetadataHelper.serialize_metadata(album)).encode()
+
+
+def test_diff_tracks_finds_changed_and_removed_tracks() -> None:
+    previous = make_album([make_track(1), make_track(2), make_track(3)])
+    current = make_album([make_track(1), make_track(2, "Renamed"), make_track(4)])
+
+    changed, removed = ManifestWatcher.diff_tracks(previous, current)
+
+    assert [track.track_number for track in changed] == [2, 4]
+    assert [track.track_number for track in removed] == [3]
+
+
+def test_diff_tracks_marks_every_track_changed_for_album_changes() -> None:
+    previous = make_album([make_track(1), make_track(2)])
+    current = dataclasses.replace(previous, year=2025)
+
+    changed, removed = ManifestWatcher.diff_tracks(previous, current)
+
+    assert len(changed) == 2
+    assert removed == []
+
+
+def test_removal_only_update_still_syncs(config: DownloadConfig) -> None:
+    calls: list[list[TrackMetadata] | None] = []
+
+    def sync(album: AlbumInfo, tracks: list[TrackMetadata] | None) -> bool:
+        calls.append(tracks)
+        return True
+
+    first = make_album([make_track(1), make_track(2)])
+    watcher = make_watcher(config, serialize(first), sync)
+    assert watcher.check_for_updates()
+
+    watcher._fetch_tracklist = lambda: make_response(serialize(make_album([make_track(1)])))  # type: ignore[method-assign]
+    assert watcher.check_for_updates()
+    assert calls == [None, []]
+
+
+@pytest.mark.parametrize("content", [b"{not json", b'{"metadata": {}}'])
+def test_malformed_tracklist_is_skipped(config: DownloadConfig, content: bytes) -> None:
+    watcher = make_watcher(config, content, lambda album, tracks: True)
+    assert not watcher.check_for_updates()
+
+
+@pytest.mark.parametrize(
+    "error", [ValueError("no cover"), OSError("disk full"), SystemExit("offline")]
+)
+def test_sync_errors_are_logged_and_polling_continues(
+    config: DownloadConfig, error: BaseException
+) -> None:
+    def sync(album: AlbumInfo, tracks: list[TrackMetadata] | None) -> bool:
+        raise error
+
+    watcher = make_watcher(config, serialize(make_album([make_track(1)])), sync)
+    assert not watcher.check_for_updates()
+    assert not watcher.state_file.exists()
+
+
+def test_exit_with_status_still_stops_the_watcher(config: DownloadConfig) -> None:
+    def sync(album: AlbumInfo, tracks: list[TrackMetadata] | None) -> bool:
+        raise SystemExit(1)
+
+    watcher = make_watcher(config, serialize(make_album([make_track(1)])), sync)
+    with pytest.raises(SystemExit):
+        watcher.check_for_updates()
+
+
+def test_state_is_replaced_rather_than_rewritten(config: DownloadConfig) -> None:
+    watcher = make_watcher(
+        config, serialize(make_album([make_track(1)])), lambda album, tracks: True
+    )
+    watcher.state_file.write_text('{"manifest": null}')
+    inode = watcher.state_file.stat().st_ino
+
+    assert watcher.check_for_updates()
+
+    assert watcher.state_file.stat().st_ino != inode
+    assert not watcher.state_file.with_suffix(".tmp").exists()
+    assert json.loads(watcher.state_file.read_text())["manifest"]["metadata"]
+
+
+@pytest.mark.parametrize("interval", ["0", "-5"])
+def test_interval_below_one_second_is_rejected(
+    monkeypatch: pytest.MonkeyPatch, interval: str
+) -> None:
+    monkeypatch.setattr(sys, "argv", ["evremixes", "--watch", "--interval", interval])
+    with pytest.raises(SystemExit):
+        parse_arguments()
+
+
+def test_audio_replaced_under_the_same_url_is_downloaded_again(
+    config: DownloadConfig, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The file details from the tracklist seen at startup don't count once it's been updated."""
+    downloader = TrackDownloader(config)
+    track = make_track(1)
+    track.sources = {"flac": SourceFile(size=100, sha256="old")}
+    first = make_album([track])
+    config.update_known_files(first)  # As when the tracklist is first fetched
+
+    # The file at the destination was downloaded from the first version of the tracklist
+    destination = tmp_path / "Album"
+    destination.mkdir()
+    filename = downloader.get_track_filename(track, AudioFormat.FLAC, False)
+    (destination / filename).write_bytes(b"old audio")
+    tags = {"source_url": track.get_file_url(AudioFormat.FLAC, False), "source_size": "100"}
+    monkeypatch.setattr(downloader.metadata, "read_tags", lambda path: tags)
+
+    kept: list[dict[str, Path]] = []
+
+    def sync(album: AlbumInfo, tracks: list[TrackMetadata] | None) -> bool:
+        journal = DownloadJournal(config, destination, AudioFormat.FLAC, is_instrumental=False)
+        kept.append(downloader._find_current_files(journal, album.tracks, AudioFormat.FLAC, False))
+        return True
+
+    watcher = make_watcher(config, serialize(first), sync)
+    assert watcher.check_for_updates()
+
+    new_source = SourceFile(size=200, sha256="new")
+    replaced = make_album([dataclasses.replace(track, sources={"flac": new_source})])
+    watcher._fetch_tracklist = lambda: make_response(serialize(replaced))  # type: ignore[method-assign]
+    assert watcher.check_for_updates()
+
+    assert kept == [{filename: destination / filename}, {}]